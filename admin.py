@@ -1,8 +1,20 @@
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
+from functools import partial
+from utils.helpers import encode_cursor, decode_cursor
+from services.scheduler import reminder_scheduler
+from services.outbound import outbound, Priority
+from services import outbox
+from services.outbox import outbox_worker
+from services.reachability import reachability
+from services.identity import identity_cache
+from services.slots import slot_engine
+from database.read_models import Identity
+from database.crud import AppointmentTransitionError
 from database.
     crud = CRUD(session)
     user = await crud.get_user(str(telegram_id))
@@ -12,97 +24,147 @@ from database.
     await message.answer("Панель администратора:", reply_markup=get_admin_keyboard())
 
 @router.message(F.text == "📊 Статистика")
-async def show_statistics(message: Message, session: AsyncSession):
-    telegram_id = message.from_user.id
-    crud = CRUD(session)
-    user = await crud.get_user(str(telegram_id))
-    if not user or user.role != Role.ADMIN:
+async def show_statistics(message: Message, session: AsyncSession, identity: Identity):
+    if not identity.is_admin:
         await message.answer("У вас нет прав администратора!")
         return
+    crud = CRUD(session)
+    summary = await crud.get_statistics_summary()
+    specialists = await crud.get_specialist_stats()
+    today = datetime.now(tz=config.TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    volumes = await crud.get_daily_volumes(today - timedelta(days=6), today + timedelta(days=1))
+    response = (
+        f"📊 Статистика\n\n"
+        f"Клиентов: {summary.total_clients}\n"
+        f"Всего заявок: {summary.total_appointments}\n"
+        f"Ожидают: {summary.pending}\n"
+        f"Одобрено: {summary.approved}\n"
+        f"Выполнено: {summary.completed}\n"
+        f"Отменено: {summary.cancelled}\n\n"
     )
+    if volumes:
+        response += "Заявки за 7 дней:\n"
+        for volume in volumes:
+            response += f"{volume.day.strftime('%d.%m')}: {volume.total} (выполнено {volume.completed}, отменено {volume.cancelled})\n"
+        response += "\n"
     for spec in specialists:
         response += (
             f"Специалист: {spec.full_name}\n"
-            f"Выполнено заявок: {spec.completed_appointments}\n"
+            f"Выполнено заявок: {spec.completed}\n"
+            f"Отменено заявок: {spec.cancelled}\n"
             f"Ранг: {spec.rank}\n\n"
         )
     await message.answer(response, reply_markup=get_admin_keyboard())
 
+APPOINTMENTS_PER_PAGE = 5
+CLIENTS_PER_PAGE = 10
+SPECIALISTS_PER_PAGE = 10
+
+
+async def _turn_page(state: FSMContext, fetch, key, direction: str | None = None):
+    """
+    Load the first, next ("next") or previous ("prev") page of a list view.
+    FSM state keeps only a cursor: the page number and the keys of its first and last rows.
+    Returns:
+        tuple: (page number, rows, has previous page, has next page).
+    """
+    cursor = (await state.get_data()).get("cursor") if direction else None
+    if direction == "next" and cursor:
+        page_number = cursor["page"] + 1
+        page = await fetch(after=decode_cursor(cursor["last"]))
+        has_prev, has_next = True, page.has_more
+    elif direction == "prev" and cursor:
+        page_number = max(cursor["page"] - 1, 0)
+        page = await fetch(before=decode_cursor(cursor["first"]))
+        has_prev, has_next = page.has_more, True
+    else:
+        page_number = 0
+        page = await fetch()
+        has_prev, has_next = False, page.has_more
+    if page.items:
+        await state.update_data(cursor={
+            "page": page_number,
+            "first": encode_cursor(key(page.items[0])),
+            "last": encode_cursor(key(page.items[-1])),
+        })
+    return page_number, page.items, has_prev, has_next
+
+
+def _nav_buttons(prefix: str, has_prev: bool, has_next: bool) -> list[InlineKeyboardButton]:
+    nav_buttons = []
+    if has_prev:
+        nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}_prev"))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"{prefix}_next"))
+    return nav_buttons
+
+
+def _future_appointments_view(page: int, total_pages: int, appointments, has_prev: bool,
+                              has_next: bool) -> tuple[str, InlineKeyboardMarkup]:
+    response = f"<b>Запланированные заявки (Страница {page + 1}/{total_pages}):</b>\n\n"
+    buttons = []
+    for app in appointments:
+        status = app.status.value
+        date = app.proposed_date.astimezone(config.TIMEZONE).strftime("%d.%m.%Y")
+        scheduled_time = app.scheduled_time.astimezone(config.TIMEZONE).strftime(
+            "%H:%M") if app.scheduled_time else "Не назначено"
+        specialist = app.specialist.full_name if app.specialist else "Не назначен"
+        reason = app.reason[:100] + "..." if len(app.reason) > 100 else app.reason
+        response += (
+            f"Заявка #{app.id}\n"
+            f"Клиент: {app.client.full_name}\n"
+            f"Дата: {date}\n"
+            f"Время: {scheduled_time}\n"
+            f"Специалист: {specialist}\n"
+            f"Статус: {status}\n"
+            f"Причина: {reason}\n\n"
+        )
+        if app.status != AppointmentStatus.CANCELED:
+            buttons.append(
+                [InlineKeyboardButton(text="❌ Отменить", callback_data=f"cancel_appointment_{app.id}")]
+            )
+    nav_buttons = _nav_buttons("appointments_page", has_prev, has_next)
+    if nav_buttons:
+        buttons.append(nav_buttons)
+    buttons.append([InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")])
+    return response, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def _future_appointment_key(app) -> tuple:
+    return app.scheduled_time, app.id
+
+
 @router.message(F.text == "📅 Записи")
-async def show_appointments(message: Message, state: FSMContext, session: AsyncSession):
-    telegram_id = message.from_user.id
-    crud = CRUD(session)
-    user = await crud.get_user(str(telegram_id))
-    if not user or user.role != Role.ADMIN:
+async def show_appointments(message: Message, state: FSMContext, session: AsyncSession, identity: Identity):
+    if not identity.is_admin:
         await message.answer("У вас нет прав администратора!")
         return
-    appointments = await crud.get_future_appointments()
-    if not appointments:
+    crud = CRUD(session)
+    total = await crud.count_future_appointments()
+    if not total:
         await message.answer("Нет запланированных заявок.", reply_markup=get_admin_keyboard())
         await state.clear()
         return
-    APPOINTMENTS_PER_PAGE = 5
-    page = 0
-            if app.status != AppointmentStatus.CANCELED:
-                buttons.append(
-                    [InlineKeyboardButton(text="❌ Отменить", callback_data=f"cancel_appointment_{app.id}")]
-                )
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"appointments_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"appointments_page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")])
-        return response, InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    response, keyboard = get_appointments_page(page)
-    await message.answer(response, reply_markup=keyboard, parse_mode="HTML")
+    total_pages = (total + APPOINTMENTS_PER_PAGE - 1) // APPOINTMENTS_PER_PAGE
     await state.set_state(AdminStates.view_appointments)
-    await state.update_data(total_pages=total_pages, appointments=appointments)
+    await state.update_data(total_pages=total_pages)
+    fetch = partial(crud.get_future_appointments_page, limit=APPOINTMENTS_PER_PAGE)
+    page, appointments, has_prev, has_next = await _turn_page(state, fetch, _future_appointment_key)
+    response, keyboard = _future_appointments_view(page, total_pages, appointments, has_prev, has_next)
+    await message.answer(response, reply_markup=keyboard, parse_mode="HTML")
 
 @router.callback_query(F.data.startswith("appointments_page_"), AdminStates.view_appointments)
 async def paginate_appointments(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
-    page = int(callback.data.split("_")[-1])
+    direction = callback.data.rsplit("_", 1)[-1]
     data = await state.get_data()
-    appointments = data.get("appointments", [])
     total_pages = data.get("total_pages", 1)
-    APPOINTMENTS_PER_PAGE = 5
-
-    def get_appointments_page(page: int) -> tuple[str, InlineKeyboardMarkup]:
-        start_idx = page * APPOINTMENTS_PER_PAGE
-        end_idx = min(start_idx + APPOINTMENTS_PER_PAGE, len(appointments))
-        response = f"<b>Запланированные заявки (Страница {page + 1}/{total_pages}):</b>\n\n"
-        buttons = []
-        for app in appointments[start_idx:end_idx]:
-            status = app.status.value
-            date = app.proposed_date.astimezone(config.TIMEZONE).strftime("%d.%m.%Y")
-            scheduled_time = app.scheduled_time.astimezone(config.TIMEZONE).strftime(
-                "%H:%M") if app.scheduled_time else "Не назначено"
-            specialist = app.specialist.full_name if app.specialist else "Не назначен"
-            reason = app.reason[:100] + "..." if len(app.reason) > 100 else app.reason
-            response += (
-                f"Заявка #{app.id}\n"
-                f"Клиент: {app.client.full_name}\n"
-                f"Дата: {date}\n"
-                f"Время: {scheduled_time}\n"
-                f"Специалист: {specialist}\n"
-                f"Статус: {status}\n"
-                f"Причина: {reason}\n\n"
-            )
-            if app.status != AppointmentStatus.CANCELED:
-                buttons.append(
-                    [InlineKeyboardButton(text="❌ Отменить", callback_data=f"cancel_appointment_{app.id}")]
-                )
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"appointments_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"appointments_page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        butto
+    crud = CRUD(session)
+    fetch = partial(crud.get_future_appointments_page, limit=APPOINTMENTS_PER_PAGE)
+    page, appointments, has_prev, has_next = await _turn_page(state, fetch, _future_appointment_key, direction)
+    response, keyboard = _future_appointments_view(page, total_pages, appointments, has_prev, has_next)
+    await callback.message.edit_text(response, reply_markup=keyboard, parse_mode="HTML")
+    await callback.answer()
+
         await message.answer("Чёрный список пуст.", reply_markup=get_admin_keyboard())
         return
     response = "<b>Чёрный список:</b>\n\n"
@@ -115,13 +177,11 @@ async def paginate_appointments(callback: CallbackQuery, state: FSMContext, sess
     await message.answer(response, reply_markup=get_admin_keyboard())
 
 @router.message(F.text == "🔨 работа с ЧС")
-async def manage_blacklist(message: Message, state: FSMContext, session: AsyncSession):
-    telegram_id = message.from_user.id
-    crud = CRUD(session)
-    user = await crud.get_user(str(telegram_id))
-    if not user or user.role != Role.ADMIN:
+async def manage_blacklist(message: Message, state: FSMContext, session: AsyncSession, identity: Identity):
+    if not identity.is_admin:
         await message.answer("У вас нет прав администратора!")
         return
+    crud = CRUD(session)
     blacklist = await crud.get_blacklist()
     if not blacklist:
         await message.answer("Чёрный список пуст.", reply_markup=get_admin_keyboard())
@@ -162,63 +222,49 @@ async def remove_from_blacklist(callback: CallbackQuery, state: FSMContext, sess
     ])
     await message.answer(response, reply_markup=keyboard)
 
+def _clients_keyboard(clients, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{client.full_name} (ID: {client.user_id})",
+            callback_data=f"select_client_{client.user_id}"
+        )] for client in clients
+    ]
+    nav_buttons = _nav_buttons("page", has_prev, has_next)
+    if nav_buttons:
+        buttons.append(nav_buttons)
+    buttons.append([InlineKeyboardButton(text="Отмена", callback_data="cancel_add_specialist")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 @router.callback_query(F.data == "add_specialist")
 async def add_specialist(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     crud = CRUD(session)
-    clients = await crud.get_all_clients()
-    if not clients:
+    total = await crud.count_clients()
+    if not total:
         await callback.message.edit_text("Нет зарегистрированных клиентов.", reply_markup=None)
         await state.clear()
         return
-    CLIENTS_PER_PAGE = 10
-    page = 0
-    total_pages = (len(clients) + CLIENTS_PER_PAGE - 1) // CLIENTS_PER_PAGE
-
-    def get_client_keyboard(page: int) -> InlineKeyboardMarkup:
-        start_idx = page * CLIENTS_PER_PAGE
-        end_idx = min(start_idx + CLIENTS_PER_PAGE, len(clients))
-        buttons = [
-            [InlineKeyboardButton(
-                text=f"{client.full_name} (ID: {client.user_id})",
-                callback_data=f"select_client_{client.user_id}"
-            )] for client in clients[start_idx:end_idx]
-        ]
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"page_{page + 1}"))
-        if nav_buttons:session: AsyncSession):
-    page = int(callback.data.split("_")[1])
+    total_pages = (total + CLIENTS_PER_PAGE - 1) // CLIENTS_PER_PAGE
+    await state.set_state(AdminStates.add_specialist)
+    await state.update_data(total_pages=total_pages)
+    fetch = partial(crud.get_clients_page, limit=CLIENTS_PER_PAGE)
+    page, clients, has_prev, has_next = await _turn_page(state, fetch, lambda client: (client.id,))
+    await callback.message.edit_text(
+        f"Выберите клиента для назначения специалистом (Страница {page + 1}/{total_pages}):",
+        reply_markup=_clients_keyboard(clients, has_prev, has_next)
+    )
+
+@router.callback_query(F.data.startswith("page_"), AdminStates.add_specialist)
+async def paginate_clients(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    direction = callback.data.split("_")[1]
     crud = CRUD(session)
-    clients = await crud.get_all_clients()
     data = await state.get_data()
     total_pages = data.get("total_pages", 1)
-    CLIENTS_PER_PAGE = 10
-
-    def get_client_keyboard(page: int) -> InlineKeyboardMarkup:
-        start_idx = page * CLIENTS_PER_PAGE
-        end_idx = min(start_idx + CLIENTS_PER_PAGE, len(clients))
-        buttons = [
-            [InlineKeyboardButton(
-                text=f"{client.full_name} (ID: {client.user_id})",
-                callback_data=f"select_client_{client.user_id}"
-            )] for client in clients[start_idx:end_idx]
-        ]
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton(text="Отмена", callback_data="cancel_add_specialist")])
-        return InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    keyboard = get_client_keyboard(page)
+    fetch = partial(crud.get_clients_page, limit=CLIENTS_PER_PAGE)
+    page, clients, has_prev, has_next = await _turn_page(state, fetch, lambda client: (client.id,), direction)
     await callback.message.edit_text(
         f"Выберите клиента для назначения специалистом (Страница {page + 1}/{total_pages}):",
-        reply_markup=keyboard
+        reply_markup=_clients_keyboard(clients, has_prev, has_next)
     )
 
     if user.role != Role.CLIENT:
@@ -271,6 +317,8 @@ async def process_add_specialist_details(message: Message, state: FSMContext, se
     )
     try:
         await crud.create_specialist(specialist)
+        await session.commit()
+        identity_cache.invalidate(telegram_id)
         await callback.message.edit_text(f"Специалист {full_name} добавлен.", reply_markup=None)
     except Exception as e:
         logger.error(f"Failed to create specialist {telegram_id}: {e}")
@@ -298,45 +346,104 @@ async def process_remove_specialist(message: Message, state: FSMContext, session
         await session.delete(user)
     await session.delete(specialist)
     await session.commit()
+    identity_cache.invalidate(telegram_id)
     await message.answer(f"Специалист {telegram_id} удалён.", reply_markup=get_admin_keyboard())
     await state.clear()
 
 @router.message(F.text == "📄 Экспорт данных")
-async def export_data(message: Message, state: FSMContext, session: AsyncSession):
-    telegram_id = message.from_user.id
-    crud = CRUD(session)
-    user = await crud.get_user(str(telegram_id))
-    if not user or user.role != Role.ADMIN:
+async def export_data(message: Message, state: FSMContext, identity: Identity):
+    if not identity.is_admin:
         await message.answer("У вас нет прав администратора!")
         return
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="1 неделя", callback_data="export_1week")],
         [InlineKeyboardButton(text="2 недели", callback_data="export_2weeks")],
         [InlineKeyboardButton(text="1 месяц", callback_data="export_1month")],
+        [InlineKeyboardButton(text="Свой период", callback_data="export_range")],
+        [InlineKeyboardButton(text="Изменения с прошлой выгрузки", callback_data="export_changes")],
         [InlineKeyboardButton(text="Отмена", callback_data="cancel_export")]
     ])
     await message.answer("Выберите период для экспорта данных:", reply_markup=keyboard)
     await state.set_state(AdminStates.export_data)
 
+def _parse_export_range(text: str) -> tuple[datetime, datetime] | None:
+    """Period 'ДД.ММ.ГГГГ-ДД.ММ.ГГГГ' (both days inclusive) as [start, end)."""
+    try:
+        first, last = (part.strip() for part in text.split("-"))
+        start = config.TIMEZONE.localize(datetime.strptime(first, "%d.%m.%Y"))
+        end = config.TIMEZONE.localize(datetime.strptime(last, "%d.%m.%Y") + timedelta(days=1))
+    except ValueError:
+        return None
+    return (start, end) if start < end else None
+
+async def _send_export(message: Message, content: bytes, name: str, caption: str, compress: bool = False):
+    filename = f"appointments_{name}_{datetime.now(tz=config.TIMEZONE).strftime('%Y%m%d_%H%M%S')}.csv"
+    await message.bot.send_document(
+        chat_id=message.chat.id,
+        document=BufferedInputFile(content, filename=filename + (".gz" if compress else "")),
+        caption=caption
+    )
+
 @router.callback_query(F.data.startswith("export_"), AdminStates.export_data)
 async def process_export(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     period = callback.data.split("_")[1]
+    if period == "range":
+        await callback.message.edit_text("Введите период в формате ДД.ММ.ГГГГ-ДД.ММ.ГГГГ:")
+        await state.set_state(AdminStates.export_range)
+        return
+    if period == "changes":
+        await _export_changes(callback, session)
+        await state.clear()
+        return
     try:
-        csv_content = await export_appointments_to_csv(session, period)
-        filename = f"appointments_{period}_{datetime.now(tz=config.TIMEZONE).strftime('%Y%m%d_%H%M%S')}.csv"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(csv_content)
-        await callback.message.bot.send_document(
-            chat_id=callback.message.chat.id,
-            document=FSInputFile(filename),
-            caption=f"Экспорт заявок за {period.replace('1week', '1 неделю').replace('2weeks', '2 недели').replace('1month', '1 месяц')}"
-        )
-        os.remove(filename)
+        content = await export_appointments_to_csv(session, period)
+        caption = f"Экспорт заявок за {period.replace('1week', '1 неделю').replace('2weeks', '2 недели').replace('1month', '1 месяц')}"
+        await _send_export(callback.message, content, period, caption)
     except Exception as e:
         logger.error(f"Failed to export data: {e}")
         await callback.message.edit_text("Ошибка при экспорте данных. Попробуйте позже.", reply_markup=None)
     await state.clear()
 
+async def _export_changes(callback: CallbackQuery, session: AsyncSession):
+    crud = CRUD(session)
+    admin_id = str(callback.from_user.id)
+    try:
+        since = await crud.get_export_watermark(admin_id)
+        # Отметка берётся до запроса: изменения, сделанные во время выгрузки, попадут в следующую
+        exported_at = datetime.now(tz=config.TIMEZONE)
+        if since is None:
+            # Первая выгрузка изменений содержит все заявки
+            content = await export_appointments_to_csv(session, changed_since=datetime.min, compress=True)
+            caption = "Экспорт всех заявок (первая выгрузка изменений)"
+        else:
+            content = await export_appointments_to_csv(session, changed_since=since)
+            caption = f"Изменения заявок с {since.strftime('%d.%m.%Y %H:%M')}"
+        await _send_export(callback.message, content, "changes", caption, since is None)
+        await crud.set_export_watermark(admin_id, exported_at)
+    except Exception as e:
+        logger.error(f"Failed to export changes: {e}")
+        await callback.message.edit_text("Ошибка при экспорте данных. Попробуйте позже.", reply_markup=None)
+
+@router.message(AdminStates.export_range)
+async def process_export_range(message: Message, state: FSMContext, session: AsyncSession):
+    export_range = _parse_export_range(message.text or "")
+    if not export_range:
+        await message.answer("Неверный период. Введите в формате ДД.ММ.ГГГГ-ДД.ММ.ГГГГ (например, 01.03.2025-31.03.2025):")
+        return
+    start, end = export_range
+    try:
+        compress = end - start > config.EXPORT_COMPRESS_AFTER
+        content = await export_appointments_to_csv(session, start=start, end=end, compress=compress)
+        first_day, last_day = start.strftime('%d.%m.%Y'), (end - timedelta(days=1)).strftime('%d.%m.%Y')
+        await _send_export(
+            message, content, f"{start.strftime('%Y%m%d')}_{end.strftime('%Y%m%d')}",
+            f"Экспорт заявок с {first_day} по {last_day}", compress
+        )
+    except Exception as e:
+        logger.error(f"Failed to export data: {e}")
+        await message.answer("Ошибка при экспорте данных. Попробуйте позже.", reply_markup=get_admin_keyboard())
+    await state.clear()
+
 @router.callback_query(F.data == "cancel_export", AdminStates.export_data)
 async def cancel_export(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text("Экспорт данных отменён.", reply_markup=get_admin_keyboard())
@@ -379,10 +486,8 @@ async def assign_specialist(callback: CallbackQuery, state: FSMContext, session:
         await callback.message.edit_text("Специалист не найден.", reply_markup=None)
         await state.clear()
         return
-    try:
-        await bot.send_message(specialist.user_id, "Проверка доступности бота.")
-    except TelegramBadRequest as e:
-        logger.error(f"Cannot message specialist {specialist.user_id}: {e}")
+    if not reachability.is_reachable(specialist.user_id):
+        logger.error(f"Cannot message specialist {specialist.user_id}: {reachability.reason(specialist.user_id)}")
         await callback.message.edit_text(
             f"Специалист {specialist.full_name} недоступен (возможно, бот заблокирован или ID неверный).",
             reply_markup=None
@@ -391,8 +496,9 @@ async def assign_specialist(callback: CallbackQuery, state: FSMContext, session:
         return
     appointment.specialist_id = specialist.id
     await session.commit()
-    appointments = await crud.get_appointments_by_specialist(specialist.id)
-    keyboard = get_time_selection_keyboard(appointments, appointment.proposed_date)
+    day = appointment.proposed_date.astimezone(config.TIMEZONE).date()
+    slots = await slot_engine.get_day_slots(crud, specialist.id, day)
+    keyboard = get_time_selection_keyboard(slots, specialist.full_name)
     await callback.message.edit_text("Выберите время:", reply_markup=keyboard)
     await state.update_data(appointment_id=appointment_id)
     await state.set_state(AdminStates.select_time)
@@ -408,59 +514,30 @@ async def select_time(callback: CallbackQuery, state: FSMContext, session: Async
         await callback.message.edit_text("Заявка не найдена.", reply_markup=None)
         await state.clear()
         return
-    scheduled_time = datetime.strptime(
+    scheduled_time = config.TIMEZONE.localize(datetime.strptime(
         f"{appointment.proposed_date.strftime('%Y-%m-%d')} {time_str}",
         "%Y-%m-%d %H:%M"
-    ).replace(tzinfo=config.TIMEZONE)
-    appointment.scheduled_time = scheduled_time
-    appointment.status = AppointmentStatus.APPROVED
+    ))
+    specialist_id = appointment.specialist_id
+    specialist_name = appointment.specialist.full_name if appointment.specialist else "Неизвестный специалист"
+    day = appointment.proposed_date.astimezone(config.TIMEZONE).date()
+    if not await slot_engine.reserve(crud, appointment_id, specialist_id, scheduled_time):
+        await session.refresh(appointment, ["status"])
+        if appointment.status != AppointmentStatus.PENDING:
+            await callback.message.edit_text("Заявка уже обработана.", reply_markup=None)
+            await state.clear()
+            return
+        slots = await slot_engine.get_day_slots(crud, specialist_id, day)
+        keyboard = get_time_selection_keyboard(slots, specialist_name)
+        await callback.message.edit_text("Это время уже занято. Выберите другое:", reply_markup=keyboard)
+        await callback.answer()
+        return
+    await crud.add_outbox_message(outbox.CLIENT_APPROVED, appointment.id)
+    await crud.add_outbox_message(outbox.SPECIALIST_ASSIGNED, appointment.id)
     await session.commit()
-    try:
-        await notify_client_approved(bot, appointment)
-    except Exception as e:
-        logger.error(f"Failed to notify client for appointment {appointment_id}: {e}")
-        await bot.send_message(
-            config.ADMIN_ID,
-            escape_markdown_v2(f"Ошибка: Не удалось уведомить клиента о подтверждении заявки #{appointment_id}."),
-            parse_mode="MarkdownV2"
-        )
-    specialist = appointment.specialist
+    reminder_scheduler.schedule(appointment.id, scheduled_time)
+    outbox_worker.wake()
     scheduled_time_str = scheduled_time.astimezone(config.TIMEZONE).strftime("%d.%m.%Y %H:%M")
-    client_link = f"https://t.me/{appointment.client.user_id}"
-    client_contact = f"Контакт клиента: {client_link}"
-    try:
-        chat = await bot.get_chat(appointment.client.user_id)
-        if chat.username:
-            client_link = f"https://t.me/{chat.username}"
-            client_contact = f"Контакт клиента: {client_link}"
-        else:
-            client_contact += f"\n(Если ссылка не работает, свяжитесь с администратором: https://t.me/{config.ADMIN_ID})"
-    except TelegramBadRequest as e:
-        logger.warning(
-            f"Cannot get username for client {appointment.client.user_id} (appointment_id: {appointment_id}): {e}")
-        client_contact += f"\n(Если ссылка не работает, свяжитесь с администратором: https://t.me/{config.ADMIN_ID})"
-    try:
-        text = (
-            f"Новая заявка #{appointment.id} назначена на {scheduled_time_str}\n"
-            f"Клиент: {appointment.client.full_name}\n"
-            f"{client_contact}\n"
-            f"Номер телефона клиента: {appointment.client.phone}\n"
-            f"Причина: {appointment.reason[:500] + '...' if len(appointment.reason) > 500 else appointment.reason}"
-        )
-        escaped_text = escape_markdown_v2(text)
-        await bot.send_message(
-            specialist.user_id,
-            escaped_text,
-            parse_mode="MarkdownV2"
-        )
-    except TelegramBadRequest as e:
-        logger.error(f"Failed to notify specialist {specialist.user_id} for appointment {appointment_id}: {e}")
-        await bot.send_message(
-            config.ADMIN_ID,
-            f"Ошибка: Не удалось уведомить специалиста {specialist.full_name} (ID: {specialist.user_id}) о заявке #{appointment.id}. Причина: {e}"
-        )
-        specialist.is_available = False
-        await session.commit()
     await callback.message.edit_text(f"Заявка #{appointment.id} подтверждена на {scheduled_time_str}.",
                                     reply_markup=None)
     await state.clear()
@@ -507,22 +584,15 @@ async def process_reject_reason(message: Message, state: FSMContext, session: As
             await message.answer("Ошибка: данные клиента недоступны.", reply_markup=get_admin_keyboard())
             await state.clear()
             return
-        logger.debug(f"Updating appointment {appointment_id}: status=CANCELED, reason={reason}")
-        appointment.status = AppointmentStatus.CANCELED
-        appointment.reject_reason = reason
+        await crud.transition_appointment(appointment.id, "reject", version=appointment.version, reject_reason=reason)
+        await crud.add_outbox_message(outbox.CLIENT_REJECTED, appointment.id)
         await session.commit()
-        from services.notifications import notify_client_rejected
-        try:
-            await notify_client_rejected(bot, appointment, reason)
-        except Exception as e:
-            logger.warning(f"Failed to notify client {appointment.client.user.telegram_id} for appointment {appointment_id}: {e}")
-            await bot.send_message(
-                config.ADMIN_ID,
-                escape_markdown_v2(f"Ошибка: Не удалось уведомить клиента о заявке #{appointment.id}."),
-                parse_mode="MarkdownV2"
-            )
+        reminder_scheduler.cancel(appointment.id)
+        outbox_worker.wake()
         await message.answer(f"Заявка #{appointment.id} отклонена.", reply_markup=get_admin_keyboard())
         logger.info(f"Admin {message.from_user.id} rejected appointment {appointment_id}: {reason}")
+    except AppointmentTransitionError:
+        await message.answer("Заявка уже обработана.", reply_markup=get_admin_keyboard())
     except Exception as e:
         logger.error(f"Failed to reject appointment {appointment_id} by admin {message.from_user.id}: {e}", exc_info=True)
         await session.rollback()
@@ -531,11 +601,10 @@ async def process_reject_reason(message: Message, state: FSMContext, session: As
         await state.clear()
 
 @router.callback_query(F.data.startswith("cancel_"))
-async def reject_new_appointment(callback: CallbackQuery, state: FSMContext, session: AsyncSession, bot):
+async def reject_new_appointment(callback: CallbackQuery, state: FSMContext, session: AsyncSession, bot, identity: Identity):
     telegram_id = callback.from_user.id
     crud = CRUD(session)
-    user = await crud.get_user(str(telegram_id))
-    if not user or user.role != Role.ADMIN:
+    if not identity.is_admin:
         await callback.message.edit_text("У вас нет прав администратора.", reply_markup=None)
         await callback.answer()
         return
@@ -571,81 +640,86 @@ async def abort_reject(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text("Действие отклонения заявки отменено.", reply_markup=None)
     await state.clear()
 
+def _specialists_view(page: int, total_pages: int, specialists, has_prev: bool,
+                      has_next: bool) -> tuple[str, InlineKeyboardMarkup]:
+    response = f"<b>Список специалистов (Страница {page + 1}/{total_pages}):</b>\n\n"
+    buttons = []
+    for spec in specialists:
+        username = f"@{spec.username}" if spec.username else f"ID: {spec.user_id}"
+        response += f"Специалист: {spec.full_name} ({username})\n"
+        buttons.append(
+            [InlineKeyboardButton(text=f"{spec.full_name}", callback_data=f"view_specialist_{spec.user_id}")]
+        )
+    nav_buttons = _nav_buttons("specialists_page", has_prev, has_next)
+    if nav_buttons:
+        buttons.append(nav_buttons)
+    buttons.append([InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")])
+    return response, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def _specialist_appointments_view(specialist, page: int, total_pages: int, appointments, has_prev: bool,
+                                  has_next: bool) -> tuple[str, InlineKeyboardMarkup]:
+    response = f"<b>Заявки специалиста {specialist.full_name} (Страница {page + 1}/{total_pages}):</b>\n\n"
+    buttons = []
+    for app in appointments:
+        scheduled_time = app.scheduled_time.astimezone(config.TIMEZONE).strftime(
+            "%d.%m.%Y %H:%M") if app.scheduled_time else "Не назначено"
+        reason = app.reason[:100] + "..." if len(app.reason) > 100 else app.reason
+        response += (
+            f"Заявка #{app.id}\n"
+            f"Клиент: {app.client.full_name}\n"
+            f"Время: {scheduled_time}\n"
+            f"Статус: {app.status.value}\n"
+            f"Причина: {reason}\n\n"
+        )
+        if app.status == AppointmentStatus.APPROVED:
+            buttons.append(
+                [InlineKeyboardButton(text="🔄 Переназначить", callback_data=f"reassign_{app.id}")]
+            )
+    nav_buttons = _nav_buttons("spec_appointments_page", has_prev, has_next)
+    if nav_buttons:
+        buttons.append(nav_buttons)
+    buttons.append([InlineKeyboardButton(text="Назад к специалистам", callback_data="back_to_specialists")])
+    return response, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def _first_specialists_page(state: FSMContext, crud: CRUD) -> tuple[str, InlineKeyboardMarkup] | None:
+    total = await crud.count_specialists()
+    if not total:
+        return None
+    total_pages = (total + SPECIALISTS_PER_PAGE - 1) // SPECIALISTS_PER_PAGE
+    await state.set_state(AdminStates.view_specialists)
+    await state.set_data({"total_pages": total_pages})
+    fetch = partial(crud.get_specialists_page, limit=SPECIALISTS_PER_PAGE)
+    page, specialists, has_prev, has_next = await _turn_page(state, fetch, lambda spec: (spec.id,))
+    return _specialists_view(page, total_pages, specialists, has_prev, has_next)
+
+
 @router.message(F.text == "📋 Назначенные встречи")
-async def show_assigned_appointments(message: Message, state: FSMContext, session: AsyncSession):
+async def show_assigned_appointments(message: Message, state: FSMContext, session: AsyncSession, identity: Identity):
     """Show list of specialists to view their assigned appointments."""
-    telegram_id = message.from_user.id
-    crud = CRUD(session)
-    user = await crud.get_user(str(telegram_id))
-    if not user or user.role != Role.ADMIN:
+    if not identity.is_admin:
         await message.answer("У вас нет прав администратора!")
         return
-    specialists = await crud.get_all_specialists()
-    if not specialists:
+    crud = CRUD(session)
+    view = await _first_specialists_page(state, crud)
+    if not view:
         await message.answer("Нет зарегистрированных специалистов.", reply_markup=get_admin_keyboard())
         await state.clear()
         return
-    SPECIALISTS_PER_PAGE = 10
-    page = 0
-    total_pages = (len(specialists) + SPECIALISTS_PER_PAGE - 1) // SPECIALISTS_PER_PAGE
-
-    def get_specialists_page(page: int) -> tuple[str, InlineKeyboardMarkup]:
-        start_idx = page * SPECIALISTS_PER_PAGE
-        end_idx = min(start_idx + SPECIALISTS_PER_PAGE, len(specialists))
-        response = f"<b>Список специалистов (Страница {page + 1}/{total_pages}):</b>\n\n"
-        buttons = []
-        for spec in specialists[start_idx:end_idx]:
-            username = f"@{spec.username}" if spec.username else f"ID: {spec.user_id}"
-            response += f"Специалист: {spec.full_name} ({username})\n"
-            buttons.append(
-                [InlineKeyboardButton(text=f"{spec.full_name}", callback_data=f"view_specialist_{spec.user_id}")]
-            )
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"specialists_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"specialists_page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")])
-        return response, InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    response, keyboard = get_specialists_page(page)
+    response, keyboard = view
     await message.answer(response, reply_markup=keyboard, parse_mode="HTML")
-    await state.set_state(AdminStates.view_specialists)
-    await state.update_data(total_pages=total_pages, specialists=specialists)
 
 @router.callback_query(F.data.startswith("specialists_page_"), AdminStates.view_specialists)
 async def paginate_specialists(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Paginate through specialists list."""
-    page = int(callback.data.split("_")[-1])
+    direction = callback.data.rsplit("_", 1)[-1]
     data = await state.get_data()
-    specialists = data.get("specialists", [])
     total_pages = data.get("total_pages", 1)
-    SPECIALISTS_PER_PAGE = 10
-
-    def get_specialists_page(page: int) -> tuple[str, InlineKeyboardMarkup]:
-        start_idx = page * SPECIALISTS_PER_PAGE
-        end_idx = min(start_idx + SPECIALISTS_PER_PAGE, len(specialists))
-        response = f"<b>Список специалистов (Страница {page + 1}/{total_pages}):</b>\n\n"
-        buttons = []
-        for spec in specialists[start_idx:end_idx]:
-            username = f"@{spec.username}" if spec.username else f"ID: {spec.user_id}"
-            response += f"Специалист: {spec.full_name} ({username})\n"
-            buttons.append(
-                [InlineKeyboardButton(text=f"{spec.full_name}", callback_data=f"view_specialist_{spec.user_id}")]
-            )
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"specialists_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"specialists_page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")])
-        return response, InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    response, keyboard = get_specialists_page(page)
+    crud = CRUD(session)
+    fetch = partial(crud.get_specialists_page, limit=SPECIALISTS_PER_PAGE)
+    page, specialists, has_prev, has_next = await _turn_page(state, fetch, lambda spec: (spec.id,), direction)
+    response, keyboard = _specialists_view(page, total_pages, specialists, has_prev, has_next)
     await callback.message.edit_text(response, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
 
@@ -659,101 +733,38 @@ async def view_specialist_appointments(callback: CallbackQuery, state: FSMContex
         await callback.message.edit_text("Специалист не найден.", reply_markup=None)
         await state.clear()
         return
-    appointments = await crud.get_appointments_by_specialist(specialist_id)
-    appointments = [app for app in appointments if app.status in [AppointmentStatus.APPROVED, AppointmentStatus.PENDING]]
-    if not appointments:
+    total = await crud.count_active_specialist_appointments(specialist.id)
+    if not total:
         await callback.message.edit_text(
             f"Нет назначенных заявок для специалиста {specialist.full_name}.",
             reply_markup=get_admin_inline_keyboard()
         )
         await state.clear()
         return
-    APPOINTMENTS_PER_PAGE = 5
-    page = 0
-    total_pages = (len(appointments) + APPOINTMENTS_PER_PAGE - 1) // APPOINTMENTS_PER_PAGE
-
-    def get_appointments_page(page: int) -> tuple[str, InlineKeyboardMarkup]:
-        start_idx = page * APPOINTMENTS_PER_PAGE
-        end_idx = min(start_idx + APPOINTMENTS_PER_PAGE, len(appointments))
-        response = f"<b>Заявки специалиста {specialist.full_name} (Страница {page + 1}/{total_pages}):</b>\n\n"
-        buttons = []
-        for app in appointments[start_idx:end_idx]:
-            scheduled_time = app.scheduled_time.astimezone(config.TIMEZONE).strftime(
-                "%d.%m.%Y %H:%M") if app.scheduled_time else "Не назначено"
-            reason = app.reason[:100] + "..." if len(app.reason) > 100 else app.reason
-            response += (
-                f"Заявка #{app.id}\n"
-                f"Клиент: {app.client.full_name}\n"
-                f"Время: {scheduled_time}\n"
-                f"Статус: {app.status.value}\n"
-                f"Причина: {reason}\n\n"
-            )
-            if app.status == AppointmentStatus.APPROVED:
-                buttons.append(
-                    [InlineKeyboardButton(text="🔄 Переназначить", callback_data=f"reassign_{app.id}")]
-                )
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"spec_appointments_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"spec_appointments_page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton(text="Назад к специалистам", callback_data="back_to_specialists")])
-        return response, InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    response, keyboard = get_appointments_page(page)
-    await callback.message.edit_text(response, reply_markup=keyboard, parse_mode="HTML")
+    total_pages = (total + APPOINTMENTS_PER_PAGE - 1) // APPOINTMENTS_PER_PAGE
     await state.set_state(AdminStates.view_specialist_appointments)
-    await state.update_data(specialist_id=specialist_id, total_pages=total_pages, appointments=appointments)
+    await state.set_data({"specialist_id": specialist_id, "total_pages": total_pages})
+    fetch = partial(crud.get_active_specialist_appointments_page, specialist.id, limit=APPOINTMENTS_PER_PAGE)
+    page, appointments, has_prev, has_next = await _turn_page(state, fetch, lambda app: (app.id,))
+    response, keyboard = _specialist_appointments_view(specialist, page, total_pages, appointments, has_prev, has_next)
+    await callback.message.edit_text(response, reply_markup=keyboard, parse_mode="HTML")
 
 @router.callback_query(F.data.startswith("spec_appointments_page_"), AdminStates.view_specialist_appointments)
 async def paginate_specialist_appointments(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Paginate through specialist's appointments."""
-    page = int(callback.data.split("_")[-1])
+    direction = callback.data.rsplit("_", 1)[-1]
     data = await state.get_data()
     specialist_id = data.get("specialist_id")
-    appointments = data.get("appointments", [])
     total_pages = data.get("total_pages", 1)
-    APPOINTMENTS_PER_PAGE = 5
     crud = CRUD(session)
     specialist = await crud.get_specialist(specialist_id)
     if not specialist:
         await callback.message.edit_text("Специалист не найден.", reply_markup=None)
         await state.clear()
         return
-
-    def get_appointments_page(page: int) -> tuple[str, InlineKeyboardMarkup]:
-        start_idx = page * APPOINTMENTS_PER_PAGE
-        end_idx = min(start_idx + APPOINTMENTS_PER_PAGE, len(appointments))
-        response = f"<b>Заявки специалиста {specialist.full_name} (Страница {page + 1}/{total_pages}):</b>\n\n"
-        buttons = []
-        for app in appointments[start_idx:end_idx]:
-            scheduled_time = app.scheduled_time.astimezone(config.TIMEZONE).strftime(
-                "%d.%m.%Y %H:%M") if app.scheduled_time else "Не назначено"
-            reason = app.reason[:100] + "..." if len(app.reason) > 100 else app.reason
-            response += (
-                f"Заявка #{app.id}\n"
-                f"Клиент: {app.client.full_name}\n"
-                f"Время: {scheduled_time}\n"
-                f"Статус: {app.status.value}\n"
-                f"Причина: {reason}\n\n"
-            )
-            if app.status == AppointmentStatus.APPROVED:
-                buttons.append(
-                    [InlineKeyboardButton(text="🔄 Переназначить", callback_data=f"reassign_{app.id}")]
-                )
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"spec_appointments_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"spec_appointments_page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton(text="Назад к специалистам", callback_data="back_to_specialists")])
-        return response, InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    response, keyboard = get_appointments_page(page)
+    fetch = partial(crud.get_active_specialist_appointments_page, specialist.id, limit=APPOINTMENTS_PER_PAGE)
+    page, appointments, has_prev, has_next = await _turn_page(state, fetch, lambda app: (app.id,), direction)
+    response, keyboard = _specialist_appointments_view(specialist, page, total_pages, appointments, has_prev, has_next)
     await callback.message.edit_text(response, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
 
@@ -761,40 +772,13 @@ async def paginate_specialist_appointments(callback: CallbackQuery, state: FSMCo
 async def back_to_specialists(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Return to specialists list."""
     crud = CRUD(session)
-    specialists = await crud.get_all_specialists()
-    if not specialists:
+    view = await _first_specialists_page(state, crud)
+    if not view:
         await callback.message.edit_text("Нет зарегистрированных специалистов.", reply_markup=get_admin_keyboard())
         await state.clear()
         return
-    SPECIALISTS_PER_PAGE = 10
-    page = 0
-    total_pages = (len(specialists) + SPECIALISTS_PER_PAGE - 1) // SPECIALISTS_PER_PAGE
-
-    def get_specialists_page(page: int) -> tuple[str, InlineKeyboardMarkup]:
-        start_idx = page * SPECIALISTS_PER_PAGE
-        end_idx = min(start_idx + SPECIALISTS_PER_PAGE, len(specialists))
-        response = f"<b>Список специалистов (Страница {page + 1}/{total_pages}):</b>\n\n"
-        buttons = []
-        for spec in specialists[start_idx:end_idx]:
-            username = f"@{spec.username}" if spec.username else f"ID: {spec.user_id}"
-            response += f"Специалист: {spec.full_name} ({username})\n"
-            buttons.append(
-                [InlineKeyboardButton(text=f"{spec.full_name}", callback_data=f"view_specialist_{spec.user_id}")]
-            )
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"specialists_page_{page - 1}"))
-        if page < total_pages - 1:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"specialists_page_{page + 1}"))
-        if nav_buttons:
-            buttons.append(nav_buttons)
-        buttons.append([InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")])
-        return response, InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    response, keyboard = get_specialists_page(page)
+    response, keyboard = view
     await callback.message.edit_text(response, reply_markup=keyboard, parse_mode="HTML")
-    await state.set_state(AdminStates.view_specialists)
-    await state.update_data(total_pages=total_pages, specialists=specialists)
     await callback.answer()
 
 @router.callback_query(F.data.startswith("reassign_"), AdminStates.view_specialist_appointments)
@@ -843,54 +827,38 @@ async def process_reassign_specialist(callback: CallbackQuery, state: FSMContext
         await callback.message.edit_text("Специалист не найден.", reply_markup=None)
         await state.clear()
         return
-    try:
-        await bot.send_message(new_specialist.user_id, "Проверка доступности бота.")
-    except TelegramBadRequest as e:
-        logger.error(f"Cannot message specialist {new_specialist.user_id}: {e}")
+    if not reachability.is_reachable(new_specialist.user_id):
+        logger.error(f"Cannot message specialist {new_specialist.user_id}: {reachability.reason(new_specialist.user_id)}")
         await callback.message.edit_text(
             f"Специалист {new_specialist.full_name} недоступен (возможно, бот заблокирован или ID неверный).",
             reply_markup=None
         )
         await state.clear()
         return
-    appointment.specialist_id = new_specialist.id
+    if appointment.status != AppointmentStatus.APPROVED:
+        appointment.specialist_id = new_specialist.id
+    elif not await slot_engine.reserve(
+        crud, appointment_id, new_specialist.id, appointment.scheduled_time, from_status=AppointmentStatus.APPROVED
+    ):
+        await callback.message.edit_text(
+            f"У специалиста {new_specialist.full_name} уже есть заявка на это время.",
+            reply_markup=None
+        )
+        await state.clear()
+        return
     appointment.client_ready = False
     appointment.specialist_ready = False
-    await session.commit()
-    try:
-        await notify_client_reassigned(bot, appointment)
-    except Exception as e:
-        logger.error(f"Failed to notify client for reassigned appointment {appointment_id}: {e}")
-        await bot.send_message(
-            config.ADMIN_ID,
-            escape_markdown_v2(f"Ошибка: Не удалось уведомить клиента о переназначении заявки #{appointment_id}."),
-            parse_mode="MarkdownV2"
-        )
-    try:
-        await notify_specialist(bot, appointment, is_reassignment=True)
-    except Exception as e:
-        logger.error(f"Failed to notify new specialist {new_specialist.user_id} for reassigned appointment {appointment_id}: {e}")
-        await bot.send_message(
-            config.ADMIN_ID,
-            escape_markdown_v2(f"Ошибка: Не удалось уведомить специалиста {new_specialist.full_name} о переназначении заявки #{appointment_id}."),
-            parse_mode="MarkdownV2"
-        )
-        new_specialist.is_available = False
-        await session.commit()
+    await crud.add_outbox_message(outbox.CLIENT_REASSIGNED, appointment.id)
+    await crud.add_outbox_message(outbox.SPECIALIST_REASSIGNED, appointment.id)
     if old_specialist and old_specialist.is_available:
-        try:
-            text = escape_markdown_v2(
-                f"Заявка #{appointment.id} была переназначена на другого специалиста.\n"
-                f"Клиент: {appointment.client.full_name}\n"
-                f"Время: {appointment.scheduled_time.astimezone(config.TIMEZONE).strftime('%d.%m.%Y %H:%M')}"
-            )
-            await bot.send_message(
-                old_specialist.user_id,
-                text,
-                parse_mode="MarkdownV2"
-            )
-        except TelegramBadRequest as e:
-            logger.warning(f"Failed to notify old specialist {old_specialist.user_id} for reassigned appointment {appointment_id}: {e}")
+        await crud.add_outbox_message(
+            outbox.SPECIALIST_UNASSIGNED, appointment.id, {"specialist_user_id": old_specialist.user_id}
+        )
+    await session.commit()
+    if appointment.status == AppointmentStatus.APPROVED:
+        # scheduled_time читается из SQLite без зоны; планировщик трактует его как время config.TIMEZONE
+        reminder_scheduler.schedule(appointment.id, appointment.scheduled_time)
+    outbox_worker.wake()
     await callback.message.edit_text(
         f"Заявка #{appointment.id} переназначена на {new_specialist.full_name}.",
         reply_markup=None
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import joinedload
+from config import config
+from database.models import User, Role, Client, Specialist, Appointment, AppointmentStatus
+from database.migrations import run_migrations
+from database.crud import CRUD
+from services.notifications import SPECIALIST_REMINDER, APPOINTMENT_DETAILS, CLIENT_DETAILS, CLIENT_CONTACT
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    seconds: float  # лучшее время из повторов
+    peak_bytes: int  # пик памяти tracemalloc за один прогон
+
+
+async def _seed(engine: AsyncEngine, appointments: int, specialists: int = 20):
+    """Заполняет БД в памяти клиентами, специалистами и одобренными заявками."""
+    now = datetime.now(tz=config.TIMEZONE)
+    async with AsyncSession(engine) as session:
+        session.add_all([User(telegram_id=f"c{i}", role=Role.CLIENT) for i in range(appointments)])
+        session.add_all([Client(user_id=f"c{i}", full_name=f"Client {i}", phone="+70000000000") for i in range(appointments)])
+        session.add_all([
+            Specialist(user_id=f"s{i}", full_name=f"Specialist {i}", username=f"@specialist{i}")
+            for i in range(specialists)
+        ])
+        await session.flush()
+        session.add_all([
+            Appointment(
+                client_id=i + 1,
+                specialist_id=i % specialists + 1,
+                proposed_date=now,
+                scheduled_time=now + timedelta(minutes=30 * i),
+                reason="Benchmark appointment " * 4,
+                status=AppointmentStatus.APPROVED
+            )
+            for i in range(appointments)
+        ])
+        await session.commit()
+
+
+async def _measure(name: str, run: Callable[[], Awaitable], repeat: int) -> BenchmarkResult:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await run()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        await run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return BenchmarkResult(name, best, peak)
+
+
+async def benchmark_read_models(appointments: int = 2000, repeat: int = 5) -> list[BenchmarkResult]:
+    """
+    Сравнивает чтение заявок для отображения: ORM-граф с joinedload против AppointmentCard.
+    Args:
+        appointments: Сколько заявок создать и прочитать.
+        repeat: Число повторов для замера времени.
+    Returns:
+        Результаты для обоих способов; каждый прогон читает все заявки и все поля, нужные уведомлениям.
+    """
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        await run_migrations(engine)
+        await _seed(engine, appointments)
+        ids = list(range(1, appointments + 1))
+
+        def render(items) -> int:
+            return sum(
+                len(item.client.full_name) + len(item.client.user.telegram_id) + len(item.reason)
+                + (len(item.specialist.full_name) if item.specialist else 0)
+                for item in items
+            )
+
+        async def orm():
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                result = await session.execute(
+                    select(Appointment)
+                    .where(Appointment.id.in_(ids))
+                    .options(joinedload(Appointment.client).joinedload(Client.user), joinedload(Appointment.specialist))
+                )
+                render(result.scalars().all())
+
+        async def cards():
+            async with AsyncSession(engine) as session:
+                render(await CRUD(session).get_appointment_cards_by_ids(ids))
+
+        return [
+            await _measure("orm joinedload", orm, repeat),
+            await _measure("AppointmentCard", cards, repeat),
+        ]
+    finally:
+        await engine.dispose()
+
+
+async def benchmark_statements(calls: int = 2000, repeat: int = 5) -> list[BenchmarkResult]:
+    """
+    Сравнивает накладные расходы поиска специалиста по telegram_id: запрос, собираемый на
+    каждый вызов, против готового запроса из database.statements (CRUD.get_specialist).
+    Args:
+        calls: Число вызовов в одном прогоне.
+        repeat: Число повторов для замера времени.
+    """
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        await run_migrations(engine)
+        await _seed(engine, appointments=100)
+
+        async def inline():
+            async with AsyncSession(engine) as session:
+                for i in range(calls):
+                    result = await session.execute(
+                        select(Specialist)
+                        .where(Specialist.user_id == f"s{i % 20}")
+                        .options(joinedload(Specialist.user))
+                    )
+                    result.scalars().first()
+
+        async def prebuilt():
+            async with AsyncSession(engine) as session:
+                crud = CRUD(session)
+                for i in range(calls):
+                    await crud.get_specialist(f"s{i % 20}")
+
+        return [
+            await _measure("inline select", inline, repeat),
+            await _measure("statements", prebuilt, repeat),
+        ]
+    finally:
+        await engine.dispose()
+
+
+def _escape_by_replace(text) -> str:
+    # Прежний экранировщик: по одному str.replace на каждый специальный символ
+    if text is None:
+        return ""
+    text = str(text)
+    for char in r'_*[]()~`#+-=|{}.!':
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+async def benchmark_templates(renders: int = 2000, repeat: int = 5) -> list[BenchmarkResult]:
+    """
+    Сравнивает сборку напоминания специалисту: построчное экранирование f-строк против шаблонов.
+    Args:
+        renders: Число сообщений в одном прогоне.
+        repeat: Число повторов для замера времени.
+    """
+    values = {
+        "id": 1234,
+        "time_until": "через 1 час",
+        "time": "18.10.2026 10:30",
+        "client_name": "Иванов Иван (тест-клиент)",
+        "link": "https://t.me/ivanov_ivan",
+        "phone": "+7-900-000-00-00",
+        "complex": "Комплекс #2",
+        "reason": "Плановая тренировка. Спина, плечи — без нагрузки на колено!",
+    }
+
+    async def lines():
+        for _ in range(renders):
+            "\n".join([
+                _escape_by_replace(f"⏰ Напоминание: заявка #{values['id']} {values['time_until']} в {values['time']}!"),
+                _escape_by_replace(f"👤 Клиент: {values['client_name']}"),
+                _escape_by_replace(f"Контакт клиента: [{values['link']}]"),
+                _escape_by_replace(f"📞 Номер телефона: {values['phone']}"),
+                _escape_by_replace(f"🏋️ Комплекс: {values['complex']}"),
+                _escape_by_replace(f"📝 Причина: {values['reason']}"),
+                _escape_by_replace("Подтвердите готовность в расписании."),
+            ])
+
+    async def templates():
+        for _ in range(renders):
+            SPECIALIST_REMINDER.render(
+                id=values["id"],
+                time_until=values["time_until"],
+                time=values["time"],
+                client=CLIENT_DETAILS.render(
+                    client_name=values["client_name"],
+                    contact=CLIENT_CONTACT.render(link=values["link"]),
+                    phone=values["phone"]
+                ),
+                details=APPOINTMENT_DETAILS.render(complex=values["complex"], reason=values["reason"])
+            )
+
+    return [
+        await _measure("escaped f-string lines", lines, repeat),
+        await _measure("Template.render", templates, repeat),
+    ]
+
+
+def _report(title: str, results: list[BenchmarkResult]):
+    print(title)
+    for result in results:
+        print(f"  {result.name:<24} {result.seconds * 1000:9.2f} ms  {result.peak_bytes / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    # python -m database.benchmarks [число заявок, вызовов и сообщений]
+    logging.basicConfig(level=logging.WARNING)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    _report(f"Read models, {count} appointments:", asyncio.run(benchmark_read_models(count)))
+    _report(f"Specialist lookup, {count} calls:", asyncio.run(benchmark_statements(count)))
+    _report(f"Reminder messages, {count} renders:", asyncio.run(benchmark_templates(count)))
@@ -0,0 +1,172 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from config import config
+from database.database import create_session
+from database.crud import CRUD
+from database.models import Blacklist
+
+logger = logging.getLogger(__name__)
+
+
+class BlacklistIndex:
+    """
+    Active bans held in memory so blocked users are rejected without touching the database.
+
+    Bans live in a dict keyed by telegram_id (the set of blocked users, with their
+    `blocked_until`) and in a min-heap ordered by `blocked_until`, so expired bans are popped
+    in O(log n) as time passes. Heap entries are removed lazily: an entry whose deadline no
+    longer matches the dict is skipped.
+
+    Bans added, changed or deleted through the ORM reach the index as soon as their session
+    commits (see the session hooks below). A background loop deletes expired rows from the
+    `blacklist` table in bulk and, every `sync_interval`, reconciles the index with the
+    active bans, which only matters for changes made outside the bot.
+    """
+
+    def __init__(self, sync_interval: float = 300, purge_interval: float = 3600,
+                 clock: Callable[[], datetime] | None = None):
+        self.sync_interval = sync_interval
+        self.purge_interval = purge_interval
+        # clock: current time in config.TIMEZONE (tests pass a fake one)
+        self._clock = clock or (lambda: datetime.now(tz=config.TIMEZONE))
+        self._blocked: dict[str, datetime] = {}
+        self._heap: list[tuple[datetime, str]] = []
+        self._changed: set[str] = set()  # keys changed by commits while a reconcile is running
+        self._task: asyncio.Task | None = None
+
+    def _expire(self, now: datetime):
+        while self._heap and self._heap[0][0] <= now:
+            until, telegram_id = heapq.heappop(self._heap)
+            if self._blocked.get(telegram_id) == until:
+                del self._blocked[telegram_id]
+
+    def is_blocked(self, telegram_id) -> bool:
+        """
+        Check whether the user is banned right now; no database query.
+        Args:
+            telegram_id: Telegram user ID.
+        """
+        self._expire(self._clock())
+        return str(telegram_id) in self._blocked
+
+    def block(self, telegram_id, blocked_until: datetime):
+        """
+        Record a ban added to the `blacklist` table.
+        Args:
+            telegram_id: Telegram user ID.
+            blocked_until (datetime): End of the ban.
+        """
+        if blocked_until.tzinfo is None:
+            blocked_until = config.TIMEZONE.localize(blocked_until)
+        key = str(telegram_id)
+        self._changed.add(key)
+        if self._blocked.get(key) == blocked_until:
+            return
+        self._blocked[key] = blocked_until
+        heapq.heappush(self._heap, (blocked_until, key))
+
+    def unblock(self, telegram_id):
+        """Forget a ban removed from the `blacklist` table."""
+        key = str(telegram_id)
+        self._changed.add(key)
+        self._blocked.pop(key, None)
+
+    async def load(self):
+        """
+        Reconcile the index with the active bans in the database.
+
+        Only differences touch the dict and the heap. Keys changed by a commit while the query
+        was running are left alone, since the query may predate that commit.
+        """
+        self._changed = set()
+        now = self._clock()
+        async with create_session() as session:
+            entries = await CRUD(session).get_active_blacklist(now)
+        active = {}
+        for telegram_id, blocked_until in entries:
+            if blocked_until.tzinfo is None:
+                blocked_until = config.TIMEZONE.localize(blocked_until)
+            active[str(telegram_id)] = blocked_until
+        changed = self._changed
+        for key in self._blocked.keys() - active.keys() - changed:
+            del self._blocked[key]
+        for key, blocked_until in active.items():
+            if key not in changed:
+                self.block(key, blocked_until)
+        logger.debug(f"Reconciled {len(self._blocked)} active bans")
+
+    async def purge(self) -> int:
+        """Delete expired bans from the database."""
+        async with create_session() as session:
+            return await CRUD(session).delete_expired_blacklist(self._clock())
+
+    def start(self):
+        """Start the sync and purge loop in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        last_purge = 0.0
+        while True:
+            if time.monotonic() - last_purge >= self.purge_interval:
+                last_purge = time.monotonic()
+                try:
+                    await self.purge()
+                except Exception as e:
+                    logger.error(f"Blacklist purge failed: {e}", exc_info=True)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Failed to load blacklist: {e}", exc_info=True)
+            await asyncio.sleep(self.sync_interval)
+
+
+blacklist_index = BlacklistIndex()
+
+# session.info key: ban changes applied to the index once the session commits
+_PENDING_BANS = "pending_bans"
+
+
+def _record_ban(session: Session | None, telegram_id, blocked_until: datetime | None):
+    if session is not None:
+        session.info.setdefault(_PENDING_BANS, []).append((telegram_id, blocked_until))
+
+
+@event.listens_for(Blacklist, "after_insert")
+@event.listens_for(Blacklist, "after_update")
+def _ban_saved(mapper, connection, target):
+    _record_ban(object_session(target), target.telegram_id, target.blocked_until)
+
+
+@event.listens_for(Blacklist, "after_delete")
+def _ban_deleted(mapper, connection, target):
+    _record_ban(object_session(target), target.telegram_id, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_bans(session: Session):
+    for telegram_id, blocked_until in session.info.pop(_PENDING_BANS, []):
+        if blocked_until is None:
+            blacklist_index.unblock(telegram_id)
+        else:
+            blacklist_index.block(telegram_id, blocked_until)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_bans(session: Session):
+    session.info.pop(_PENDING_BANS, None)
@@ -1,6 +1,10 @@
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from services.scheduler import reminder_scheduler
+from services.outbound import outbound, Priority
+from services.identity import identity_cache
+from database.crud import AppointmentTransitionError
 
     logger.info(f"Processing /start for telegram_id={telegram_id}")
     if telegram_id == config.ADMIN_ID:
@@ -9,11 +13,13 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
             if user.role != Role.ADMIN:
                 user.role = Role.ADMIN
                 await session.commit()
+                identity_cache.invalidate(telegram_id)
                 logger.info(f"Updated role to ADMIN for telegram_id={telegram_id}")
         else:
             user = User(telegram_id=str(telegram_id), role=Role.ADMIN)
             session.add(user)
             await session.commit()
+            identity_cache.invalidate(telegram_id)
             logger.info(f"Created admin with telegram_id={telegram_id}")
         await message.answer("Добро пожаловать, администратор! Используйте /admin для управления.")
         return
@@ -35,6 +41,8 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
             return
     user = User(telegram_id=str(telegram_id), role=Role.CLIENT)
     await crud.create_user(user.telegram_id, user.role)
+    await session.commit()
+    identity_cache.invalidate(telegram_id)
     await message.answer("Введите ваше полное имя:")
     await state.set_state(ClientStates.registration)
 
@@ -50,6 +58,8 @@ async def process_full_name(message: Message, state: FSMContext):
 
 @router.message(ClientStates.city)
 async def process
+        await session.commit()
+        identity_cache.invalidate(telegram_id)
         await state.clear()
     except Exception as e:
         logger.error(f"Failed to create client {telegram_id}: {e}")
@@ -100,9 +110,8 @@ async def process_date(message: Message, state: FSMContext):
             status=AppointmentStatus.PENDING
         )
         await crud.create_appointment(appointment)
-        avg_rating = (client.rating / client.rating_count) if client.rating_count > 0 else 0
         admin_message = escape_markdown_v2(
-            f"Новая заявка #{appointment.id} от {client.full_name} (ср. рейтинг: {avg_rating:.1f}):\n{description}"
+            f"Новая заявка #{appointment.id} от {client.full_name} (ср. рейтинг: {client.rating_avg or 0:.1f}):\n{description}"
         )
     appointments = await crud.get_appointments_by_client(client.id)
     if not appointments:
@@ -139,10 +148,15 @@ async def process_date(message: Message, state: FSMContext):
     if not username or not username.strip():
         message_lines.append(f"Если не можете связаться со специалистом, обратитесь к администратору: [Администратор](https://t.me/{config.ADMIN_ID})")
     try:
-        await bot.send_message(
+        await outbound.send_message(
             ap
         return
-    appointment.client_ready = True  # Set client_ready instead of status
+    try:
+        await crud.transition_appointment(appointment.id, "client_ready", version=appointment.version)
+    except AppointmentTransitionError:
+        await callback.message.edit_text("Заявка не найдена, не подтверждена или вы уже подтвердили готовность.")
+        await callback.answer()
+        return
     await session.commit()
     scheduled_time = format_appointment_date(appointment.scheduled_time)
     username = appointment.specialist.username
@@ -165,21 +179,29 @@ async def client_refuse_appointment(callback: CallbackQuery, state: FSMContext):
 
             ])
         )
+        reminder_scheduler.cancel(appointment.id)
         await message.answer("Выберите новую дату (в формате ДД.ММ.ГГГГ):")
         await state.set_state(ClientStates.enter_date)
     elif action == "refuse":
-        appointment.status = AppointmentStatus.CANCELED
-        appointment.reject_reason = reason
+        try:
+            await CRUD(session).transition_appointment(
+                appointment.id, "client_refuse", version=appointment.version, reject_reason=reason
+            )
+        except AppointmentTransitionError:
+            await message.answer("Заявка уже обработана.", reply_markup=get_client_keyboard())
+            await state.clear()
+            return
         await session.commit()
+        reminder_scheduler.cancel(appointment.id)
         admin_message = escape_markdown_v2(
             f"Клиент {appointment.client.full_name} отказался от заявки #{appointment.id}.\nПричина: {reason}"
         )
-        await bot.send_message(config.ADMIN_ID, admin_message, parse_mode="MarkdownV2")
+        await outbound.send_message(config.ADMIN_ID, admin_message, parse_mode="MarkdownV2", priority=Priority.ADMIN_ALERT)
         if appointment.specialist:
             specialist_message = escape_markdown_v2(
                 f"Клиент {appointment.client.full_name} отказался от заявки #{appointment.id}.\nПричина: {reason}"
             )
-            await bot.send_message(appointment.specialist.user_id, specialist_message, parse_mode="MarkdownV2")
+            await outbound.send_message(appointment.specialist.user_id, specialist_message, parse_mode="MarkdownV2")
         await message.answer("Заявка отменена.", reply_markup=get_client_keyboard())
         await state.clear()
 
@@ -202,16 +224,17 @@ async def client_ready_to_work(callback: CallbackQuery, session: AsyncSession, b
         f"Клиент {appointment.client.full_name} ожидает вас по заявке #{appointment.id} (время: {scheduled_time})."
     )
     try:
-        await bot.send_message(
+        await outbound.send_message(
             appointment.specialist.user_id,
             specialist_message,
-            parse_mode="MarkdownV2"
+            parse_mode="MarkdownV2",
+            wait=True
         )
         await callback.message.edit_text(
             
     response = (
         f"<b>Ваш рейтинг</b>\n\n"
-        f"Средний рейтинг: {avg_rating:.1f}\n"
+        f"Средний рейтинг: {client.rating_avg or 0:.1f}\n"
         f"Количество оценок: {client.rating_count}"
     )
     await message.answer(response, reply_markup=get_client_keyboard())
@@ -1,7 +1,6 @@
 import os
 from dotenv import load_dotenv
-from aiogram.fsm.storage.memory import MemoryStorage
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import logging
 
@@ -22,19 +21,67 @@ logger = logging.getLogger(__name__)
         }
         self.TIMEZONE = pytz.timezone("Europe/Moscow")  # Используем pytz.timezone
 
+        # Слоты записи: длительность одной встречи и обязательный перерыв между встречами
+        self.SLOT_LENGTH = timedelta(minutes=30)
+        self.SLOT_BUFFER = timedelta(minutes=0)
+
+        # Ранги специалистов: (минимум завершённых заявок, ранг) по возрастанию порога.
+        # Действующая таблица задаётся в .env без правки кода: SPECIALIST_RANKS="0:Новичок;10:Специалист"
+        ranks = os.getenv("SPECIALIST_RANKS", "").strip()
+        self.SPECIALIST_RANKS = [
+            (int(threshold), name.strip())
+            for threshold, name in (item.split(":", 1) for item in ranks.split(";") if item.strip())
+        ] if ranks else [
+            (0, "Новичок"),
+            (10, "Специалист"),
+            (25, "Опытный специалист"),
+            (50, "Эксперт"),
+        ]
+
+        # Исходящие сообщения: лимиты Telegram (~30 сообщений/с всего, ~1 сообщение/с в один чат)
+        self.OUTBOUND_GLOBAL_RATE = 30
+        self.OUTBOUND_CHAT_RATE = 1
+        self.OUTBOUND_QUEUE_SIZE = 1000
+
+        # Напоминания: reminder_type -> за сколько до начала заявки отправлять.
+        # По умолчанию одно напоминание за час; список в минутах задаётся в .env: REMINDER_OFFSETS="24h:1440;1h:60"
+        offsets = os.getenv("REMINDER_OFFSETS", "").strip()
+        self.REMINDER_OFFSETS = {
+            reminder_type.strip(): timedelta(minutes=int(minutes))
+            for reminder_type, minutes in (item.split(":", 1) for item in offsets.split(";") if item.strip())
+        } if offsets else {
+            "1h": timedelta(hours=1)
+        }
+
+        # SQLite: одно соединение на запись и пул соединений только для чтения (WAL)
+        self.DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+        self.DB_ECHO = os.getenv("DB_ECHO", "").lower() in ("1", "true", "yes")
+
+        # Выгрузка заявок: периоды длиннее этого отправляются сжатыми (.csv.gz)
+        self.EXPORT_COMPRESS_AFTER = timedelta(days=31)
+
+        # FSM: незавершённые диалоги хранятся в БД и удаляются после долгого простоя
+        self.FSM_STATE_TTL = timedelta(days=7)
+        self.FSM_MAX_DATA_SIZE = 16 * 1024  # байт сериализованных данных на один ключ
+
     def validate(self):
         """Проверка корректности настроек."""
         if not (0 <= self.WORK_HOURS["start"] < self.WORK_HOURS["end"] <= 24):
             raise ValueError("Invalid work hours configuration")
         if not (self.WORK_HOURS["start"] <= self.WORK_HOURS["lunch_start"] < self.WORK_HOURS["lunch_end"] <= self.WORK_HOURS["end"]):
             raise ValueError("Invalid lunch hours configuration")
+        if self.SLOT_LENGTH <= timedelta(0) or self.SLOT_BUFFER < timedelta(0):
+            raise ValueError("Invalid slot configuration")
+        thresholds = [threshold for threshold, _ in self.SPECIALIST_RANKS]
+        if (not thresholds or thresholds[0] != 0 or any(a >= b for a, b in zip(thresholds, thresholds[1:]))
+                or not all(name for _, name in self.SPECIALIST_RANKS)):
+            raise ValueError("Invalid specialist ranks configuration")
+        if not self.REMINDER_OFFSETS or any(offset <= timedelta(0) for offset in self.REMINDER_OFFSETS.values()):
+            raise ValueError("Invalid reminder offsets configuration")
 
 # Создание объекта конфигурации и валидация
 config = Config()
 config.validate()
 
-# Настройка хранилища FSM
-storage = MemoryStorage()
-
 # Логируем загруженные значения
 logger.info(f"Loaded config: BOT_TOKEN={config.BOT_TOKEN}, ADMIN_ID={config.ADMIN_ID}, CODE_WORD={config.CODE_WORD}")
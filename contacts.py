@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from aiogram import Bot
+from config import config
+from database.database import create_session
+from database.crud import CRUD
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ContactCache:
+    """
+    Username lookup for building contact links without calling bot.get_chat per message.
+
+    Usernames live in an LRU/TTL memory cache backed by the `chat_contacts` table. They are
+    refreshed from incoming updates (`observe`) and written to the table in batches by a
+    background flush, so after a restart the cache warms from the database. `bot.get_chat`
+    is only used for chats that were never seen or whose entry has expired.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: timedelta = timedelta(days=7),
+                 negative_ttl: timedelta = timedelta(hours=1), flush_interval: float = 30):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.flush_interval = flush_interval
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl.total_seconds())
+        self._dirty: dict[str, str | None] = {}
+        self._task: asyncio.Task | None = None
+        self.get_chat_calls = 0
+
+    def observe(self, telegram_id, username: str | None):
+        """
+        Record the username seen in an incoming update.
+        Args:
+            telegram_id: Telegram user ID.
+            username (str | None): Current username, None if the user has none.
+        """
+        key = str(telegram_id)
+        cached = self._cache.get(key, _MISSING)
+        self._cache.set(key, username)
+        if cached is _MISSING or cached != username:
+            self._dirty[key] = username
+
+    async def preload(self, telegram_ids: list):
+        """
+        Load the persisted usernames for chats missing from memory in one query.
+        Must not be called while the caller holds a session with an open transaction.
+        Args:
+            telegram_ids (list): Telegram user IDs.
+        """
+        missing = [key for key in {str(telegram_id) for telegram_id in telegram_ids} if key not in self._cache]
+        if not missing:
+            return
+        async with create_session() as session:
+            contacts = await CRUD(session).get_chat_contacts(missing)
+        now = datetime.now(tz=config.TIMEZONE)
+        for contact in contacts:
+            updated_at = contact.updated_at
+            if updated_at.tzinfo is None:
+                updated_at = config.TIMEZONE.localize(updated_at)
+            remaining = (self.ttl - (now - updated_at)).total_seconds()
+            if remaining > 0:
+                self._cache.set(contact.telegram_id, contact.username, ttl=remaining)
+
+    async def resolve(self, bot: Bot, telegram_id) -> str | None:
+        """
+        Get the username for a chat: memory, then the table, then bot.get_chat.
+        Args:
+            bot (Bot): Bot instance, used only on a cache miss.
+            telegram_id: Telegram user ID.
+        Returns:
+            str | None: Username without '@', or None if unknown.
+        """
+        key = str(telegram_id)
+        username = self._cache.get(key, _MISSING)
+        if username is not _MISSING:
+            return username
+        await self.preload([key])
+        username = self._cache.get(key, _MISSING)
+        if username is not _MISSING:
+            return username
+        self.get_chat_calls += 1
+        try:
+            chat = await bot.get_chat(telegram_id)
+        except Exception as e:
+            logger.warning(f"Cannot get username for chat {telegram_id}: {e}")
+            self._cache.set(key, None, ttl=self.negative_ttl.total_seconds())
+            return None
+        self._cache.set(key, chat.username)
+        self._dirty[key] = chat.username
+        return chat.username
+
+    async def flush(self):
+        """Write the changed usernames to the database."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            async with create_session() as session:
+                await CRUD(session).upsert_chat_contacts(dirty)
+        except Exception as e:
+            logger.error(f"Failed to save chat contacts: {e}", exc_info=True)
+            self._dirty = {**dirty, **self._dirty}
+
+    def start(self):
+        """Start the periodic flush in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic flush and write what is left."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"Contact cache stopped: hits={self._cache.hits}, misses={self._cache.misses}, get_chat={self.get_chat_calls}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+contact_cache = ContactCache()
@@ -1,16 +1,38 @@
+import json
+from datetime import date
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, update, delete, func, case, and_, or_, exists, union_all, literal, String, DateTime
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.exc import IntegrityError
+from database.models import OutboxMessage, OutboxStatus, ChatContact, ChatReachability, CANCELLED_STATUSES, FSMRecord
+from database.models import APPOINTMENT_TRANSITIONS, ExportWatermark, AppointmentDailyStat
+from database.read_models import StatusCount, StatisticsSummary, SpecialistStats, DailyVolume, Page, Identity
+from database.read_models import AppointmentCard, ClientCard, SpecialistCard, UserRef
+from database.database import UNIT_OF_WORK
+from database import statements
 fr
         logger.debug(f"Fetched user with telegram_id={telegram_id}")
         return user
 
+    async def _commit(self):
+        """
+        Фиксирует изменения. Внутри единицы работы обновления (main.DatabaseMiddleware)
+        только отправляет их в БД: фиксация одна, в конце обработки обновления.
+        """
+        if self.session.info.get(UNIT_OF_WORK):
+            await self.session.flush()
+        else:
+            await self.session.commit()
+
     async def create_client(self, client: Client):
         """
         Создает нового клиента.
         """
         self.session.add(client)
-        await self.session.commit()
+        await self._commit()
         logger.info(f"Created client with user_id={client.user_id}, full_name={client.full_name}")
         return client
 
@@ -34,26 +56,37 @@ fr
         """
         Получает специалиста по telegram_id пользователя.
         """
-        result = await self.session.execute(
-            select(Specialist)
-            .where(Specialist.user_id == telegram_id)
-            .options(joinedload(Specialist.user))
-        )
+        result = await self.session.execute(statements.SPECIALIST_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
         specialist = result.scalars().first()
         logger.debug(f"Fetched specialist for telegram_id={telegram_id}")
         return specialist
 
     async def get_available_specialists(self):
         """
-        Получает список доступных специалистов.
-        
+        Получает список доступных специалистов, которым бот может писать.
+        """
+        now = datetime.now(tz=config.TIMEZONE)
+        result = await self.session.execute(
+            select(Specialist)
+            .where(
+                Specialist.is_available == True,
+                ~exists().where(
+                    ChatReachability.telegram_id == Specialist.user_id,
+                    ChatReachability.unreachable_until > now
+                )
+            )
+            .options(joinedload(Specialist.user))
+        )
+        specialists = result.scalars().all()
+        logger.info(f"Fetched {len(specialists)} available specialists")
+        return specialists
 
     async def create_appointment(self, appointment: Appointment):
         """
         Создает новую заявку.
         """
         self.session.add(appointment)
-        await self.session.commit()
+        await self._commit()
         logger.info(f"Created appointment id={appointment.id}, client_id={appointment.client_id}")
         return appointment
 
@@ -66,34 +99,51 @@ fr
         """
         Получает все заявки специалиста.
         """
-        result = await self.session.execute(
-            select(Appointment)
-            .where(Appointment.specialist_id == specialist_id)
-            .options(joinedload(Appointment.client))
-        )
+        result = await self.session.execute(statements.APPOINTMENTS_BY_SPECIALIST, {"specialist_id": specialist_id})
         appointments = result.scalars().all()
         logger.info(f"Fetched {len(appointments)} appointments for specialist_id={specialist_id}")
         return appointments
 
-        Увеличивает счетчик завершенных заявок специалиста и обновляет ранг.
+        Увеличивает счетчик завершенных заявок специалиста и обновляет ранг одним UPDATE.
         """
-        specialist = await self.session.get(Specialist, specialist_id)
-        if specialist:
-            specialist.completed_appointments += 1
-            await self.session.commit()
-            await self.update_specialist_rank(specialist_id)  # Update string-based rank
-            logger.info(f"Incremented completed_appointments for specialist_id={specialist_id}")
+        completed = Specialist.completed_appointments + 1
+        result = await self.session.execute(
+            update(Specialist)
+            .where(Specialist.id == specialist_id)
+            .values(completed_appointments=completed, rank=self._rank_case(completed))
+            .returning(Specialist.completed_appointments, Specialist.rank),
+            execution_options={"synchronize_session": False}
+        )
+        row = result.first()
+        if row:
+            self._set_loaded(Specialist, specialist_id, row._asdict())
+            await self._commit()
+            logger.info(f"Incremented completed_appointments for specialist_id={specialist_id}: {row.completed_appointments}, rank {row.rank}")
         else:
             logger.error(f"Specialist {specialist_id} not found")
 
-    async def reset_specialist_ranks(self):
+    async def reset_specialist_ranks(self) -> int:
         """
-        Сбрасывает ранги и счетчик завершенных заявок всех специалистов.
+        Сбрасывает ранги и счетчик завершенных заявок всех специалистов: обнуляет счетчик одним UPDATE
+        и пересчитывает ранги через recompute_specialist_ranks. Возвращает число изменённых рангов.
+        """
+        result = await self.session.execute(
+            update(Specialist)
+            .where(Specialist.completed_appointments != 0)
+            .values(completed_appointments=0)
+            .returning(Specialist.id),
+            execution_options={"synchronize_session": False}
+        )
+        reset_ids = result.scalars().all()
+        for specialist_id in reset_ids:
+            self._set_loaded(Specialist, specialist_id, {"completed_appointments": 0})
+        logger.info(f"Reset completed_appointments of {len(reset_ids)} specialists")
+        return await self.recompute_specialist_ranks()
         ""
         specialist = await self.session.get(Specialist, specialist_id)
         if specialist:
             specialist.is_available = is_available
-            await self.session.commit()
+            await self._commit()
             logger.info(f"Updated specialist {specialist_id} availability to {is_available}")
             return specialist
         logger.error(f"Specialist {specialist_id} not found")
@@ -115,8 +165,10 @@ fr
         """
         Получает количество одобренных заявок.
         """
-        result = await self.session.execute(select(Appointment).where(Appointment.status == AppointmentStatus.APPROVED))
-        count = len(result.scalars().all())
+        result = await self.session.execute(
+            select(func.count(Appointment.id)).where(Appointment.status == AppointmentStatus.APPROVED)
+        )
+        count = result.scalar_one()
         logger.info(f"Fetched approved appointments count: {count}")
         return count
 
@@ -131,15 +183,19 @@ fr
         invalid_specialists = result.scalars().all()
         for specialist in invalid_specialists:
             await self.session.delete(specialist)
-        await self.session.commit()
-        
+        await self._commit()
+
+    async def create_notification(self, appointment_id: int, reminder_type: str):
+        """
+        Отмечает уведомление о заявке как отправленное.
+        """
         notification = NotificationSent(
             appointment_id=appointment_id,
             reminder_type=reminder_type,
             sent_at=datetime.now(tz=config.TIMEZONE)
         )
         self.session.add(notification)
-        await self.session.commit()
+        await self._commit()
         logger.info(f"Created notification for appointment_id={appointment_id}, type={reminder_type}")
         return notification
 
@@ -152,12 +208,10 @@ fr
      
         report = SpecialistReport(specialist_id=specialist_id, report_text=report_text)
         self.session.add(report)
-        await self.session.commit()
+        await self._commit()
         logger.info(f"Created report for specialist_id={specialist_id}")
         return report
 
-    async def update_client_rating(self, client_id: int, rating: int):
-        """
             .where(
                 Appointment.status == AppointmentStatus.APPROVED,
                 Appointment.scheduled_time >= now
@@ -168,3 +222,813 @@ fr
         appointments = result.scalars().all()
         logger.info(f"Fetched {len(appointments)} future approved appointments")
         return appointments
+
+    async def get_upcoming_reminders(self, since: datetime):
+        """
+        Получает (id, scheduled_time) одобренных заявок, начинающихся не раньше since.
+        """
+        result = await self.session.execute(statements.UPCOMING_REMINDERS, {"since": since})
+        upcoming = result.all()
+        logger.info(f"Fetched {len(upcoming)} upcoming reminders")
+        return upcoming
+
+    async def get_due_reminders(self, now: datetime, appointment_ids: list[int] | None = None):
+        """
+        Получает все пары (appointment_id, reminder_type), по которым пора отправить напоминание.
+        Один запрос: одобренные заявки × config.REMINDER_OFFSETS без записи в NotificationSent.
+        """
+        params = statements.due_reminder_params(now)
+        if appointment_ids is None:
+            result = await self.session.execute(statements.DUE_REMINDERS, params)
+        else:
+            params["appointment_ids"] = appointment_ids
+            result = await self.session.execute(statements.DUE_REMINDERS_FOR_APPOINTMENTS, params)
+        due = result.all()
+        logger.info(f"Fetched {len(due)} due reminders")
+        return due
+
+    async def mark_reminders_sent(self, reminders: list[tuple[int, str]]):
+        """
+        Отмечает напоминания отправленными одной пакетной вставкой.
+        """
+        if not reminders:
+            return
+        sent_at = datetime.now(tz=config.TIMEZONE)
+        await self.session.execute(
+            sqlite_insert(NotificationSent).on_conflict_do_nothing(),
+            [
+                {"appointment_id": appointment_id, "reminder_type": reminder_type, "sent_at": sent_at}
+                for appointment_id, reminder_type in reminders
+            ]
+        )
+        await self._commit()
+        logger.info(f"Marked {len(reminders)} reminders as sent")
+
+    async def get_appointments_by_ids(self, appointment_ids: list[int]):
+        """
+        Получает заявки по списку ID вместе с клиентом и специалистом.
+        """
+        result = await self.session.execute(
+            select(Appointment)
+            .where(Appointment.id.in_(appointment_ids))
+            .options(joinedload(Appointment.client).joinedload(Client.user), joinedload(Appointment.specialist))
+        )
+        appointments = result.scalars().all()
+        logger.debug(f"Fetched {len(appointments)} appointments by ids")
+        return appointments
+
+    async def add_outbox_message(self, kind: str, appointment_id: int, payload: dict | None = None):
+        """
+        Добавляет уведомление в outbox без коммита: запись фиксируется вместе с изменением заявки.
+        """
+        message = OutboxMessage(
+            kind=kind,
+            appointment_id=appointment_id,
+            payload=json.dumps(payload, ensure_ascii=False) if payload else None
+        )
+        self.session.add(message)
+        logger.debug(f"Queued outbox message {kind} for appointment_id={appointment_id}")
+        return message
+
+    async def get_due_outbox_messages(self, now: datetime, limit: int = 50):
+        """
+        Получает пачку ожидающих отправки уведомлений, у которых подошло время попытки.
+        """
+        result = await self.session.execute(
+            select(OutboxMessage)
+            .where(
+                OutboxMessage.status == OutboxStatus.PENDING,
+                OutboxMessage.next_attempt_at <= now
+            )
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+            .limit(limit)
+        )
+        messages = result.scalars().all()
+        logger.debug(f"Fetched {len(messages)} due outbox messages")
+        return messages
+
+    async def get_next_outbox_attempt(self):
+        """
+        Получает время ближайшей попытки среди ожидающих уведомлений.
+        """
+        result = await self.session.execute(
+            select(func.min(OutboxMessage.next_attempt_at))
+            .where(OutboxMessage.status == OutboxStatus.PENDING)
+        )
+        return result.scalar()
+
+    async def mark_outbox_sent(self, message_ids: list[int]):
+        """
+        Отмечает уведомления доставленными одним UPDATE.
+        """
+        if not message_ids:
+            return
+        await self.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_(message_ids))
+            .values(status=OutboxStatus.SENT, sent_at=datetime.now(tz=config.TIMEZONE), last_error=None)
+        )
+        await self._commit()
+        logger.info(f"Marked {len(message_ids)} outbox messages as sent")
+
+    async def mark_outbox_failed(self, message_id: int, error: str, next_attempt_at: datetime, dead: bool = False):
+        """
+        Фиксирует неудачную попытку доставки: переносит следующую попытку или переводит в DEAD.
+        """
+        await self.session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == message_id)
+            .values(
+                attempts=OutboxMessage.attempts + 1,
+                last_error=error,
+                next_attempt_at=next_attempt_at,
+                status=OutboxStatus.DEAD if dead else OutboxStatus.PENDING
+            )
+        )
+        await self._commit()
+        logger.warning(f"Outbox message {message_id} failed ({'dead' if dead else 'will retry'}): {error}")
+
+    async def get_outbox_stats(self):
+        """
+        Получает количество уведомлений outbox по статусам.
+        """
+        result = await self.session.execute(
+            select(OutboxMessage.status, func.count(OutboxMessage.id))
+            .group_by(OutboxMessage.status)
+        )
+        return {status.value: count for status, count in result.all()}
+
+    async def get_chat_contacts(self, telegram_ids: list[str]):
+        """
+        Получает сохранённые username для списка Telegram ID одним запросом.
+        """
+        if not telegram_ids:
+            return []
+        result = await self.session.execute(
+            select(ChatContact).where(ChatContact.telegram_id.in_(telegram_ids))
+        )
+        contacts = result.scalars().all()
+        logger.debug(f"Fetched {len(contacts)} chat contacts")
+        return contacts
+
+    async def upsert_chat_contacts(self, contacts: dict[str, str | None]):
+        """
+        Сохраняет username пачкой (INSERT ... ON CONFLICT DO UPDATE).
+        """
+        if not contacts:
+            return
+        now = datetime.now(tz=config.TIMEZONE)
+        statement = sqlite_insert(ChatContact)
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[ChatContact.telegram_id],
+                set_={"username": statement.excluded.username, "updated_at": statement.excluded.updated_at}
+            ),
+            [
+                {"telegram_id": telegram_id, "username": username, "updated_at": now}
+                for telegram_id, username in contacts.items()
+            ]
+        )
+        await self._commit()
+        logger.info(f"Saved {len(contacts)} chat contacts")
+
+    async def get_unreachable_chats(self):
+        """
+        Получает все чаты, помеченные недоступными.
+        """
+        result = await self.session.execute(select(ChatReachability))
+        chats = result.scalars().all()
+        logger.debug(f"Fetched {len(chats)} unreachable chats")
+        return chats
+
+    async def set_chat_unreachable(self, telegram_id: str, reason: str, failures: int, unreachable_until: datetime):
+        """
+        Помечает чат недоступным до unreachable_until.
+        """
+        values = {
+            "telegram_id": telegram_id,
+            "reason": reason,
+            "failures": failures,
+            "unreachable_until": unreachable_until,
+            "checked_at": datetime.now(tz=config.TIMEZONE)
+        }
+        statement = sqlite_insert(ChatReachability).values(**values)
+        await self.session.execute(
+            statement.on_conflict_do_update(index_elements=[ChatReachability.telegram_id], set_=values)
+        )
+        await self._commit()
+        logger.info(f"Marked chat {telegram_id} unreachable until {unreachable_until}: {reason}")
+
+    async def clear_chat_unreachable(self, telegram_id: str):
+        """
+        Снимает отметку о недоступности чата.
+        """
+        await self.session.execute(delete(ChatReachability).where(ChatReachability.telegram_id == telegram_id))
+        await self._commit()
+        logger.info(f"Chat {telegram_id} is reachable again")
+
+    async def get_status_counts(self):
+        """
+        Получает количество заявок по каждому статусу из дневных итогов.
+        """
+        result = await self.session.execute(
+            select(AppointmentDailyStat.status, func.sum(AppointmentDailyStat.count))
+            .group_by(AppointmentDailyStat.status)
+        )
+        counts = [StatusCount(status, count) for status, count in result.all()]
+        logger.info(f"Fetched appointment counts for {len(counts)} statuses")
+        return counts
+
+    async def get_statistics_summary(self):
+        """
+        Получает сводку для админской статистики одним запросом по дневным итогам.
+        """
+        status = AppointmentDailyStat.status
+        count = AppointmentDailyStat.count
+
+        def total(condition=None):
+            value = count if condition is None else case((condition, count), else_=0)
+            return func.coalesce(func.sum(value), 0)
+
+        appointments = select(
+            total().label("total"),
+            total(status == AppointmentStatus.PENDING).label("pending"),
+            total(status == AppointmentStatus.APPROVED).label("approved"),
+            total(status == AppointmentStatus.COMPLETED).label("completed"),
+            total(status.in_(CANCELLED_STATUSES)).label("cancelled")
+        ).subquery()
+        result = await self.session.execute(
+            select(
+                select(func.count(Client.id)).scalar_subquery(),
+                appointments.c.total,
+                appointments.c.pending,
+                appointments.c.approved,
+                appointments.c.completed,
+                appointments.c.cancelled
+            )
+        )
+        summary = StatisticsSummary(*result.one())
+        logger.info(f"Fetched statistics summary: {summary}")
+        return summary
+
+    async def get_specialist_stats(self):
+        """
+        Получает количество завершенных и отмененных заявок по каждому специалисту из дневных итогов.
+        """
+        status = AppointmentDailyStat.status
+        count = AppointmentDailyStat.count
+        result = await self.session.execute(
+            select(
+                Specialist.id,
+                Specialist.full_name,
+                Specialist.rank,
+                func.coalesce(func.sum(case((status == AppointmentStatus.COMPLETED, count), else_=0)), 0),
+                func.coalesce(func.sum(case((status.in_(CANCELLED_STATUSES), count), else_=0)), 0)
+            )
+            .outerjoin(AppointmentDailyStat, AppointmentDailyStat.specialist_id == Specialist.id)
+            .group_by(Specialist.id)
+            .order_by(Specialist.full_name)
+        )
+        stats = [SpecialistStats(*row) for row in result.all()]
+        logger.info(f"Fetched stats for {len(stats)} specialists")
+        return stats
+
+    async def get_daily_volumes(self, start_date: datetime, end_date: datetime):
+        """
+        Получает количество заявок по дням в интервале [start_date, end_date).
+        """
+        day = func.date(Appointment.scheduled_time)
+        result = await self.session.execute(
+            select(
+                day,
+                func.count(Appointment.id),
+                func.count(case((Appointment.status == AppointmentStatus.COMPLETED, Appointment.id))),
+                func.count(case((Appointment.status.in_(CANCELLED_STATUSES), Appointment.id)))
+            )
+            .where(Appointment.scheduled_time >= start_date, Appointment.scheduled_time < end_date)
+            .group_by(day)
+            .order_by(day)
+        )
+        volumes = [
+            DailyVolume(date.fromisoformat(day_str), total, completed, cancelled)
+            for day_str, total, completed, cancelled in result.all()
+        ]
+        logger.info(f"Fetched daily volumes for {len(volumes)} days")
+        return volumes
+
+    @staticmethod
+    def _keyset_condition(keys: list, values: tuple, forward: bool):
+        """
+        Условие «строка после (или до) ключа values» в лексикографическом порядке keys.
+        """
+        conditions = []
+        for i, key in enumerate(keys):
+            compare = key > values[i] if forward else key < values[i]
+            conditions.append(and_(*[keys[j] == values[j] for j in range(i)], compare))
+        return or_(*conditions)
+
+    async def _fetch_page(self, query, keys: list, after: tuple | None, before: tuple | None, limit: int,
+                          build=None):
+        """
+        Выполняет keyset-пагинацию: одна страница из limit строк после after или до before.
+        build — функция, собирающая элемент из строки; без неё запрос возвращает ORM-объекты.
+        """
+        if before is not None:
+            query = query.where(self._keyset_condition(keys, before, forward=False)).order_by(*[key.desc() for key in keys])
+        else:
+            if after is not None:
+                query = query.where(self._keyset_condition(keys, after, forward=True))
+            query = query.order_by(*keys)
+        result = await self.session.execute(query.limit(limit + 1))
+        items = [build(row) for row in result.all()] if build else list(result.scalars().all())
+        has_more = len(items) > limit
+        items = items[:limit]
+        if before is not None:
+            items.reverse()
+        return Page(items, has_more)
+
+    async def count_future_appointments(self):
+        """
+        Получает количество будущих одобренных заявок.
+        """
+        result = await self.session.execute(
+            select(func.count(Appointment.id)).where(
+                Appointment.status == AppointmentStatus.APPROVED,
+                Appointment.scheduled_time >= datetime.now(tz=config.TIMEZONE)
+            )
+        )
+        return result.scalar_one()
+
+    async def get_future_appointments_page(self, after: tuple | None = None, before: tuple | None = None, limit: int = 5):
+        """
+        Получает страницу будущих одобренных заявок (AppointmentCard); ключ страницы — (scheduled_time, id).
+        """
+        query = self._appointment_cards_query().where(
+            Appointment.status == AppointmentStatus.APPROVED,
+            Appointment.scheduled_time >= datetime.now(tz=config.TIMEZONE)
+        )
+        page = await self._fetch_page(
+            query, [Appointment.scheduled_time, Appointment.id], after, before, limit, self._appointment_card
+        )
+        logger.debug(f"Fetched page of {len(page.items)} future appointments")
+        return page
+
+    async def count_clients(self):
+        """
+        Получает количество клиентов.
+        """
+        result = await self.session.execute(select(func.count(Client.id)))
+        return result.scalar_one()
+
+    async def get_clients_page(self, after: tuple | None = None, before: tuple | None = None, limit: int = 10):
+        """
+        Получает страницу клиентов; ключ страницы — (id,).
+        """
+        page = await self._fetch_page(select(Client), [Client.id], after, before, limit)
+        logger.debug(f"Fetched page of {len(page.items)} clients")
+        return page
+
+    async def count_specialists(self):
+        """
+        Получает количество специалистов.
+        """
+        result = await self.session.execute(select(func.count(Specialist.id)))
+        return result.scalar_one()
+
+    async def get_specialists_page(self, after: tuple | None = None, before: tuple | None = None, limit: int = 10):
+        """
+        Получает страницу специалистов; ключ страницы — (id,).
+        """
+        page = await self._fetch_page(select(Specialist), [Specialist.id], after, before, limit)
+        logger.debug(f"Fetched page of {len(page.items)} specialists")
+        return page
+
+    async def count_active_specialist_appointments(self, specialist_id: int):
+        """
+        Получает количество ожидающих и одобренных заявок специалиста.
+        """
+        result = await self.session.execute(
+            select(func.count(Appointment.id)).where(
+                Appointment.specialist_id == specialist_id,
+                Appointment.status.in_([AppointmentStatus.APPROVED, AppointmentStatus.PENDING])
+            )
+        )
+        return result.scalar_one()
+
+    async def get_active_specialist_appointments_page(self, specialist_id: int, after: tuple | None = None,
+                                                      before: tuple | None = None, limit: int = 5):
+        """
+        Получает страницу ожидающих и одобренных заявок специалиста (AppointmentCard); ключ страницы — (id,).
+        """
+        query = self._appointment_cards_query().where(
+            Appointment.specialist_id == specialist_id,
+            Appointment.status.in_([AppointmentStatus.APPROVED, AppointmentStatus.PENDING])
+        )
+        page = await self._fetch_page(query, [Appointment.id], after, before, limit, self._appointment_card)
+        logger.debug(f"Fetched page of {len(page.items)} appointments for specialist_id={specialist_id}")
+        return page
+
+    async def get_fsm_record(self, key: str):
+        """
+        Получает сохранённое состояние FSM по ключу.
+        """
+        return await self.session.get(FSMRecord, key)
+
+    async def save_fsm_records(self, records: list[dict], deleted_keys: list[str]):
+        """
+        Сохраняет пачку состояний FSM и удаляет очищенные одной транзакцией.
+        """
+        if records:
+            statement = sqlite_insert(FSMRecord)
+            await self.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[FSMRecord.key],
+                    set_={
+                        "state": statement.excluded.state,
+                        "data": statement.excluded.data,
+                        "updated_at": statement.excluded.updated_at
+                    }
+                ),
+                records
+            )
+        if deleted_keys:
+            await self.session.execute(delete(FSMRecord).where(FSMRecord.key.in_(deleted_keys)))
+        await self._commit()
+        logger.debug(f"Saved {len(records)} FSM records, deleted {len(deleted_keys)}")
+
+    async def delete_expired_fsm_records(self, before: datetime):
+        """
+        Удаляет состояния FSM, которые не менялись с момента before.
+        """
+        result = await self.session.execute(delete(FSMRecord).where(FSMRecord.updated_at < before))
+        await self._commit()
+        logger.info(f"Deleted {result.rowcount} expired FSM records")
+        return result.rowcount
+
+    async def get_identity(self, telegram_id: str) -> Identity:
+        """
+        Получает роль пользователя и ID его клиента и специалиста одним запросом.
+        """
+        result = await self.session.execute(
+            select(User.role, Client.id, Specialist.id)
+            .outerjoin(Client, Client.user_id == User.telegram_id)
+            .outerjoin(Specialist, Specialist.user_id == User.telegram_id)
+            .where(User.telegram_id == telegram_id)
+            .limit(1)
+        )
+        row = result.first()
+        logger.debug(f"Resolved identity for telegram_id={telegram_id}")
+        if row is None:
+            return Identity(telegram_id, None, None, None)
+        return Identity(telegram_id, *row)
+
+    async def get_active_blacklist(self, now: datetime) -> list[tuple[str, datetime]]:
+        """
+        Получает действующие блокировки: пары (telegram_id, blocked_until).
+        """
+        result = await self.session.execute(
+            select(Blacklist.telegram_id, Blacklist.blocked_until).where(Blacklist.blocked_until > now)
+        )
+        entries = [tuple(row) for row in result.all()]
+        logger.debug(f"Fetched {len(entries)} active blacklist entries")
+        return entries
+
+    async def delete_expired_blacklist(self, now: datetime) -> int:
+        """
+        Удаляет истёкшие блокировки одним запросом.
+        """
+        result = await self.session.execute(delete(Blacklist).where(Blacklist.blocked_until <= now))
+        await self._commit()
+        logger.info(f"Deleted {result.rowcount} expired blacklist entries")
+        return result.rowcount
+
+    async def get_busy_times(self, specialist_id: int, start: datetime, end: datetime) -> list[tuple[int, datetime]]:
+        """
+        Получает занятое время специалиста в интервале: пары (id заявки, scheduled_time).
+        """
+        result = await self.session.execute(
+            select(Appointment.id, Appointment.scheduled_time)
+            .where(
+                Appointment.specialist_id == specialist_id,
+                Appointment.status == AppointmentStatus.APPROVED,
+                Appointment.scheduled_time >= start,
+                Appointment.scheduled_time < end
+            )
+            .order_by(Appointment.scheduled_time)
+        )
+        busy = [tuple(row) for row in result.all()]
+        logger.debug(f"Fetched {len(busy)} busy times for specialist_id={specialist_id}")
+        return busy
+
+    async def reserve_slot(self, appointment_id: int, specialist_id: int, scheduled_time: datetime,
+                           window: timedelta, from_status: AppointmentStatus = AppointmentStatus.PENDING) -> bool:
+        """
+        Атомарно закрепляет время специалиста за заявкой и одобряет её одним условным UPDATE.
+        Не срабатывает, если заявка уже не в статусе from_status или у специалиста есть другая
+        одобренная заявка ближе чем window к scheduled_time. Изменение не фиксируется: вызывающий
+        код фиксирует его вместе с уведомлениями. Если конфликт обнаружил уникальный индекс,
+        транзакция откатывается и загруженные объекты сессии нужно получить заново.
+        """
+        other = aliased(Appointment)
+        conflict = exists().where(
+            other.specialist_id == specialist_id,
+            other.status == AppointmentStatus.APPROVED,
+            other.scheduled_time > scheduled_time - window,
+            other.scheduled_time < scheduled_time + window,
+            other.id != appointment_id
+        )
+        try:
+            result = await self.session.execute(
+                update(Appointment)
+                .where(Appointment.id == appointment_id, Appointment.status == from_status, ~conflict)
+                .values(
+                    specialist_id=specialist_id,
+                    scheduled_time=scheduled_time,
+                    status=AppointmentStatus.APPROVED,
+                    version=Appointment.version + 1
+                )
+                .execution_options(synchronize_session="fetch")
+            )
+        except IntegrityError as e:
+            # uq_appointments_specialist_slot: время заняли параллельно
+            logger.warning(f"Slot {scheduled_time} of specialist_id={specialist_id} already taken: {e}")
+            await self.session.rollback()
+            return False
+        if result.rowcount != 1:
+            logger.info(f"Could not reserve {scheduled_time} of specialist_id={specialist_id} for appointment {appointment_id}")
+            return False
+        logger.info(f"Reserved {scheduled_time} of specialist_id={specialist_id} for appointment {appointment_id}")
+        return True
+
+    async def transition_appointment(self, appointment_id: int, name: str, version: int | None = None, **values):
+        """
+        Выполняет переход статуса заявки из APPOINTMENT_TRANSITIONS одним UPDATE ... RETURNING.
+        Условия перехода (исходный статус, флаг, версия) проверяются в том же запросе, поэтому
+        повторный callback или параллельное изменение не пройдут. values — дополнительные поля
+        (например, reject_reason). Загруженный в сессию объект заявки обновляется на месте вместе со
+        связями. Несохранённые правки этих полей в объекте не сбрасываются в БД перед UPDATE (иначе
+        условие увидело бы собственную запись) и заменяются значениями из БД. Возвращает строку
+        (id, status, version, изменённые поля).
+        Выбрасывает AppointmentTransitionError, если заявки нет, переход недопустим или версия устарела.
+        """
+        transition = APPOINTMENT_TRANSITIONS[name]
+        conditions = [Appointment.id == appointment_id, Appointment.status.in_(transition.sources)]
+        if transition.target is not None:
+            values["status"] = transition.target
+        if transition.flag:
+            flag = getattr(Appointment, transition.flag)
+            conditions.append(or_(flag.is_(False), flag.is_(None)))
+            values[transition.flag] = True
+        if version is not None:
+            conditions.append(Appointment.version == version)
+        touched = [getattr(Appointment, key) for key in values if key != "status"]
+        with self.session.no_autoflush:
+            result = await self.session.execute(
+                update(Appointment)
+                .where(*conditions)
+                .values(version=Appointment.version + 1, **values)
+                .returning(Appointment.id, Appointment.status, Appointment.version, *touched),
+                execution_options={"synchronize_session": False}
+            )
+            row = result.first()
+            if row is None:
+                current = (await self.session.execute(
+                    select(Appointment.status, Appointment.version, *touched).where(Appointment.id == appointment_id)
+                )).first()
+                if current is not None:
+                    self._set_loaded(Appointment, appointment_id, current._asdict())
+                error = AppointmentTransitionError(appointment_id, name, current, version)
+                logger.warning(str(error))
+                raise error
+        self._set_loaded(Appointment, appointment_id, {key: value for key, value in row._asdict().items() if key != "id"})
+        await self._commit()
+        logger.info(f"Appointment {appointment_id}: {name} -> {row.status.name}, version {row.version}")
+        return row
+
+    async def stream_appointments(self, start: datetime | None = None, end: datetime | None = None,
+                                  changed_since: datetime | None = None, batch_size: int = 500):
+        """
+        Построчно выдаёт заявки вместе с клиентом и специалистом: с proposed_date в интервале
+        [start, end) и/или изменённые после changed_since (сама заявка, её клиент или специалист).
+        Строки читаются пачками по batch_size, вся выборка в памяти не держится.
+        """
+        query = select(Appointment)
+        if start is not None:
+            query = query.where(Appointment.proposed_date >= start)
+        if end is not None:
+            query = query.where(Appointment.proposed_date < end)
+        if changed_since is not None:
+            # Каждая ветка идёт по своему индексу updated_at
+            changed = union_all(
+                select(Appointment.id).where(Appointment.updated_at > changed_since),
+                select(Appointment.id).join(Client, Appointment.client_id == Client.id)
+                .where(Client.updated_at > changed_since),
+                select(Appointment.id).join(Specialist, Appointment.specialist_id == Specialist.id)
+                .where(Specialist.updated_at > changed_since),
+            )
+            query = query.where(Appointment.id.in_(changed))
+        result = await self.session.stream_scalars(
+            query
+            .options(joinedload(Appointment.client), joinedload(Appointment.specialist))
+            .order_by(Appointment.proposed_date, Appointment.id)
+            .execution_options(yield_per=batch_size)
+        )
+        count = 0
+        async for appointment in result:
+            count += 1
+            yield appointment
+        logger.info(f"Streamed {count} appointments (range {start} - {end}, changed since {changed_since})")
+
+    async def get_export_watermark(self, admin_id: str) -> datetime | None:
+        """
+        Получает момент, до которого администратор уже выгрузил изменения.
+        """
+        result = await self.session.execute(
+            select(ExportWatermark.exported_until).where(ExportWatermark.admin_id == admin_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def set_export_watermark(self, admin_id: str, exported_until: datetime):
+        """
+        Сохраняет отметку выгрузки изменений администратора.
+        """
+        statement = sqlite_insert(ExportWatermark).values(admin_id=admin_id, exported_until=exported_until)
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[ExportWatermark.admin_id],
+                set_={"exported_until": statement.excluded.exported_until}
+            )
+        )
+        await self._commit()
+        logger.info(f"Export watermark of admin {admin_id} set to {exported_until}")
+
+    async def get_specialist_period_counts(self, specialist_id: int, start_day: date, end_day: date) -> dict:
+        """
+        Получает количество заявок специалиста по статусам за дни [start_day, end_day] из дневных итогов.
+        """
+        result = await self.session.execute(
+            select(AppointmentDailyStat.status, func.sum(AppointmentDailyStat.count))
+            .where(
+                AppointmentDailyStat.specialist_id == specialist_id,
+                AppointmentDailyStat.day >= start_day,
+                AppointmentDailyStat.day <= end_day
+            )
+            .group_by(AppointmentDailyStat.status)
+        )
+        counts = dict(result.all())
+        logger.info(f"Fetched period counts for specialist_id={specialist_id} from {start_day} to {end_day}: {len(counts)} statuses")
+        return counts
+
+    @staticmethod
+    def _rank_case(completed):
+        """
+        Выражение CASE: ранг по числу завершённых заявок из config.SPECIALIST_RANKS.
+        """
+        ranks = config.SPECIALIST_RANKS
+        return case(
+            *[(completed >= threshold, rank) for threshold, rank in reversed(ranks[1:])],
+            else_=ranks[0][1]
+        )
+
+    async def recompute_specialist_ranks(self, specialist_id: int | None = None) -> int:
+        """
+        Пересчитывает ранги по config.SPECIALIST_RANKS одним UPDATE: для специалиста или для всех.
+        Возвращает число изменённых строк.
+        """
+        rank = self._rank_case(Specialist.completed_appointments)
+        query = update(Specialist).where(Specialist.rank.is_distinct_from(rank))
+        if specialist_id is not None:
+            query = query.where(Specialist.id == specialist_id)
+        result = await self.session.execute(
+            query.values(rank=rank).returning(Specialist.id, Specialist.rank),
+            execution_options={"synchronize_session": False}
+        )
+        rows = result.all()
+        for specialist_id, new_rank in rows:
+            self._set_loaded(Specialist, specialist_id, {"rank": new_rank})
+        await self._commit()
+        logger.info(f"Recomputed ranks of {len(rows)} specialists")
+        return len(rows)
+
+    def _set_loaded(self, model, key, values: dict):
+        """
+        Переносит значения из RETURNING в объект, если он уже загружен в сессию, не помечая его изменённым.
+        """
+        instance = self.session.identity_map.get(identity_key(model, key))
+        if instance is not None:
+            for name, value in values.items():
+                set_committed_value(instance, name, value)
+
+    async def rate_client(self, client_id: int, rating: int):
+        """
+        Добавляет оценку клиенту одним атомарным UPDATE: параллельные оценки не теряются.
+        Средний рейтинг (rating_avg) пересчитывает сама БД. Возвращает строку (rating, rating_count, rating_avg).
+        Выбрасывает ValueError при оценке вне 1–5 или если клиента нет.
+        """
+        if not 1 <= rating <= 5:
+            raise ValueError(f"Оценка должна быть от 1 до 5, получено {rating}")
+        result = await self.session.execute(
+            update(Client)
+            .where(Client.id == client_id)
+            .values(
+                rating=func.coalesce(Client.rating, 0) + rating,
+                rating_count=func.coalesce(Client.rating_count, 0) + 1
+            )
+            .returning(Client.rating, Client.rating_count, Client.rating_avg),
+            execution_options={"synchronize_session": False}
+        )
+        row = result.first()
+        if row is None:
+            raise ValueError(f"Клиент {client_id} не найден")
+        self._set_loaded(Client, client_id, row._asdict())
+        await self._commit()
+        logger.info(f"Rated client_id={client_id} with {rating}: average {row.rating_avg:.2f} of {row.rating_count}")
+        return row
+
+    async def update_client_rating(self, client_id: int, rating: int):
+        """
+        Обновляет рейтинг клиента. Оставлен для обработчика оценки, выполняет атомарный rate_client.
+        """
+        return await self.rate_client(client_id, rating)
+
+    async def get_clients_by_rating_page(self, after: tuple | None = None, before: tuple | None = None,
+                                         limit: int = 10, min_rating: float | None = None):
+        """
+        Получает страницу клиентов по возрастанию среднего рейтинга; ключ страницы — (rating_avg, id).
+        Сортировка и фильтр min_rating идут по индексу ix_clients_rating_avg.
+        """
+        query = select(Client)
+        if min_rating is not None:
+            query = query.where(Client.rating_avg >= min_rating)
+        page = await self._fetch_page(query, [Client.rating_avg, Client.id], after, before, limit)
+        logger.debug(f"Fetched page of {len(page.items)} clients by rating")
+        return page
+
+    @staticmethod
+    def _appointment_cards_query():
+        """
+        SELECT по колонкам заявки, клиента и специалиста для AppointmentCard.
+        """
+        return (
+            select(
+                Appointment.id,
+                Appointment.status,
+                Appointment.proposed_date,
+                Appointment.scheduled_time,
+                Appointment.complex,
+                Appointment.reason,
+                Appointment.reject_reason,
+                Appointment.client_ready,
+                Appointment.specialist_ready,
+                Client.id,
+                Client.full_name,
+                Client.phone,
+                Client.user_id,
+                Specialist.id,
+                Specialist.full_name,
+                Specialist.user_id,
+                Specialist.username
+            )
+            .join(Client, Appointment.client_id == Client.id)
+            .outerjoin(Specialist, Appointment.specialist_id == Specialist.id)
+        )
+
+    @staticmethod
+    def _appointment_card(row) -> AppointmentCard:
+        """
+        Собирает AppointmentCard из строки _appointment_cards_query.
+        """
+        client_id, client_name, phone, client_user_id, specialist_id, specialist_name, specialist_user_id, username = row[9:]
+        return AppointmentCard(
+            *row[:9],
+            ClientCard(client_id, client_name, phone, UserRef(client_user_id)),
+            SpecialistCard(specialist_id, specialist_name, specialist_user_id, username) if specialist_id is not None else None
+        )
+
+    async def get_appointment_cards_by_ids(self, appointment_ids: list[int]) -> list[AppointmentCard]:
+        """
+        Получает заявки по списку ID для отображения: кортежи AppointmentCard вместо ORM-объектов.
+        """
+        result = await self.session.execute(
+            self._appointment_cards_query().where(Appointment.id.in_(appointment_ids))
+        )
+        cards = [self._appointment_card(row) for row in result.all()]
+        logger.debug(f"Fetched {len(cards)} appointment cards by ids")
+        return cards
+
+
+class AppointmentTransitionError(ValueError):
+    """Переход статуса заявки не выполнен: заявки нет, переход недопустим или заявку уже изменили."""
+
+    def __init__(self, appointment_id: int, name: str, current: tuple | None, expected_version: int | None):
+        self.appointment_id = appointment_id
+        self.transition = name
+        self.status = current[0] if current else None
+        self.lost = bool(current) and expected_version is not None and current[1] != expected_version
+        if current is None:
+            reason = "appointment not found"
+        elif self.lost:
+            reason = f"lost to a concurrent change (version {expected_version} -> {current[1]})"
+        else:
+            reason = f"not allowed from {self.status.name}"
+        super().__init__(f"Appointment {appointment_id}: transition {name} {reason}")
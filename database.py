@@ -1,31 +1,105 @@
+from contextlib import asynccontextmanager
+from sqlalchemy import event, Select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from config import config
 
-# Создание асинхронного движка с оптимизированным пулом
+# PRAGMA для каждого соединения: WAL позволяет читать параллельно с записью
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",  # 256 МБ
+    "PRAGMA cache_size=-65536",  # 64 МБ
+    "PRAGMA busy_timeout=5000",
+)
+
+# Движок для записи: SQLite допускает только одного писателя
 engine = create_async_engine(
     config.DATABASE_URL,
-    echo=True,
-    pool_size=1,  # Ограничение для SQLite (одно соединение для записи)
+    echo=config.DB_ECHO,
+    pool_size=1,  # Единственное соединение для записи
     max_overflow=0,  # Без переполнения
     pool_timeout=30.0,  # Таймаут ожидания подключения
     pool_pre_ping=True,  # Проверка соединения перед использованием
 )
 
+# Движок для чтения: пул соединений только для чтения
+read_engine = create_async_engine(
+    config.DATABASE_URL,
+    echo=config.DB_ECHO,
+    pool_size=config.DB_READ_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=30.0,
+    pool_pre_ping=True,
+)
+
+
+def _set_pragmas(dbapi_connection, connection_record, query_only: bool = False):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    if query_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+event.listen(engine.sync_engine, "connect", _set_pragmas)
+event.listen(read_engine.sync_engine, "connect", lambda conn, record: _set_pragmas(conn, record, query_only=True))
+
 # Создание декларативной базы
 Base = declarative_base()
 
+
+class RoutingSession(Session):
+    """
+    Sends plain SELECTs to the read pool and everything else to the writer.
+
+    Once a transaction has written (flush, INSERT/UPDATE/DELETE), the rest of it stays on the
+    writer so reads see its own uncommitted changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("use_writer") or self._flushing or not isinstance(clause, Select):
+            self.info["use_writer"] = True
+            return engine.sync_engine
+        return read_engine.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("use_writer", None)
+
+
 # Создание фабрики сессий
 async_session = sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=RoutingSession,
     expire_on_commit=False
 )
 
-# Функция для миддлварей (генератор)
-async def get_session():
+# Ключ session.info: сессия обслуживает одно обновление, CRUD не фиксирует изменения сам
+UNIT_OF_WORK = "unit_of_work"
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """
+    Сессия на одно обновление: все изменения фиксируются одним commit в конце.
+
+    Соединение из пула берётся только при первом запросе, так что обновления без обращений
+    к БД пул не занимают. При исключении изменения откатываются.
+    """
     async with async_session() as session:
-        yield session
+        session.info[UNIT_OF_WORK] = True
+        try:
+            yield session
+        except BaseException:
+            await session.rollback()
+            raise
+        if session.in_transaction():
+            await session.commit()
 
 # Класс-обёртка для поддержки async with
 class SessionContext:
@@ -45,6 +119,7 @@ class SessionContext:
 def create_session():
     return SessionContext()
 
-# Функция для закрытия движка
+# Функция для закрытия движков
 async def dispose_engine():
-    await engine.dispose()
\ No newline at end of file
+    await engine.dispose()
+    await read_engine.dispose()
@@ -1,5 +1,5 @@
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from config import config
 import logging
 
@@ -66,4 +66,60 @@ def format_appointment_date(dt: datetime) -> str:
     Returns:
         Форматированная строка.
     """
-    return dt.strftime("%d.%m.%Y %H:%M")
\ No newline at end of file
+    return dt.strftime("%d.%m.%Y %H:%M")
+
+
+def _plural(n: int, one: str, few: str, many: str) -> str:
+    """Выбирает форму слова для числа n (1 час, 2 часа, 5 часов)."""
+    if n % 10 == 1 and n % 100 != 11:
+        return one
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return few
+    return many
+
+
+def format_time_until(offset: timedelta) -> str:
+    """
+    Форматирует интервал до начала заявки для текста напоминания.
+    Args:
+        offset: Интервал до начала заявки.
+    Returns:
+        Строка вида "через час", "через 24 часа", "через 15 минут".
+    """
+    minutes = int(offset.total_seconds() // 60)
+    if minutes % 60:
+        return f"через {minutes} {_plural(minutes, 'минуту', 'минуты', 'минут')}"
+    hours = minutes // 60
+    if hours == 1:
+        return "через час"
+    return f"через {hours} {_plural(hours, 'час', 'часа', 'часов')}"
+
+
+def encode_cursor(values: tuple) -> list:
+    """
+    Переводит ключ keyset-пагинации в JSON-совместимый список для FSM.
+    Args:
+        values: Значения ключа (datetime, int, str).
+    Returns:
+        Список, где datetime заменены строками ISO 8601.
+    """
+    return [value.isoformat() if isinstance(value, datetime) else value for value in values]
+
+
+def decode_cursor(values: list) -> tuple:
+    """
+    Восстанавливает ключ keyset-пагинации из FSM.
+    Args:
+        values: Список, сохранённый encode_cursor.
+    Returns:
+        Кортеж значений ключа.
+    """
+    decoded = []
+    for value in values:
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                pass
+        decoded.append(value)
+    return tuple(decoded)
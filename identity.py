@@ -0,0 +1,46 @@
+import logging
+from database.database import create_session
+from database.crud import CRUD
+from database.read_models import Identity
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityCache:
+    """
+    Who is who: telegram_id -> role, client ID and specialist ID, without a query per update.
+
+    Identities are resolved from the database on first use and kept in an LRU/TTL memory cache.
+    Handlers that change a role or create a client/specialist must call `invalidate`; the TTL
+    only bounds how long a change made outside the bot (e.g. by hand in the database) goes unseen.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def resolve(self, telegram_id) -> Identity:
+        """
+        Return the identity of a Telegram user, loading it from the database on a cache miss.
+        Args:
+            telegram_id: Telegram user ID.
+        """
+        telegram_id = str(telegram_id)
+        identity = self._cache.get(telegram_id)
+        if identity is None:
+            async with create_session() as session:
+                identity = await CRUD(session).get_identity(telegram_id)
+            self._cache.set(telegram_id, identity)
+        return identity
+
+    def invalidate(self, telegram_id):
+        """
+        Forget the cached identity so the next update re-reads it from the database.
+        Args:
+            telegram_id: Telegram user ID.
+        """
+        self._cache.pop(str(telegram_id))
+        logger.debug(f"Invalidated identity of {telegram_id}")
+
+
+identity_cache = IdentityCache()
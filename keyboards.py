@@ -1,6 +1,4 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from datetime import datetime, timedelta
-from config import config
 from database.models import Role, Appointment, AppointmentStatus, Specialist, User
 
 
@@ -92,58 +90,23 @@ def get_report_period_keyboard() -> InlineKeyboardMarkup:
     ])
 
 
-def get_time_selection_keyboard(appointments: list, proposed_date: datetime) -> InlineKeyboardMarkup:
+def get_time_selection_keyboard(slots: list, specialist_name: str) -> InlineKeyboardMarkup:
     """
     Returns an inline keyboard for selecting time slots, with available and occupied slots.
 
     Args:
-        appointments: List of Appointment objects to check for occupied slots.
-        proposed_date: Datetime object for the selected date.
-    """
-    if not isinstance(appointments, list):
-        appointments = []
-    if not isinstance(proposed_date, datetime):
-        raise ValueError("proposed_date must be a datetime object")
-
-    time_slots = []
-    current_time = datetime(proposed_date.year, proposed_date.month, proposed_date.day, 9, 0)
-    morning_end = datetime(proposed_date.year, proposed_date.month, proposed_date.day, 11, 30)
-    while current_time <= morning_end:
-        time_slots.append(current_time.strftime("%H:%M"))
-        current_time += timedelta(minutes=30)
-
-    current_time = datetime(proposed_date.year, proposed_date.month, proposed_date.day, 13, 30)
-    evening_end = datetime(proposed_date.year, proposed_date.month, proposed_date.day, 17, 30)
-    while current_time <= evening_end:
-        time_slots.append(current_time.strftime("%H:%M"))
-        current_time += timedelta(minutes=30)
-
+        slots: List of services.slots.Slot for the selected day.
+        specialist_name: Name of the specialist shown on occupied slots.
+    """
     keyboard = InlineKeyboardMarkup(inline_keyboard=[])
     row = []
-    for slot in time_slots:
-        slot_datetime = datetime.strptime(
-            f"{proposed_date.strftime('%Y-%m-%d')} {slot}",
-            "%Y-%m-%d %H:%M"
-        ).replace(tzinfo=config.TIMEZONE)
-        is_taken = False
-        specialist_name = None
-        appointment_id = None
-        for app in appointments:
-            if (app.status == AppointmentStatus.APPROVED and
-                    app.scheduled_time and
-                    app.scheduled_time.astimezone(config.TIMEZONE).strftime("%Y-%m-%d %H:%M") ==
-                    slot_datetime.strftime("%Y-%m-%d %H:%M")):
-                is_taken = True
-                specialist_name = app.specialist.full_name if app.specialist else "Неизвестный специалист"
-                appointment_id = app.id
-                break
-
-        if is_taken:
-            button_text = f"🔴 {slot} ({specialist_name})"
-            button = InlineKeyboardButton(text=button_text, callback_data=f"occupied_{appointment_id}")
+    for slot in slots:
+        slot_text = f"{slot.start.hour:02d}:{slot.start.minute:02d}"
+        if slot.is_free:
+            button = InlineKeyboardButton(text=f"🟢 {slot_text}", callback_data=f"time_{slot_text}")
         else:
-            button_text = f"🟢 {slot}"
-            button = InlineKeyboardButton(text=button_text, callback_data=f"time_{slot}")
+            button = InlineKeyboardButton(text=f"🔴 {slot_text} ({specialist_name})",
+                                          callback_data=f"occupied_{slot.appointment_id}")
 
         row.append(button)
         if len(row) == 3:
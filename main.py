@@ -1,24 +1,97 @@
 import asyncio
 import logging
-from aiog
-                            Appointment.scheduled_time <= now + timedelta(hours=1, minutes=1)
-                        )
-                    )
-                    .options(
-                        joinedload(Appointment.client).joinedload(Client.user),
-                        joinedload(Appointment.specialist)
-                    )
-                )
-                appointments = appointments.scalars().all()
-             
-                            await bot.send_message(
-         
-                                [InlineKeyboardButton(text="❌ Отказаться", callback_data=f"client_refuse_{app.id}")]
-                            ])
-                            specialist_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                                [InlineKeyboardButton(text="✅ Готов к работе", callback_data=f"specialist_ready_{app.id}")]
-                         
-    logger.info("Database engine disposed")
+from aiogram import Bot, Dispatcher, BaseMiddleware
+from config import config
+from database.database import engine, unit_of_work, dispose_engine
+from database.migrations import run_migrations
+from database.storage import fsm_storage
+from handlers import admin, client, specialist
+from services.scheduler import reminder_scheduler
+from services.outbound import outbound
+from services.outbox import outbox_worker
+from services.contacts import contact_cache
+from services.reachability import reachability
+from services.identity import identity_cache
+from services.blacklist import blacklist_index
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DatabaseMiddleware(BaseMiddleware):
+    """Passes a database session to every handler as `session`; the update is one unit of work."""
+
+    async def __call__(self, handler, event, data):
+        async with unit_of_work() as session:
+            data["session"] = session
+            return await handler(event, data)
+
+
+class ContactMiddleware(BaseMiddleware):
+    """Refreshes the username cache and reachability from the sender of every update."""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user:
+            contact_cache.observe(user.id, user.username)
+            reachability.mark_reachable(user.id)
+        return await handler(event, data)
+
+
+class BlacklistMiddleware(BaseMiddleware):
+    """Drops updates from blacklisted users before any session or handler is involved."""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user and user.id != config.ADMIN_ID and blacklist_index.is_blocked(user.id):
+            return None
+        return await handler(event, data)
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """Resolves the sender's role, client and specialist IDs and passes them as `identity`."""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user:
+            data["identity"] = await identity_cache.resolve(user.id)
+        return await handler(event, data)
+
+
+async def main():
+    bot = Bot(token=config.BOT_TOKEN)
+    dp = Dispatcher(storage=fsm_storage)
+    dp.update.outer_middleware(BlacklistMiddleware())
+    dp.update.outer_middleware(IdentityMiddleware())
+    dp.update.middleware(ContactMiddleware())
+    dp.update.middleware(DatabaseMiddleware())
+    dp.include_routers(admin.router, client.router, specialist.router)
+
+    await run_migrations(engine)
+    logger.info("Database initialized")
+
+    fsm_storage.start()
+    blacklist_index.start()
+    outbound.start(bot)
+    contact_cache.start()
+    reachability.start(bot)
+    # Outbox: недоставленные уведомления подхватываются из БД после перезапуска
+    outbox_worker.start(bot)
+    # Напоминания: планировщик сам восстанавливает очередь из БД при старте
+    reminder_scheduler.start(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await reminder_scheduler.stop()
+        await outbox_worker.stop()
+        await outbound.stop()
+        await contact_cache.stop()
+        await reachability.stop()
+        await blacklist_index.stop()
+        await fsm_storage.close()
+        await bot.session.close()
+        await dispose_engine()
+        logger.info("Database engine disposed")
 
 if __name__ == "__main__":
     asyncio.run(main())
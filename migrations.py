@@ -0,0 +1,338 @@
+import asyncio
+import logging
+import re
+import sys
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, select, update, delete, func, event, inspect, table, column
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from config import config
+from database.models import Base, NotificationSent, Appointment, AppointmentStatus, Client, Specialist
+from database.models import AppointmentDailyStat
+
+logger = logging.getLogger(__name__)
+
+# Служебная таблица версий схемы; отдельные метаданные, чтобы не попасть в Base.metadata
+schema_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    schema_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, description: str):
+    """
+    Регистрирует функцию миграции схемы.
+    Args:
+        version: Номер версии, миграции применяются по возрастанию.
+        description: Краткое описание для таблицы schema_version.
+    """
+    def register(apply: Callable[[Connection], None]):
+        MIGRATIONS.append((version, description, apply))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return apply
+    return register
+
+
+def _create_indexes(conn: Connection, *names: str):
+    """Создаёт объявленные в models.py индексы, если их ещё нет."""
+    indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+@migration(1, "Indexes for hot appointment, specialist, client and blacklist queries")
+def _hot_query_indexes(conn: Connection):
+    # Дубликаты напоминаний мешают уникальному индексу: оставляем самую раннюю запись
+    first_sent = (
+        select(func.min(NotificationSent.id))
+        .group_by(NotificationSent.appointment_id, NotificationSent.reminder_type)
+    )
+    conn.execute(delete(NotificationSent).where(NotificationSent.id.not_in(first_sent)))
+    _create_indexes(
+        conn,
+        "uq_notification_sent_appointment_type",
+        "ix_appointments_status_scheduled_time",
+        "ix_appointments_specialist_status_time",
+        "ix_appointments_client_id",
+        "ix_specialists_user_id",
+        "ix_clients_user_id",
+        "ix_blacklist_telegram_id",
+    )
+
+
+@migration(2, "Index for blacklist expiry")
+def _blacklist_expiry_index(conn: Connection):
+    _create_indexes(conn, "ix_blacklist_blocked_until")
+
+
+@migration(3, "Unique approved appointment per specialist and time")
+def _specialist_slot_unique(conn: Connection):
+    # Двойные записи, сделанные до появления индекса, возвращаются на подтверждение администратору
+    first_booked = (
+        select(func.min(Appointment.id))
+        .where(Appointment.status == AppointmentStatus.APPROVED, Appointment.scheduled_time.is_not(None))
+        .group_by(Appointment.specialist_id, Appointment.scheduled_time)
+    )
+    # Лёгкая таблица без onupdate модели: колонки updated_at на этой версии схемы ещё нет
+    appointments = table("appointments", column("id"), column("status"), column("scheduled_time"))
+    result = conn.execute(
+        update(appointments)
+        .where(
+            appointments.c.status == AppointmentStatus.APPROVED.name,
+            appointments.c.scheduled_time.is_not(None),
+            appointments.c.id.not_in(first_booked)
+        )
+        .values(status=AppointmentStatus.PENDING.name)
+    )
+    if result.rowcount:
+        logger.warning(f"Returned {result.rowcount} double-booked appointments to PENDING")
+    _create_indexes(conn, "uq_appointments_specialist_slot")
+
+
+@migration(4, "Appointment version column")
+def _appointment_version(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("appointments")}
+    if "version" not in columns:
+        conn.exec_driver_sql("ALTER TABLE appointments ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(5, "Index for appointment exports by date")
+def _export_index(conn: Connection):
+    _create_indexes(conn, "ix_appointments_proposed_date")
+
+
+@migration(6, "updated_at columns for delta exports")
+def _updated_at(conn: Connection):
+    now = datetime.now(tz=config.TIMEZONE)
+    for mapped in (Appointment.__table__, Client.__table__, Specialist.__table__):
+        columns = {column["name"] for column in inspect(conn).get_columns(mapped.name)}
+        if "updated_at" not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE {mapped.name} ADD COLUMN updated_at DATETIME")
+        # Существующие строки считаем изменёнными сейчас: первая выгрузка изменений будет полной
+        conn.execute(mapped.update().where(mapped.c.updated_at.is_(None)).values(updated_at=now))
+    _create_indexes(conn, "ix_appointments_updated_at", "ix_clients_updated_at", "ix_specialists_updated_at")
+
+
+def _daily_stat_key(row: str) -> str:
+    """Ключ строки appointment_daily_stats для OLD/NEW строки appointments."""
+    return (
+        f"coalesce({row}.specialist_id, 0), "
+        f"date(coalesce({row}.scheduled_time, {row}.proposed_date)), "
+        f"{row}.status"
+    )
+
+
+def _daily_stat_change(row: str, delta: int) -> str:
+    statement = (
+        "INSERT INTO appointment_daily_stats (specialist_id, day, status, count) "
+        f"VALUES ({_daily_stat_key(row)}, {delta}) "
+        "ON CONFLICT (specialist_id, day, status) DO UPDATE SET count = count + excluded.count;"
+    )
+    if delta < 0:
+        # Опустевшие строки удаляем, чтобы таблица не росла нулями
+        statement += (
+            " DELETE FROM appointment_daily_stats "
+            f"WHERE (specialist_id, day, status) = ({_daily_stat_key(row)}) AND count <= 0;"
+        )
+    return statement
+
+
+# Триггеры ведут дневные итоги при любом изменении заявки, в той же транзакции
+DAILY_STAT_TRIGGERS = {
+    "trg_appointments_daily_stats_insert": (
+        "AFTER INSERT ON appointments",
+        _daily_stat_change("NEW", 1),
+    ),
+    "trg_appointments_daily_stats_update": (
+        "AFTER UPDATE OF status, specialist_id, scheduled_time, proposed_date ON appointments "
+        f"WHEN ({_daily_stat_key('OLD')}) IS NOT ({_daily_stat_key('NEW')})",
+        _daily_stat_change("OLD", -1) + " " + _daily_stat_change("NEW", 1),
+    ),
+    "trg_appointments_daily_stats_delete": (
+        "AFTER DELETE ON appointments",
+        _daily_stat_change("OLD", -1),
+    ),
+}
+
+
+def _rebuild_daily_stats(conn: Connection):
+    """Пересчитывает appointment_daily_stats по всей таблице appointments."""
+    conn.exec_driver_sql("DELETE FROM appointment_daily_stats")
+    conn.exec_driver_sql(
+        "INSERT INTO appointment_daily_stats (specialist_id, day, status, count) "
+        "SELECT coalesce(specialist_id, 0), date(coalesce(scheduled_time, proposed_date)), status, count(*) "
+        "FROM appointments GROUP BY 1, 2, 3"
+    )
+    rows = conn.execute(select(func.count()).select_from(AppointmentDailyStat)).scalar()
+    logger.info(f"Rebuilt appointment daily stats: {rows} rows")
+
+
+@migration(7, "Daily appointment rollup maintained by triggers")
+def _daily_stats(conn: Connection):
+    for name, (when, body) in DAILY_STAT_TRIGGERS.items():
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE TRIGGER {name} {when} BEGIN {body} END")
+    _rebuild_daily_stats(conn)
+
+
+@migration(8, "Client average rating column")
+def _client_rating_avg(conn: Connection):
+    columns = {column["name"] for column in inspect(conn).get_columns("clients")}
+    if "rating_avg" not in columns:
+        # SQLite добавляет через ALTER только VIRTUAL-колонки; индекс хранит вычисленные значения
+        ddl = CreateColumn(Client.__table__.c.rating_avg).compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE clients ADD COLUMN {ddl}")
+    _create_indexes(conn, "ix_clients_rating_avg")
+
+
+@migration(9, "Index for available specialists")
+def _available_specialists_index(conn: Connection):
+    _create_indexes(conn, "ix_specialists_is_available")
+
+
+async def rebuild_daily_stats(engine: AsyncEngine):
+    """
+    Пересчитывает дневные итоги заявок (например, после ручной правки БД).
+    Args:
+        engine: Асинхронный движок БД.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(_rebuild_daily_stats)
+
+
+def _upgrade(conn: Connection):
+    Base.metadata.create_all(conn)
+    schema_version.create(conn, checkfirst=True)
+    current = conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        apply(conn)
+        conn.execute(schema_version.insert().values(
+            version=version,
+            description=description,
+            applied_at=datetime.now(tz=config.TIMEZONE)
+        ))
+        logger.info(f"Applied migration {version}: {description}")
+
+
+async def run_migrations(engine: AsyncEngine):
+    """
+    Создаёт недостающие таблицы и применяет новые миграции в одной транзакции.
+    Args:
+        engine: Асинхронный движок БД.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(_upgrade)
+
+
+# Горячие запросы CRUD, для которых проверяется план выполнения: (метод, аргументы)
+def _hot_calls(now: datetime) -> list[tuple[str, tuple]]:
+    return [
+        ("get_client", ("0",)),
+        ("get_identity", ("0",)),
+        ("get_specialist", ("0",)),
+        ("get_available_specialists", ()),
+        ("get_appointment", (0,)),
+        ("get_appointments_by_specialist", (0,)),
+        ("get_approved_appointments_count", ()),
+        ("get_status_counts", ()),
+        ("get_statistics_summary", ()),
+        ("get_specialist_stats", ()),
+        ("get_daily_volumes", (now, now)),
+        ("get_sent_notifications", (0,)),
+        ("get_upcoming_reminders", (now,)),
+        ("get_due_reminders", (now,)),
+        ("get_appointments_by_ids", ([0],)),
+        ("get_appointment_cards_by_ids", ([0],)),
+        ("get_due_outbox_messages", (now,)),
+        ("get_next_outbox_attempt", ()),
+        ("get_chat_contacts", (["0"],)),
+        ("get_active_blacklist", (now,)),
+        ("get_busy_times", (0, now, now)),
+        ("get_specialist_period_counts", (0, now.date(), now.date())),
+        ("get_future_appointments_page", ((now, 0),)),
+        ("count_future_appointments", ()),
+        ("count_clients", ()),
+        ("count_specialists", ()),
+        ("count_active_specialist_appointments", (0,)),
+        ("get_clients_page", ((0,),)),
+        ("get_clients_by_rating_page", ((0.0, 0),)),
+        ("get_active_specialist_appointments_page", (0, (0,))),
+    ]
+
+# Полный просмотр допустим только там, где запрос по смыслу читает всё: (метод, таблица).
+# Таблица целиком в список не попадает, иначе новый запрос без индекса пройдёт проверку незамеченным
+ALLOWED_SCANS = {
+    ("get_due_reminders", "reminder_offsets"),  # CTE: по строке на каждый тип из config.REMINDER_OFFSETS
+    ("get_status_counts", "appointment_daily_stats"),  # сводка по всем дневным итогам
+    ("get_statistics_summary", "appointment_daily_stats"),
+    ("get_specialist_stats", "specialists"),  # отчёт по каждому специалисту
+}
+# Строка-константа SELECT без FROM — не таблица
+_CONSTANT_SCANS = {"CONSTANT"}
+
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+
+
+async def find_full_scans() -> list[tuple[str, str]]:
+    """
+    Выполняет горячие методы CRUD на пустой БД в памяти и проверяет EXPLAIN QUERY PLAN.
+    Returns:
+        Список (метод, строка плана) для запросов, которые просматривают таблицу целиком.
+    """
+    from database.crud import CRUD
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    await run_migrations(engine)
+    captured: list[tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    scans = []
+    try:
+        for name, args in _hot_calls(datetime.now(tz=config.TIMEZONE)):
+            captured.clear()
+            async with AsyncSession(engine) as session:
+                await getattr(CRUD(session), name)(*args)
+            statements = list(captured)
+            async with engine.connect() as conn:
+                for statement, parameters in statements:
+                    plan = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                    for row in plan:
+                        detail = row[-1]
+                        match = _SCAN.match(detail)
+                        table = match.group(1) if match else None
+                        if (match and "USING" not in detail and table not in _CONSTANT_SCANS
+                                and (name, table) not in ALLOWED_SCANS):
+                            scans.append((name, detail))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        await engine.dispose()
+    return scans
+
+
+if __name__ == "__main__":
+    # python -m database.migrations rebuild-daily-stats: пересчёт дневных итогов заявок в рабочей БД
+    if sys.argv[1:] == ["rebuild-daily-stats"]:
+        from database.database import engine
+        logging.basicConfig(level=logging.INFO)
+        asyncio.run(rebuild_daily_stats(engine))
+        sys.exit(0)
+    # python -m database.migrations: ненулевой код выхода, если горячий запрос идёт полным просмотром
+    logging.basicConfig(level=logging.WARNING)
+    full_scans = asyncio.run(find_full_scans())
+    for method, detail in full_scans:
+        print(f"CRUD.{method}: {detail}")
+    sys.exit(1 if full_scans else 0)
@@ -1,10 +1,18 @@
-from sqlalchemy import Column, Integer, String, Enum, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, Enum, ForeignKey, Date, DateTime, Text, Boolean, Index, LargeBinary, Float, Computed
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 import enum
+from typing import NamedTuple
 from 
     rating = Column(Integer, default=0)
     rating_count = Column(Integer, default=0)
+    # Средний рейтинг: вычисляемая колонка, всегда согласована с rating/rating_count (миграция 8).
+    # Значения хранятся в индексе ix_clients_rating_avg, поэтому сортировка и фильтр по рейтингу идут без полного просмотра
+    rating_avg = Column(
+        Float,
+        Computed("CASE WHEN rating_count > 0 THEN rating * 1.0 / rating_count ELSE 0 END", persisted=False),
+        index=True
+    )
 
     user = relationship("User", back_populates="client")
     appointments = relationship("Appointment", back_populates="client")
@@ -15,3 +23,128 @@ from
     report_text = Column(Text, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(tz=config.TIMEZONE))
     specialist = relationship("Specialist", back_populates="reports")
+
+# Одно напоминание каждого типа на заявку; индекс же обслуживает anti-join в CRUD.get_due_reminders
+Index(
+    "uq_notification_sent_appointment_type",
+    NotificationSent.appointment_id,
+    NotificationSent.reminder_type,
+    unique=True
+)
+
+class OutboxStatus(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    DEAD = "dead"
+
+# Исходящие уведомления по заявкам; пишутся в той же транзакции, что и изменение заявки
+class OutboxMessage(Base):
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False)
+    payload = Column(Text, nullable=True)  # JSON с дополнительными параметрами
+    status = Column(Enum(OutboxStatus), default=OutboxStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=lambda: datetime.now(tz=config.TIMEZONE), nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(tz=config.TIMEZONE))
+    sent_at = Column(DateTime, nullable=True)
+
+Index("ix_outbox_status_next_attempt", OutboxMessage.status, OutboxMessage.next_attempt_at)
+
+# Кэш username чатов, чтобы не вызывать bot.get_chat при каждом уведомлении
+class ChatContact(Base):
+    __tablename__ = "chat_contacts"
+    telegram_id = Column(String, primary_key=True)
+    username = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(tz=config.TIMEZONE), nullable=False)
+
+# Чаты, куда бот не может писать (заблокирован, аккаунт удалён, чат не найден)
+class ChatReachability(Base):
+    __tablename__ = "chat_reachability"
+    telegram_id = Column(String, primary_key=True)
+    reason = Column(Text, nullable=True)
+    failures = Column(Integer, default=1, nullable=False)
+    unreachable_until = Column(DateTime, nullable=False)
+    checked_at = Column(DateTime, default=lambda: datetime.now(tz=config.TIMEZONE), nullable=False)
+
+# Индексы под горячие запросы CRUD; в существующих БД их создаёт миграция 1 (database.migrations)
+Index("ix_appointments_status_scheduled_time", Appointment.status, Appointment.scheduled_time)
+Index("ix_appointments_specialist_status_time", Appointment.specialist_id, Appointment.status, Appointment.scheduled_time)
+Index("ix_appointments_client_id", Appointment.client_id)
+# Выгрузка заявок за период (CRUD.stream_appointments), миграция 5
+Index("ix_appointments_proposed_date", Appointment.proposed_date)
+Index("ix_specialists_user_id", Specialist.user_id)
+# Доступные специалисты (CRUD.get_available_specialists), миграция 9
+Index("ix_specialists_is_available", Specialist.is_available)
+Index("ix_clients_user_id", Client.user_id)
+Index("ix_blacklist_telegram_id", Blacklist.telegram_id)
+# Выборка действующих блокировок и очистка истёкших (services.blacklist)
+Index("ix_blacklist_blocked_until", Blacklist.blocked_until)
+
+# Одна одобренная заявка на время специалиста: страховка для CRUD.reserve_slot при параллельных записях
+Index(
+    "uq_appointments_specialist_slot",
+    Appointment.specialist_id,
+    Appointment.scheduled_time,
+    unique=True,
+    sqlite_where=Appointment.status == AppointmentStatus.APPROVED
+)
+
+# Отмена записывается двумя значениями: CANCELED (админ/клиент) и CANCELLED (специалист)
+CANCELLED_STATUSES = (AppointmentStatus.CANCELED, AppointmentStatus.CANCELLED)
+
+# Номер версии заявки: растёт при каждом переходе статуса, для оптимистичной блокировки
+Appointment.version = Column(Integer, default=0, server_default="0", nullable=False)
+
+# Время последнего изменения строки: по нему строится выгрузка изменений (миграция 6)
+for _model in (Appointment, Client, Specialist):
+    _model.updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(tz=config.TIMEZONE),
+        onupdate=lambda: datetime.now(tz=config.TIMEZONE)
+    )
+Index("ix_appointments_updated_at", Appointment.updated_at)
+Index("ix_clients_updated_at", Client.updated_at)
+Index("ix_specialists_updated_at", Specialist.updated_at)
+
+
+# Переход статуса заявки для CRUD.transition_appointment
+class AppointmentTransition(NamedTuple):
+    sources: tuple  # статусы, из которых переход допустим
+    target: AppointmentStatus | None  # новый статус; None — статус не меняется
+    flag: str | None = None  # булев флаг, который переход выставляет (должен быть ещё False)
+
+
+APPOINTMENT_TRANSITIONS = {
+    "reject": AppointmentTransition((AppointmentStatus.PENDING, AppointmentStatus.APPROVED), AppointmentStatus.CANCELED),
+    "client_refuse": AppointmentTransition((AppointmentStatus.PENDING, AppointmentStatus.APPROVED), AppointmentStatus.CANCELED),
+    "specialist_cancel": AppointmentTransition((AppointmentStatus.APPROVED,), AppointmentStatus.CANCELLED),
+    "complete": AppointmentTransition((AppointmentStatus.APPROVED,), AppointmentStatus.COMPLETED),
+    "client_ready": AppointmentTransition((AppointmentStatus.APPROVED,), None, "client_ready"),
+    "specialist_ready": AppointmentTransition((AppointmentStatus.APPROVED,), None, "specialist_ready"),
+}
+
+# Состояния FSM aiogram (database.storage.DatabaseStorage)
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+    key = Column(String, primary_key=True)
+    state = Column(String, nullable=True)
+    data = Column(LargeBinary, nullable=True)  # компактный JSON, сжатый zlib при большом размере
+    updated_at = Column(DateTime, default=lambda: datetime.now(tz=config.TIMEZONE), nullable=False, index=True)
+
+# Отметка последней выгрузки изменений для каждого администратора
+class ExportWatermark(Base):
+    __tablename__ = "export_watermarks"
+    admin_id = Column(String, primary_key=True)
+    exported_until = Column(DateTime, nullable=False)
+
+# Дневные итоги заявок: (специалист, день, статус) -> количество. Ведутся триггерами на appointments
+# (миграция 7); день — дата scheduled_time, а до назначения времени — proposed_date
+class AppointmentDailyStat(Base):
+    __tablename__ = "appointment_daily_stats"
+    specialist_id = Column(Integer, primary_key=True)  # 0 — специалист не назначен
+    day = Column(Date, primary_key=True)
+    status = Column(Enum(AppointmentStatus), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
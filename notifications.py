@@ -1,22 +1,121 @@
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 from database.models import Appointment, AppointmentStatus
+from database.read_models import AppointmentCard
 from datetime import datetime
 from config import config
-from utils.helpers import format_appointment_date
+from utils.helpers import format_appointment_date, format_time_until
+from services.outbound import outbound, Priority
+from services.contacts import contact_cache
+from utils.templates import Template, escape_markdown_v2
 import logging
 
 logger = logging.getLogger(__name__)
 
-def escape_markdown_v2(text: any) -> str:
-    """Escape special characters for Telegram MarkdownV2, handling None or non-string inputs."""
-    if text is None:
-        return ""
-    text = str(text)
-    chars_to_escape = r'_*[]()~`#+-=|{}.!'
-    for char in chars_to_escape:
-        text = text.replace(char, f'\\{char}')
-    return text
+# Шаблоны уведомлений: статический текст экранируется один раз при импорте
+
+CLIENT_CONTACT = Template("Контакт клиента: [{link}]")
+CLIENT_CONTACT_UNRESOLVED = Template(
+    "Контакт клиента: [{link}]\n"
+    "(Если ссылка не работает, свяжитесь с администратором: https://t.me/{admin_id})"
+)
+CLIENT_DETAILS = Template(
+    "👤 Клиент: {client_name}\n"
+    "{contact:raw}\n"
+    "📞 Номер телефона: {phone}"
+)
+APPOINTMENT_DETAILS = Template(
+    "🏋️ Комплекс: {complex}\n"
+    "📝 Причина: {reason}"
+)
+SPECIALIST_CONTACT = Template(
+    "Телефон специалиста: {phone}\n"
+    "{contact:link}"
+)
+ADMIN_FALLBACK = Template("\nЕсли не можете связаться со специалистом, обратитесь к администратору: {admin:link}")
+
+SPECIALIST_NEW = Template(
+    "{prefix} #{id}\n"
+    "{client:raw}\n"
+    "⏰ Время: {time}\n"
+    "{details:raw}"
+)
+SPECIALIST_REMINDER = Template(
+    "⏰ Напоминание: заявка #{id} {time_until} в {time}!\n"
+    "{client:raw}\n"
+    "{details:raw}\n"
+    "Подтвердите готовность в расписании."
+)
+CLIENT_REMINDER = Template(
+    "⏰ Напоминание: ваша заявка #{id} {time_until} в {time}!\n"
+    "👨‍⚕️ Специалист: {specialist_name}\n"
+    "{contact:raw}\n"
+    "Подтвердите готовность к работе:{footer:raw}"
+)
+CLIENT_REASSIGNED = Template(
+    "🔄 Ваша заявка #{id} была переназначена!\n"
+    "👨‍⚕️ Новый специалист: {specialist_name}\n"
+    "{contact:raw}\n"
+    "⏰ Дата и время: {time}{footer:raw}"
+)
+CLIENT_APPROVED = Template(
+    "✅ Ваша заявка #{id} подтверждена!\n"
+    "⏰ Дата и время: {time}\n"
+    "👨‍⚕️ Специалист: {specialist_name}\n"
+    "{contact:raw}{footer:raw}"
+)
+CLIENT_REJECTED = Template(
+    "❌ Ваша заявка #{id} была отклонена.\n"
+    "📝 Причина: {reason}"
+)
+SPECIALIST_UNASSIGNED = Template(
+    "Заявка #{id} была переназначена на другого специалиста.\n"
+    "Клиент: {client_name}\n"
+    "Время: {time}"
+)
+REMINDER_FAILED = Template("Ошибка: Не удалось отправить напоминание {recipient} {name} о заявке #{id}.")
+
+
+async def client_details(bot: Bot, client) -> str:
+    """
+    Render the client block (name, contact link, phone) shared by specialist messages.
+    Args:
+        bot (Bot): Bot instance used to resolve the client's username.
+        client (Client | ClientCard): The client.
+    """
+    telegram_id = client.user.telegram_id
+    username = await contact_cache.resolve(bot, telegram_id)
+    if username:
+        contact = CLIENT_CONTACT.render(link=f"https://t.me/{username}")
+    else:
+        contact = CLIENT_CONTACT_UNRESOLVED.render(link=f"https://t.me/{telegram_id}", admin_id=config.ADMIN_ID)
+    return CLIENT_DETAILS.render(client_name=client.full_name, contact=contact, phone=client.phone or "Не указан")
+
+
+def specialist_contact(specialist, appointment_id: int) -> tuple[str, str]:
+    """
+    Render the specialist's phone and contact link shared by client messages.
+    Args:
+        specialist (Specialist | SpecialistCard): The specialist.
+        appointment_id (int): Appointment ID, for the log message.
+    Returns:
+        tuple[str, str]: The contact fragment and a footer pointing to the admin when the
+        specialist has no username (empty otherwise).
+    """
+    username = (specialist.username or "").strip()
+    phone = (getattr(specialist, "phone", None) or "").strip()
+    admin_link = f"https://t.me/{config.ADMIN_ID}"
+    if username:
+        if not username.startswith("@"):
+            username = f"@{username}"
+        contact = ("Связаться со специалистом", f"https://t.me/{username}")
+        footer = ""
+    else:
+        contact = ("Связаться с администратором", admin_link)
+        footer = ADMIN_FALLBACK.render(admin=("Администратор", admin_link))
+        logger.warning(f"Specialist {specialist.full_name} (ID: {specialist.user_id}, appointment_id: {appointment_id}) has no valid username.")
+    return SPECIALIST_CONTACT.render(phone=phone or "не указан", contact=contact), footer
 
 async def notify_specialist(bot: Bot, appointment: Appointment, is_reassignment: bool = False):
     """
@@ -25,47 +124,51 @@ async def notify_specialist(bot: Bot, appointment: Appointment, is_reassignment:
         bot (Bot): Bot instance for sending messages.
         appointment (Appointment): Appointment object.
         is_reassignment (bool): Whether this is a reassignment notification.
+    Raises the delivery error; retries and admin alerts are handled by the outbox worker.
     """
     specialist = appointment.specialist
+    text = SPECIALIST_NEW.render(
+        prefix="🔄 Переназначена заявка" if is_reassignment else "📬 Новая заявка",
+        id=appointment.id,
+        client=await client_details(bot, appointment.client),
+        time=format_appointment_date(appointment.scheduled_time),
+        details=APPOINTMENT_DETAILS.render(complex=appointment.complex or "Не указан", reason=appointment.reason)
+    )
+    await outbound.send_message(
+        specialist.user_id,
+        text,
+        parse_mode="MarkdownV2",
+        disable_web_page_preview=True,
+        wait=True
+    )
+    logger.info(f"Notified specialist {specialist.user_id} about {'reassigned' if is_reassignment else 'new'} appointment {appointment.id}")
+
+async def notify_client_approved(bot: Bot, appointment: Appointment):
+    """
+    Notify client that the appointment was approved, with the time and specialist contact.
+    Args:
+        bot (Bot): Bot instance for sending messages.
+        appointment (Appointment): Appointment object.
+    Raises the delivery error; retries and admin alerts are handled by the outbox worker.
+    """
     client = appointment.client
-    scheduled_time = format_appointment_date(appointment.scheduled_time)
-    prefix = "🔄 Переназначена заявка" if is_reassignment else "📬 Новая заявка"
-    client_link = f"https://t.me/{client.user.telegram_id}"
-    client_contact = f"Контакт клиента: \\[{client_link}\\]"
-    try:
-        chat = await bot.get_chat(client.user.telegram_id)
-        if chat.username:
-            client_link = f"https://t.me/{chat.username}"
-            client_contact = f"Контакт клиента: \\[{client_link}\\]"
-        else:
-            client_contact += f"\n(Если ссылка не работает, свяжитесь с администратором: https://t.me/{config.ADMIN_ID})"
-    except Exception as e:
-        logger.warning(f"Cannot get username for client {client.user.telegram_id} (appointment_id: {appointment.id}): {e}")
-        client_contact += f"\n(Если ссылка не работает, свяжитесь с администратором: https://t.me/{config.ADMIN_ID})"
-    message_lines = [
-        escape_markdown_v2(f"{prefix} #{appointment.id}"),
-        escape_markdown_v2(f"👤 Клиент: {client.full_name}"),
-        escape_markdown_v2(f"{client_contact}"),
-        escape_markdown_v2(f"📞 Номер телефона: {client.phone or 'Не указан'}"),
-        escape_markdown_v2(f"⏰ Время: {scheduled_time}"),
-        escape_markdown_v2(f"🏋️ Комплекс: {appointment.complex or 'Не указан'}"),
-        escape_markdown_v2(f"📝 Причина: {appointment.reason}")
-    ]
-    try:
-        await bot.send_message(
-            specialist.user_id,
-            "\n".join(message_lines),
-            parse_mode="MarkdownV2",
-            disable_web_page_preview=True
-        )
-        logger.info(f"Notified specialist {specialist.user_id} about {'reassigned' if is_reassignment else 'new'} appointment {appointment.id}")
-    except Exception as e:
-        logger.error(f"Failed to notify specialist {specialist.user_id} for appointment {appointment.id}: {e}")
-        await bot.send_message(
-            config.ADMIN_ID,
-            escape_markdown_v2(f"Ошибка: Не удалось уведомить специалиста {specialist.full_name} о {'переназначении' if is_reassignment else 'новой'} заявке #{appointment.id}."),
-            parse_mode="MarkdownV2"
-        )
+    specialist = appointment.specialist
+    contact, footer = specialist_contact(specialist, appointment.id)
+    text = CLIENT_APPROVED.render(
+        id=appointment.id,
+        time=format_appointment_date(appointment.scheduled_time),
+        specialist_name=specialist.full_name,
+        contact=contact,
+        footer=footer
+    )
+    await outbound.send_message(
+        client.user.telegram_id,
+        text,
+        parse_mode="MarkdownV2",
+        disable_web_page_preview=True,
+        wait=True
+    )
+    logger.info(f"Notified client {client.user.telegram_id} about approved appointment {appointment.id}")
 
 async def notify_client_rejected(bot: Bot, appointment: Appointment, reason: str):
     """
@@ -74,119 +177,102 @@ async def notify_client_rejected(bot: Bot, appointment: Appointment, reason: str
         bot (Bot): Bot instance for sending messages.
         appointment (Appointment): Appointment object.
         reason (str): Reason for rejection.
+    Raises the delivery error; retries and admin alerts are handled by the outbox worker.
     """
     client = appointment.client
-    message_lines = [
-        escape_markdown_v2(f"❌ Ваша заявка #{appointment.id} была отклонена."),
-        escape_markdown_v2(f"📝 Причина: {reason}")
-    ]
-    try:
-        await bot.send_message(
-            client.user.telegram_id,
-            "\n".join(message_lines),
-            parse_mode="MarkdownV2"
-        )
-        logger.info(f"Notified client {client.user.telegram_id} about rejected appointment {appointment.id}")
-    except Exception as e:
-        logger.error(f"Failed to notify client {client.user.telegram_id} for rejected appointment {appointment.id}: {e}")
-        await bot.send_message(
-            config.ADMIN_ID,
-            escape_markdown_v2(f"Ошибка: Не удалось уведомить клиента {client.full_name} об отклонении заявки #{appointment.id}."),
-            parse_mode="MarkdownV2"
-        )
+    await outbound.send_message(
+        client.user.telegram_id,
+        CLIENT_REJECTED.render(id=appointment.id, reason=reason),
+        parse_mode="MarkdownV2",
+        wait=True
+    )
+    logger.info(f"Notified client {client.user.telegram_id} about rejected appointment {appointment.id}")
 
-async def notify_reminder(bot: Bot, appointment: Appointment):
+async def notify_reminder(bot: Bot, appointment: Appointment | AppointmentCard, reminder_type: str = "1h"):
     """
-    Send reminders to client and specialist one hour before the appointment.
+    Send reminders to client and specialist ahead of the appointment.
     Client gets a 'Готов к работе' button; specialist is prompted to use the schedule.
     Args:
         bot (Bot): Bot instance for sending messages.
-        appointment (Appointment): Appointment object.
+        appointment (Appointment | AppointmentCard): Appointment object or its read model.
+        reminder_type (str): Key of config.REMINDER_OFFSETS this reminder is sent for.
+    Permanent delivery errors (bot blocked, chat not found) are reported to the admin. A transient
+    error is raised after both messages were attempted, so the scheduler retries the reminder.
     """
     if appointment.status != AppointmentStatus.APPROVED:
         return
+    transient_error = None
+    time_until = format_time_until(config.REMINDER_OFFSETS[reminder_type])
     client = appointment.client
     specialist = appointment.specialist
     scheduled_time = format_appointment_date(appointment.scheduled_time)
     # Client reminder
     if not appointment.client_ready:
-        username = specialist.username
-        phone = getattr(specialist, 'phone', None)
-        phone_display = escape_markdown_v2(f"Телефон специалиста: {phone}") if phone and phone.strip() else "Телефон специалиста: не указан"
-        if username and username.strip():
-            if not username.startswith('@'):
-                username = f"@{username}"
-            specialist_link = f"https://t.me/{username}"
-            specialist_contact = f"[Связаться со специалистом]({specialist_link})"
-        else:
-            specialist_link = f"https://t.me/{config.ADMIN_ID}"
-            specialist_contact = f"[Связаться с администратором]({specialist_link})"
-            logger.warning(f"Specialist {specialist.full_name} (ID: {specialist.user_id}, appointment_id: {appointment.id}) has no valid username.")
-        client_message_lines = [
-            escape_markdown_v2(f"⏰ Напоминание: ваша заявка #{appointment.id} через час в {scheduled_time}!"),
-            escape_markdown_v2(f"👨‍⚕️ Специалист: {specialist.full_name}"),
-            phone_display,
-            specialist_contact,
-            escape_markdown_v2("Подтвердите готовность к работе:")
-        ]
-        if not username or not username.strip():
-            client_message_lines.append(f"Если не можете связаться со специалистом, обратитесь к администратору: [Администратор](https://t.me/{config.ADMIN_ID})")
+        contact, footer = specialist_contact(specialist, appointment.id)
+        client_text = CLIENT_REMINDER.render(
+            id=appointment.id,
+            time_until=time_until,
+            time=scheduled_time,
+            specialist_name=specialist.full_name,
+            contact=contact,
+            footer=footer
+        )
         try:
-            await bot.send_message(
+            await outbound.send_message(
                 client.user.telegram_id,
-                "\n".join(client_message_lines),
+                client_text,
                 parse_mode="MarkdownV2",
                 disable_web_page_preview=True,
                 reply_markup=InlineKeyboardMarkup(inline_keyboard=[
                     [InlineKeyboardButton(text="✅ Готов к работе", callback_data=f"client_ready_{appointment.id}")]
-                ])
+                ]),
+                priority=Priority.REMINDER,
+                wait=True
             )
-            logger.info(f"Sent reminder to client {client.user.telegram_id} for appointment {appointment.id}")
-        except Exception as e:
+            logger.info(f"Sent {reminder_type} reminder to client {client.user.telegram_id} for appointment {appointment.id}")
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
             logger.error(f"Failed to send reminder to client {client.user.telegram_id} for appointment {appointment.id}: {e}")
-            await bot.send_message(
+            await outbound.send_message(
                 config.ADMIN_ID,
-                escape_markdown_v2(f"Ошибка: Не удалось отправить напоминание клиенту {client.full_name} о заявке #{appointment.id}."),
-                parse_mode="MarkdownV2"
+                REMINDER_FAILED.render(recipient="клиенту", name=client.full_name, id=appointment.id),
+                parse_mode="MarkdownV2",
+                priority=Priority.ADMIN_ALERT
             )
+        except Exception as e:
+            logger.warning(f"Reminder to client {client.user.telegram_id} for appointment {appointment.id} will be retried: {e}")
+            transient_error = e
     # Specialist reminder
     if not appointment.specialist_ready:
-        client_link = f"https://t.me/{client.user.telegram_id}"
-        client_contact = f"Контакт клиента: \\[{client_link}\\]"
-        try:
-            chat = await bot.get_chat(client.user.telegram_id)
-            if chat.username:
-                client_link = f"https://t.me/{chat.username}"
-                client_contact = f"Контакт клиента: \\[{client_link}\\]"
-            else:
-                client_contact += f"\n(Если ссылка не работает, свяжитесь с администратором: https://t.me/{config.ADMIN_ID})"
-        except Exception as e:
-            logger.warning(f"Cannot get username for client {client.user.telegram_id} (appointment_id: {appointment.id}): {e}")
-            client_contact += f"\n(Если ссылка не работает, свяжитесь с администратором: https://t.me/{config.ADMIN_ID})"
-        specialist_message_lines = [
-            escape_markdown_v2(f"⏰ Напоминание: заявка #{appointment.id} через час в {scheduled_time}!"),
-            escape_markdown_v2(f"👤 Клиент: {client.full_name}"),
-            escape_markdown_v2(f"{client_contact}"),
-            escape_markdown_v2(f"📞 Номер телефона: {client.phone or 'Не указан'}"),
-            escape_markdown_v2(f"🏋️ Комплекс: {appointment.complex or 'Не указан'}"),
-            escape_markdown_v2(f"📝 Причина: {appointment.reason}"),
-            escape_markdown_v2("Подтвердите готовность в расписании.")
-        ]
+        specialist_text = SPECIALIST_REMINDER.render(
+            id=appointment.id,
+            time_until=time_until,
+            time=scheduled_time,
+            client=await client_details(bot, client),
+            details=APPOINTMENT_DETAILS.render(complex=appointment.complex or "Не указан", reason=appointment.reason)
+        )
         try:
-            await bot.send_message(
+            await outbound.send_message(
                 specialist.user_id,
-                "\n".join(specialist_message_lines),
+                specialist_text,
                 parse_mode="MarkdownV2",
-                disable_web_page_preview=True
+                disable_web_page_preview=True,
+                priority=Priority.REMINDER,
+                wait=True
             )
-            logger.info(f"Sent reminder to specialist {specialist.user_id} for appointment {appointment.id}")
-        except Exception as e:
+            logger.info(f"Sent {reminder_type} reminder to specialist {specialist.user_id} for appointment {appointment.id}")
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
             logger.error(f"Failed to send reminder to specialist {specialist.user_id} for appointment {appointment.id}: {e}")
-            await bot.send_message(
+            await outbound.send_message(
                 config.ADMIN_ID,
-                escape_markdown_v2(f"Ошибка: Не удалось отправить напоминание специалисту {specialist.full_name} о заявке #{appointment.id}."),
-                parse_mode="MarkdownV2"
+                REMINDER_FAILED.render(recipient="специалисту", name=specialist.full_name, id=appointment.id),
+                parse_mode="MarkdownV2",
+                priority=Priority.ADMIN_ALERT
             )
+        except Exception as e:
+            logger.warning(f"Reminder to specialist {specialist.user_id} for appointment {appointment.id} will be retried: {e}")
+            transient_error = transient_error or e
+    if transient_error is not None:
+        raise transient_error
 
 async def notify_client_reassigned(bot: Bot, appointment: Appointment):
     """
@@ -194,49 +280,46 @@ async def notify_client_reassigned(bot: Bot, appointment: Appointment):
     Args:
         bot (Bot): Bot instance for sending messages.
         appointment (Appointment): Appointment object.
+    Raises the delivery error; retries and admin alerts are handled by the outbox worker.
     """
     client = appointment.client
     specialist = appointment.specialist
-    scheduled_time = format_appointment_date(appointment.scheduled_time)
-    username = specialist.username
-    phone = getattr(specialist, 'phone', None)
-    phone_display = escape_markdown_v2(f"Телефон специалиста: {phone}") if phone and phone.strip() else "Телефон специалиста: не указан"
-    if username and username.strip():
-        if not username.startswith('@'):
-            username = f"@{username}"
-        specialist_link = f"https://t.me/{username}"
-        specialist_contact = f"[Связаться со специалистом]({specialist_link})"
-    else:
-        specialist_link = f"https://t.me/{config.ADMIN_ID}"
-        specialist_contact = f"[Связаться с администратором]({specialist_link})"
-        logger.warning(f"Specialist {specialist.full_name} (ID: {specialist.user_id}, appointment_id: {appointment.id}) has no valid username.")
-    message_lines = [
-        escape_markdown_v2(f"🔄 Ваша заявка #{appointment.id} была переназначена!"),
-        escape_markdown_v2(f"👨‍⚕️ Новый специалист: {specialist.full_name}"),
-        phone_display,
-        specialist_contact,
-        escape_markdown_v2(f"⏰ Дата и время: {scheduled_time}")
-    ]
-    if not username or not username.strip():
-        message_lines.append(f"Если не можете связаться со специалистом, обратитесь к администратору: [Администратор](https://t.me/{config.ADMIN_ID})")
-    try:
-        await bot.send_message(
-            client.user.telegram_id,
-            "\n".join(message_lines),
-            parse_mode="MarkdownV2",
-            disable_web_page_preview=True,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    InlineKeyboardButton(text="✅ Одобрить", callback_data=f"client_approve_{appointment.id}"),
-                    InlineKeyboardButton(text="❌ Отклонить", callback_data=f"client_decline_{appointment.id}")
-                ]
-            ])
-        )
-        logger.info(f"Notified client {client.user.telegram_id} about reassigned appointment {appointment.id}")
-    except Exception as e:
-        logger.error(f"Failed to notify client {client.user.telegram_id} for reassigned appointment {appointment.id}: {e}")
-        await bot.send_message(
-            config.ADMIN_ID,
-            escape_markdown_v2(f"Ошибка: Не удалось уведомить клиента {client.full_name} о переназначении заявки #{appointment.id}."),
-            parse_mode="MarkdownV2"
-        )
\ No newline at end of file
+    contact, footer = specialist_contact(specialist, appointment.id)
+    text = CLIENT_REASSIGNED.render(
+        id=appointment.id,
+        specialist_name=specialist.full_name,
+        contact=contact,
+        time=format_appointment_date(appointment.scheduled_time),
+        footer=footer
+    )
+    await outbound.send_message(
+        client.user.telegram_id,
+        text,
+        parse_mode="MarkdownV2",
+        disable_web_page_preview=True,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Одобрить", callback_data=f"client_approve_{appointment.id}"),
+                InlineKeyboardButton(text="❌ Отклонить", callback_data=f"client_decline_{appointment.id}")
+            ]
+        ]),
+        wait=True
+    )
+    logger.info(f"Notified client {client.user.telegram_id} about reassigned appointment {appointment.id}")
+
+async def notify_specialist_unassigned(bot: Bot, appointment: Appointment, specialist_user_id: str):
+    """
+    Notify the previous specialist that the appointment was reassigned.
+    Args:
+        bot (Bot): Bot instance for sending messages.
+        appointment (Appointment): Appointment object.
+        specialist_user_id (str): Telegram ID of the previous specialist.
+    Raises the delivery error; retries and admin alerts are handled by the outbox worker.
+    """
+    text = SPECIALIST_UNASSIGNED.render(
+        id=appointment.id,
+        client_name=appointment.client.full_name,
+        time=format_appointment_date(appointment.scheduled_time.astimezone(config.TIMEZONE))
+    )
+    await outbound.send_message(specialist_user_id, text, parse_mode="MarkdownV2", wait=True)
+    logger.info(f"Notified specialist {specialist_user_id} about reassigned appointment {appointment.id}")
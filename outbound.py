@@ -0,0 +1,218 @@
+import asyncio
+import enum
+import itertools
+import logging
+import time
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from config import config
+from services.reachability import reachability
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    """Outbound lanes; lower value is delivered first."""
+    INTERACTIVE = 0
+    REMINDER = 1
+    ADMIN_ALERT = 2
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Take one token if available.
+        Returns:
+            float: 0 if the token was taken, otherwise seconds until one is available.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class OutboundMessage:
+    __slots__ = ("chat_id", "text", "kwargs", "priority", "future", "attempts")
+
+    def __init__(self, chat_id, text: str, kwargs: dict, priority: Priority, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+
+
+class OutboundDispatcher:
+    """
+    Central queue for every bot.send_message call.
+
+    Messages are taken from a bounded priority queue by a few workers. Each send needs a token
+    from the global bucket (Telegram's ~30 msg/s) and from the per-chat bucket (~1 msg/s);
+    a message whose chat is not ready yet is put back after the wait instead of blocking a
+    worker. TelegramRetryAfter pauses the whole dispatcher for the requested time and the
+    message is retried.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, max_queue_size: int = 1000,
+                 workers: int = 4, max_retries: int = 3):
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._queue: asyncio.PriorityQueue | None = None
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._bot: Bot | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._pending: set[asyncio.Task] = set()
+        self.metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "delayed": 0,
+            "queue_full": 0,
+        }
+
+    def start(self, bot: Bot):
+        """Start the delivery workers."""
+        self._bot = bot
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Outbound dispatcher started with {self.workers} workers")
+
+    async def stop(self):
+        """Stop the workers; messages still in the queue are dropped."""
+        for task in [*self._tasks, *self._pending]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._pending, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Outbound dispatcher stopped: {self.snapshot()}")
+
+    def snapshot(self) -> dict:
+        """Current counters plus queue depth."""
+        return {**self.metrics, "queue_size": self._queue.qsize() if self._queue else 0}
+
+    async def send_message(self, chat_id, text: str, priority: Priority = Priority.INTERACTIVE,
+                           wait: bool = False, **kwargs):
+        """
+        Queue a message for delivery.
+        Args:
+            chat_id: Telegram chat ID.
+            text (str): Message text.
+            priority (Priority): Delivery lane.
+            wait (bool): Wait for delivery and return the sent Message / raise the send error.
+            **kwargs: Extra arguments for Bot.send_message (parse_mode, reply_markup, ...).
+        """
+        future = asyncio.get_running_loop().create_future()
+        message = OutboundMessage(chat_id, text, kwargs, priority, future)
+        if self._queue.full():
+            self.metrics["queue_full"] += 1
+            logger.warning(f"Outbound queue is full ({self._queue.qsize()}), waiting for a free slot")
+        await self._queue.put((priority, next(self._sequence), message))
+        self.metrics["enqueued"] += 1
+        if wait:
+            return await future
+        future.add_done_callback(self._log_failure)
+        return None
+
+    def _log_failure(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception():
+            logger.error(f"Failed to deliver queued message: {future.exception()}")
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        key = str(chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.is_idle()}
+            bucket = self._chat_buckets[key] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    def _requeue_later(self, delay: float, item: tuple):
+        async def requeue():
+            await asyncio.sleep(delay)
+            await self._queue.put(item)
+        task = asyncio.create_task(requeue())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                logger.error(f"Outbound worker error: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: tuple):
+        message = item[2]
+        if message.future.done():
+            return
+        delay = self._chat_bucket(message.chat_id).try_acquire()
+        if delay:
+            self.metrics["delayed"] += 1
+            self._requeue_later(delay, item)
+            return
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self._global_bucket.acquire()
+        try:
+            result = await self._bot.send_message(message.chat_id, message.text, **message.kwargs)
+        except TelegramRetryAfter as e:
+            message.attempts += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            if message.attempts > self.max_retries:
+                self.metrics["failed"] += 1
+                message.future.set_exception(e)
+                return
+            self.metrics["retried"] += 1
+            logger.warning(f"Flood control for chat {message.chat_id}, retry in {e.retry_after}s")
+            self._requeue_later(e.retry_after, item)
+        except Exception as e:
+            self.metrics["failed"] += 1
+            reachability.observe(message.chat_id, e)
+            message.future.set_exception(e)
+        else:
+            self.metrics["sent"] += 1
+            reachability.observe(message.chat_id)
+            message.future.set_result(result)
+
+
+outbound = OutboundDispatcher(
+    global_rate=config.OUTBOUND_GLOBAL_RATE,
+    chat_rate=config.OUTBOUND_CHAT_RATE,
+    max_queue_size=config.OUTBOUND_QUEUE_SIZE
+)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from config import config
+from database.database import create_session
+from database.crud import CRUD
+from services.notifications import (
+    escape_markdown_v2,
+    notify_specialist,
+    notify_client_approved,
+    notify_client_rejected,
+    notify_client_reassigned,
+    notify_specialist_unassigned,
+)
+from services.outbound import outbound, Priority
+from services.contacts import contact_cache
+
+logger = logging.getLogger(__name__)
+
+# Виды уведомлений, которые handlers кладут в outbox
+CLIENT_APPROVED = "client_approved"
+CLIENT_REJECTED = "client_rejected"
+CLIENT_REASSIGNED = "client_reassigned"
+SPECIALIST_ASSIGNED = "specialist_assigned"
+SPECIALIST_REASSIGNED = "specialist_reassigned"
+SPECIALIST_UNASSIGNED = "specialist_unassigned"
+
+# Ошибки, которые не исправятся повтором (бот заблокирован, чат не найден)
+PERMANENT_ERRORS = (TelegramBadRequest, TelegramForbiddenError)
+
+
+async def _client_approved(bot: Bot, appointment, payload: dict):
+    await notify_client_approved(bot, appointment)
+
+
+async def _client_rejected(bot: Bot, appointment, payload: dict):
+    await notify_client_rejected(bot, appointment, appointment.reject_reason)
+
+
+async def _client_reassigned(bot: Bot, appointment, payload: dict):
+    await notify_client_reassigned(bot, appointment)
+
+
+async def _specialist_assigned(bot: Bot, appointment, payload: dict):
+    await notify_specialist(bot, appointment)
+
+
+async def _specialist_reassigned(bot: Bot, appointment, payload: dict):
+    await notify_specialist(bot, appointment, is_reassignment=True)
+
+
+async def _specialist_unassigned(bot: Bot, appointment, payload: dict):
+    await notify_specialist_unassigned(bot, appointment, payload["specialist_user_id"])
+
+
+HANDLERS = {
+    CLIENT_APPROVED: _client_approved,
+    CLIENT_REJECTED: _client_rejected,
+    CLIENT_REASSIGNED: _client_reassigned,
+    SPECIALIST_ASSIGNED: _specialist_assigned,
+    SPECIALIST_REASSIGNED: _specialist_reassigned,
+    SPECIALIST_UNASSIGNED: _specialist_unassigned,
+}
+
+class OutboxWorker:
+    """
+    Background delivery of notifications stored in the `outbox` table.
+
+    Handlers add outbox rows in the same transaction as the appointment change and call
+    `wake()` after the commit. The worker takes due rows in batches, sends them through the
+    outbound dispatcher concurrently, marks delivered rows in one UPDATE and reschedules
+    failed ones with exponential backoff. After `max_attempts` (or on an error that a retry
+    cannot fix) the row is moved to DEAD and the admin is alerted. Rows left PENDING by a
+    crash are picked up again on the next start.
+    """
+
+    def __init__(self, batch_size: int = 50, max_attempts: int = 5, base_delay: float = 5,
+                 max_delay: float = 600, poll_interval: float = 60):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._bot: Bot | None = None
+
+    def wake(self):
+        """Tell the worker that new rows were committed."""
+        self._wakeup.set()
+
+    def start(self, bot: Bot):
+        """Start the delivery loop in the background."""
+        self._bot = bot
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the delivery loop; undelivered rows stay PENDING in the database."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stats(self) -> dict:
+        """Number of outbox rows per status."""
+        async with create_session() as session:
+            return await CRUD(session).get_outbox_stats()
+
+    def _backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.base_delay * 2 ** (attempts - 1), self.max_delay))
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._drain() == self.batch_size:
+                    continue
+                timeout = await self._seconds_until_next()
+            except Exception as e:
+                logger.error(f"Error in outbox worker: {e}", exc_info=True)
+                timeout = self.poll_interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _seconds_until_next(self) -> float:
+        async with create_session() as session:
+            next_attempt_at = await CRUD(session).get_next_outbox_attempt()
+        if next_attempt_at is None:
+            return self.poll_interval
+        if next_attempt_at.tzinfo is None:
+            next_attempt_at = config.TIMEZONE.localize(next_attempt_at)
+        delay = (next_attempt_at - datetime.now(tz=config.TIMEZONE)).total_seconds()
+        return min(max(delay, 0), self.poll_interval)
+
+    async def _drain(self) -> int:
+        """Deliver one batch of due rows and return its size."""
+        async with create_session() as session:
+            crud = CRUD(session)
+            messages = await crud.get_due_outbox_messages(datetime.now(tz=config.TIMEZONE), self.batch_size)
+            if not messages:
+                return 0
+            appointments = await crud.get_appointments_by_ids(list({m.appointment_id for m in messages}))
+            by_id = {appointment.id: appointment for appointment in appointments}
+            # Не держим соединение пула, пока идут запросы к Telegram
+            await session.commit()
+            await contact_cache.preload([appointment.client.user.telegram_id for appointment in appointments])
+            results = await asyncio.gather(
+                *[self._deliver(message, by_id.get(message.appointment_id)) for message in messages],
+                return_exceptions=True
+            )
+            sent_ids = []
+            for message, error in zip(messages, results):
+                if error is None:
+                    sent_ids.append(message.id)
+                else:
+                    await self._fail(crud, message, by_id.get(message.appointment_id), error)
+            await crud.mark_outbox_sent(sent_ids)
+            logger.info(f"Outbox batch: {len(sent_ids)} sent, {len(messages) - len(sent_ids)} failed")
+            return len(messages)
+
+    async def _deliver(self, message, appointment):
+        if appointment is None:
+            raise LookupError(f"appointment {message.appointment_id} not found")
+        handler = HANDLERS.get(message.kind)
+        if handler is None:
+            raise LookupError(f"unknown outbox kind {message.kind}")
+        payload = json.loads(message.payload) if message.payload else {}
+        await handler(self._bot, appointment, payload)
+
+    async def _fail(self, crud: CRUD, message, appointment, error: BaseException):
+        attempts = message.attempts + 1
+        dead = attempts >= self.max_attempts or isinstance(error, (LookupError, *PERMANENT_ERRORS))
+        await crud.mark_outbox_failed(
+            message.id,
+            str(error),
+            datetime.now(tz=config.TIMEZONE) + self._backoff(attempts),
+            dead=dead
+        )
+        if not dead:
+            return
+        await outbound.send_message(
+            config.ADMIN_ID,
+            escape_markdown_v2(
+                f"Ошибка: Не удалось доставить уведомление {message.kind} по заявке #{message.appointment_id} "
+                f"после {attempts} попыток. Причина: {error}"
+            ),
+            parse_mode="MarkdownV2",
+            priority=Priority.ADMIN_ALERT
+        )
+
+
+outbox_worker = OutboxWorker()
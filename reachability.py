@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from config import config
+from database.database import create_session
+from database.crud import CRUD
+
+logger = logging.getLogger(__name__)
+
+# Ответы BadRequest, означающие, что писать в чат бесполезно
+UNREACHABLE_BAD_REQUESTS = ("chat not found", "user not found", "peer_id_invalid", "user is deactivated")
+
+
+def is_unreachable_error(error: BaseException) -> bool:
+    """
+    Проверяет, означает ли ошибка отправки, что чат недоступен для бота.
+    Args:
+        error: Исключение, полученное при отправке.
+    Returns:
+        True для заблокированного бота, удалённого аккаунта или несуществующего чата.
+    """
+    if isinstance(error, TelegramForbiddenError):
+        return True
+    if isinstance(error, TelegramBadRequest):
+        message = str(error.message).lower()
+        return any(marker in message for marker in UNREACHABLE_BAD_REQUESTS)
+    return False
+
+
+class ReachabilityStore:
+    """
+    Per-chat record of whether the bot can deliver messages.
+
+    Every send through the outbound dispatcher reports its result here, and so does every
+    incoming update. A chat that blocked the bot, was deactivated or does not exist is marked
+    unreachable for a decay period that doubles with each consecutive failure (up to
+    `max_decay`). After the period it counts as reachable again, and a background re-check
+    (send_chat_action, invisible to the user) either clears the mark or extends it. Lookups
+    are dict reads; the marks are mirrored to the `chat_reachability` table so that
+    CRUD.get_available_specialists can filter on them.
+    """
+
+    def __init__(self, decay: timedelta = timedelta(hours=6), max_decay: timedelta = timedelta(days=7),
+                 recheck_interval: float = 3600):
+        self.decay = decay
+        self.max_decay = max_decay
+        self.recheck_interval = recheck_interval
+        self._unreachable: dict[str, tuple[datetime, int, str]] = {}
+        self._pending: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+        self._bot: Bot | None = None
+
+    def is_reachable(self, chat_id) -> bool:
+        """
+        Check whether the bot is expected to reach the chat; no network call.
+        Args:
+            chat_id: Telegram chat ID.
+        """
+        entry = self._unreachable.get(str(chat_id))
+        return entry is None or entry[0] <= datetime.now(tz=config.TIMEZONE)
+
+    def reason(self, chat_id) -> str | None:
+        """Last delivery error for an unreachable chat."""
+        entry = self._unreachable.get(str(chat_id))
+        return entry[2] if entry else None
+
+    def mark_reachable(self, chat_id):
+        """Record a successful delivery or an incoming update from the chat."""
+        key = str(chat_id)
+        if self._unreachable.pop(key, None) is not None:
+            self._persist(lambda crud: crud.clear_chat_unreachable(key))
+
+    def mark_unreachable(self, chat_id, reason: str):
+        """Record a delivery error that means the chat cannot be reached."""
+        key = str(chat_id)
+        previous = self._unreachable.get(key)
+        failures = previous[1] + 1 if previous else 1
+        until = datetime.now(tz=config.TIMEZONE) + min(self.decay * 2 ** (failures - 1), self.max_decay)
+        self._unreachable[key] = (until, failures, reason)
+        self._persist(lambda crud: crud.set_chat_unreachable(key, reason, failures, until))
+        logger.warning(f"Chat {key} unreachable until {until} ({failures} failures): {reason}")
+
+    def observe(self, chat_id, error: BaseException | None = None):
+        """
+        Update the chat status from a send result.
+        Args:
+            chat_id: Telegram chat ID.
+            error: Exception raised by the send, None on success.
+        """
+        if error is None:
+            self.mark_reachable(chat_id)
+        elif is_unreachable_error(error):
+            self.mark_unreachable(chat_id, str(error))
+
+    async def recheck(self, chat_id) -> bool:
+        """
+        Re-check a chat with an invisible chat action.
+        Args:
+            chat_id: Telegram chat ID.
+        Returns:
+            bool: Whether the chat is reachable after the check.
+        """
+        try:
+            await self._bot.send_chat_action(chat_id, "typing")
+        except Exception as e:
+            self.observe(chat_id, e)
+            return self.is_reachable(chat_id)
+        self.mark_reachable(chat_id)
+        return True
+
+    async def load(self):
+        """Load the unreachable marks from the database."""
+        async with create_session() as session:
+            chats = await CRUD(session).get_unreachable_chats()
+        for chat in chats:
+            until = chat.unreachable_until
+            if until.tzinfo is None:
+                until = config.TIMEZONE.localize(until)
+            self._unreachable[chat.telegram_id] = (until, chat.failures, chat.reason or "")
+        logger.info(f"Loaded {len(chats)} unreachable chats")
+
+    def start(self, bot: Bot):
+        """Load the marks and start the periodic re-check in the background."""
+        self._bot = bot
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the re-check loop and wait for pending writes."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _run(self):
+        await self.load()
+        while True:
+            await asyncio.sleep(self.recheck_interval)
+            now = datetime.now(tz=config.TIMEZONE)
+            expired = [chat_id for chat_id, (until, _, _) in self._unreachable.items() if until <= now]
+            for chat_id in expired:
+                try:
+                    await self.recheck(chat_id)
+                except Exception as e:
+                    logger.error(f"Failed to re-check chat {chat_id}: {e}", exc_info=True)
+            if expired:
+                logger.info(f"Re-checked {len(expired)} chats, {sum(map(self.is_reachable, expired))} reachable")
+
+    def _persist(self, write):
+        async def run():
+            try:
+                async with create_session() as session:
+                    await write(CRUD(session))
+            except Exception as e:
+                logger.error(f"Failed to save chat reachability: {e}", exc_info=True)
+        task = asyncio.create_task(run())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+
+reachability = ReachabilityStore()
@@ -0,0 +1,85 @@
+from datetime import date, datetime
+from typing import NamedTuple
+from database.models import AppointmentStatus, Role
+
+
+# Лёгкие результаты агрегирующих запросов CRUD: кортежи вместо ORM-объектов
+
+class StatusCount(NamedTuple):
+    status: AppointmentStatus
+    count: int
+
+
+class StatisticsSummary(NamedTuple):
+    total_clients: int
+    total_appointments: int
+    pending: int
+    approved: int
+    completed: int
+    cancelled: int
+
+
+class SpecialistStats(NamedTuple):
+    specialist_id: int
+    full_name: str
+    rank: str
+    completed: int
+    cancelled: int
+
+
+class DailyVolume(NamedTuple):
+    day: date
+    total: int
+    completed: int
+    cancelled: int
+
+
+class Page(NamedTuple):
+    items: list
+    has_more: bool  # есть ли ещё строки дальше в направлении листания
+
+
+class Identity(NamedTuple):
+    telegram_id: str
+    role: Role | None  # None — пользователь ещё не зарегистрирован
+    client_id: int | None
+    specialist_id: int | None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == Role.ADMIN
+
+
+# Заявка для отображения (списки, уведомления): выбирается по колонкам, без ORM-графа и identity map.
+# Имена полей совпадают с атрибутами моделей, поэтому код отображения принимает и то, и другое
+
+class UserRef(NamedTuple):
+    telegram_id: str
+
+
+class ClientCard(NamedTuple):
+    id: int
+    full_name: str
+    phone: str | None
+    user: UserRef
+
+
+class SpecialistCard(NamedTuple):
+    id: int
+    full_name: str
+    user_id: str
+    username: str | None
+
+
+class AppointmentCard(NamedTuple):
+    id: int
+    status: AppointmentStatus
+    proposed_date: datetime
+    scheduled_time: datetime | None
+    complex: str | None
+    reason: str
+    reject_reason: str | None
+    client_ready: bool | None
+    specialist_ready: bool | None
+    client: ClientCard
+    specialist: SpecialistCard | None
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Callable
+from aiogram import Bot
+from config import config
+from database.database import create_session
+from database.crud import CRUD
+from services.notifications import notify_reminder
+from services.contacts import contact_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_SLEEP_SECONDS = 300  # Upper bound on a single sleep so wall-clock jumps are picked up
+RETRY_DELAY = timedelta(minutes=1)  # Delay before a reminder that failed to send is tried again
+
+
+class ReminderScheduler:
+    """
+    In-process reminder scheduler backed by a min-heap of due times.
+
+    Every approved appointment has one heap entry (due_at, appointment_id, reminder_type)
+    per offset in config.REMINDER_OFFSETS. The run loop sleeps exactly until the earliest
+    entry is due or until a handler changes the schedule. Cancelled or rescheduled entries
+    are not removed from the heap; they are skipped when popped because `_due` no longer
+    points at them.
+    """
+
+    def __init__(self, clock: Callable[[], datetime] | None = None):
+        # clock: current time in config.TIMEZONE (tests pass a fake one)
+        self._clock = clock or (lambda: datetime.now(tz=config.TIMEZONE))
+        self._heap: list[tuple[datetime, int, str]] = []
+        self._due: dict[tuple[int, str], datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._bot: Bot | None = None
+
+    @staticmethod
+    def _localize(value: datetime) -> datetime:
+        # Naive values come from SQLite and are wall time in config.TIMEZONE, not host-local time
+        if value.tzinfo is None:
+            return config.TIMEZONE.localize(value)
+        return value.astimezone(config.TIMEZONE)
+
+    def schedule(self, appointment_id: int, scheduled_time: datetime):
+        """
+        Add or move the reminders for an appointment.
+        Args:
+            appointment_id (int): Appointment ID.
+            scheduled_time (datetime): Time the appointment starts.
+        """
+        scheduled_time = self._localize(scheduled_time)
+        for reminder_type, offset in config.REMINDER_OFFSETS.items():
+            entry = (scheduled_time - offset, appointment_id, reminder_type)
+            if self._due.get((appointment_id, reminder_type)) == entry[0]:
+                continue
+            self._due[(appointment_id, reminder_type)] = entry[0]
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] == entry:
+                self._wakeup.set()
+        self._compact()
+        logger.debug(f"Scheduled reminders for appointment {appointment_id} at {scheduled_time}")
+
+    def cancel(self, appointment_id: int):
+        """
+        Drop the pending reminders for an appointment, if any.
+        Args:
+            appointment_id (int): Appointment ID.
+        """
+        removed = [self._due.pop((appointment_id, reminder_type), None) for reminder_type in config.REMINDER_OFFSETS]
+        if any(due_at is not None for due_at in removed):
+            self._compact()
+            logger.debug(f"Cancelled reminders for appointment {appointment_id}")
+
+    def _compact(self):
+        """Rebuild the heap once stale entries outnumber live ones."""
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due_at, app_id, reminder_type) for (app_id, reminder_type), due_at in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: datetime) -> dict[int, list[str]]:
+        """Pop every live entry that is due at `now` and return its reminder types by appointment ID."""
+        popped: dict[int, list[str]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            due_at, appointment_id, reminder_type = heapq.heappop(self._heap)
+            if self._due.get((appointment_id, reminder_type)) == due_at:
+                del self._due[(appointment_id, reminder_type)]
+                popped.setdefault(appointment_id, []).append(reminder_type)
+        return popped
+
+    def _retry(self, appointment_id: int, reminder_types: list[str]):
+        """Push popped entries back onto the heap after RETRY_DELAY unless a handler rescheduled them meanwhile."""
+        due_at = self._clock() + RETRY_DELAY
+        for reminder_type in reminder_types:
+            if (appointment_id, reminder_type) in self._due:
+                continue
+            self._due[(appointment_id, reminder_type)] = due_at
+            heapq.heappush(self._heap, (due_at, appointment_id, reminder_type))
+
+    def _seconds_until_next(self, now: datetime) -> float:
+        while self._heap and self._due.get(self._heap[0][1:]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        return min(max((self._heap[0][0] - now).total_seconds(), 0), MAX_SLEEP_SECONDS)
+
+    async def rebuild(self):
+        """Reload every upcoming reminder from the database (used on startup)."""
+        now = self._clock()
+        async with create_session() as session:
+            crud = CRUD(session)
+            upcoming = await crud.get_upcoming_reminders(now)
+        self._heap = []
+        self._due = {}
+        for appointment_id, scheduled_time in upcoming:
+            scheduled_time = self._localize(scheduled_time)
+            for reminder_type, offset in config.REMINDER_OFFSETS.items():
+                self._due[(appointment_id, reminder_type)] = scheduled_time - offset
+                self._heap.append((scheduled_time - offset, appointment_id, reminder_type))
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        logger.info(f"Reminder scheduler rebuilt with {len(upcoming)} upcoming appointments")
+
+    def start(self, bot: Bot):
+        """Start the scheduler loop in the background."""
+        self._bot = bot
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the scheduler loop."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        await self.rebuild()
+        while True:
+            timeout = self._seconds_until_next(self._clock())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            popped = self._pop_due(self._clock())
+            if not popped:
+                continue
+            try:
+                await self._dispatch(popped)
+            except Exception as e:
+                logger.error(f"Error in reminder scheduler: {e}", exc_info=True)
+                for appointment_id, reminder_types in popped.items():
+                    self._retry(appointment_id, reminder_types)
+
+    async def _dispatch(self, popped: dict[int, list[str]]):
+        """
+        Send reminders for appointments whose due time has come.
+
+        Due (appointment, reminder_type) pairs that were not sent yet come from a single
+        anti-join query. If several offsets are due at once (e.g. the appointment was approved
+        an hour before it starts) only the closest one is sent and the rest are marked as sent.
+        Each appointment is recorded as sent right after its own send; if sending fails, its
+        entries go back onto the heap and are retried after RETRY_DELAY.
+        """
+        now = self._clock()
+        async with create_session() as session:
+            crud = CRUD(session)
+            due = await crud.get_due_reminders(now, list(popped))
+            if not due:
+                return
+            closest: dict[int, str] = {}
+            for appointment_id, reminder_type in due:
+                current = closest.get(appointment_id)
+                if current is None or config.REMINDER_OFFSETS[reminder_type] < config.REMINDER_OFFSETS[current]:
+                    closest[appointment_id] = reminder_type
+            appointments = await crud.get_appointment_cards_by_ids(list(closest))
+            # Не держим соединение пула, пока идут запросы к Telegram
+            await session.commit()
+            await contact_cache.preload([appointment.client.user.telegram_id for appointment in appointments])
+            for appointment in appointments:
+                try:
+                    await notify_reminder(self._bot, appointment, closest[appointment.id])
+                    await crud.mark_reminders_sent([pair for pair in due if pair[0] == appointment.id])
+                except Exception as e:
+                    logger.error(f"Failed to dispatch reminder for appointment {appointment.id}: {e}", exc_info=True)
+                    await session.rollback()
+                    self._retry(appointment.id, popped[appointment.id])
+                    continue
+                logger.info(f"Reminder {closest[appointment.id]} dispatched for appointment {appointment.id}")
+
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,116 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+from config import config
+from database.models import AppointmentStatus
+from database.crud import CRUD
+
+logger = logging.getLogger(__name__)
+
+
+class Slot(NamedTuple):
+    start: datetime  # время начала в config.TIMEZONE
+    appointment_id: int | None  # заявка, занимающая слот; None — слот свободен
+
+    @property
+    def is_free(self) -> bool:
+        return self.appointment_id is None
+
+
+class SlotEngine:
+    """
+    Free and occupied appointment slots of a specialist for one day.
+
+    The working day from config.WORK_HOURS is cut into a grid of `slot_length` steps. One
+    date-bounded query returns the specialist's approved appointments; each marks the grid
+    cells it overlaps, widened by `buffer` on both sides, in an occupancy array. Slots that
+    do not fit before the end of the day or overlap lunch are not offered. Building the day
+    is O(slots + appointments) with no string formatting.
+    """
+
+    def __init__(self, work_hours: dict | None = None, slot_length: timedelta | None = None,
+                 buffer: timedelta | None = None):
+        self.work_hours = work_hours or config.WORK_HOURS
+        self.slot_length = slot_length or config.SLOT_LENGTH
+        self.buffer = config.SLOT_BUFFER if buffer is None else buffer
+
+    def _bounds(self, day: date) -> tuple[datetime, datetime, datetime, datetime]:
+        def at(hour: int) -> datetime:
+            return datetime.combine(day, time()) + timedelta(hours=hour)
+        hours = self.work_hours
+        return at(hours["start"]), at(hours["end"]), at(hours["lunch_start"]), at(hours["lunch_end"])
+
+    @staticmethod
+    def _wall_time(value: datetime) -> datetime:
+        # Время заявок хранится без зоны (SQLite) в config.TIMEZONE; сравниваем «настенное» время
+        if value.tzinfo is not None:
+            value = value.astimezone(config.TIMEZONE)
+        return value.replace(tzinfo=None)
+
+    def build(self, day: date, busy: list[tuple[int, datetime]]) -> list[Slot]:
+        """
+        Раскладывает занятое время по слотам дня.
+        Args:
+            day: День.
+            busy: Пары (id заявки, время начала), например из CRUD.get_busy_times.
+        Returns:
+            Слоты дня по порядку, свободные и занятые.
+        """
+        day_start, day_end, lunch_start, lunch_end = self._bounds(day)
+        length = self.slot_length
+        cells = (day_end - day_start) // length
+        occupied: list[int | None] = [None] * cells
+        for appointment_id, scheduled_time in busy:
+            offset = self._wall_time(scheduled_time) - day_start
+            first = max((offset - self.buffer) // length, 0)
+            last = min(-((-(offset + length + self.buffer)) // length), cells)
+            for index in range(first, last):
+                if occupied[index] is None:
+                    occupied[index] = appointment_id
+        slots = []
+        for index in range(cells):
+            start = day_start + index * length
+            end = start + length
+            if start < lunch_end and end > lunch_start:
+                continue
+            slots.append(Slot(config.TIMEZONE.localize(start), occupied[index]))
+        return slots
+
+    async def get_day_slots(self, crud: CRUD, specialist_id: int, day: date) -> list[Slot]:
+        """
+        Build the slots of a specialist's day from a single indexed query.
+        Args:
+            crud (CRUD): CRUD bound to the current session.
+            specialist_id (int): Specialist ID.
+            day (date): The day to build.
+        """
+        day_start, day_end, _, _ = self._bounds(day)
+        # Захватываем заявки, начавшиеся раньше и перекрывающие начало дня вместе с буфером
+        margin = self.slot_length + self.buffer
+        busy = await crud.get_busy_times(
+            specialist_id,
+            config.TIMEZONE.localize(day_start - margin),
+            config.TIMEZONE.localize(day_end + self.buffer)
+        )
+        return self.build(day, busy)
+
+    async def reserve(self, crud: CRUD, appointment_id: int, specialist_id: int, start: datetime,
+                      from_status: AppointmentStatus = AppointmentStatus.PENDING) -> bool:
+        """
+        Claim a slot for an appointment; the check for a free slot runs inside the database.
+        Args:
+            crud (CRUD): CRUD bound to the current session.
+            appointment_id (int): Appointment to approve.
+            specialist_id (int): Specialist whose time is claimed.
+            start (datetime): Slot start.
+            from_status (AppointmentStatus): Status the appointment must still have.
+        Returns:
+            bool: False if the slot overlaps another approved appointment (including the
+            buffer) or the appointment has already left `from_status`.
+        """
+        return await crud.reserve_slot(
+            appointment_id, specialist_id, start, self.slot_length + self.buffer, from_status
+        )
+
+
+slot_engine = SlotEngine()
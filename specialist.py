@@ -1,5 +1,8 @@
 from aiogram import Router, F
 from aiogram.filters import Command
+from services.scheduler import reminder_scheduler
+from services.outbound import outbound, Priority
+from database.crud import AppointmentTransitionError
 f
     crud = CRUD(session)
     now = datetime.now(tz=config.TIMEZONE)
@@ -35,7 +38,13 @@ async def close_appointment(message: Message, state: FSMContext, session: AsyncS
         await message.answer("Нет активной заявки для закрытия.")
         return
     appointment = await crud.get_appointment(appointment_id)
-    if not appointment or appointment.status != AppointmentStatus.APPROVED:
+    if not appointment:
+        await message.answer("Заявка не найдена или уже обработана.")
+        await state.clear()
+        return
+    try:
+        await crud.transition_appointment(appointment.id, "complete", version=appointment.version)
+    except AppointmentTransitionError:
         await message.answer("Заявка не найдена или уже обработана.")
         await state.clear()
         return
@@ -69,8 +78,15 @@ async def cancel_appointment(message: Message, state: FSMContext, session: Async
         client_message = escape_markdown_v2(
             f"Специалист отменил заявку #{appointment.id}. Свяжитесь с администратором."
         )
-        await bot.send_message(config.ADMIN_ID, admin_message, parse_mode="MarkdownV2")
-        await bot.send_message(appointment.client.user.telegram_id, client_message, parse_mode="MarkdownV2")
+        try:
+            await CRUD(session).transition_appointment(appointment.id, "specialist_cancel", version=appointment.version)
+        except AppointmentTransitionError:
+            await message.answer("Заявка уже обработана.")
+            await state.clear()
+            return
+        reminder_scheduler.cancel(appointment.id)
+        await outbound.send_message(config.ADMIN_ID, admin_message, parse_mode="MarkdownV2", priority=Priority.ADMIN_ALERT)
+        await outbound.send_message(appointment.client.user.telegram_id, client_message, parse_mode="MarkdownV2")
         has_appointments, new_appointment_id = await has_active_appointment(session, specialist.id)
         keyboard = get_specialist_keyboard(has_appointments=has_appointments)
         await message.answer(
@@ -108,6 +124,12 @@ async def cancel_appointment(message: Message, state: FSMContext, session: Async
             await message.answer("Действия:", reply_markup=pagination_keyboard)
         await state.update_data(schedule_page=page, total_pages=total_pages, appointments=[app.id for app in appointments])
         logger.info(f"S
+    try:
+        await CRUD(session).transition_appointment(appointment.id, "specialist_ready", version=appointment.version)
+    except AppointmentTransitionError:
+        await callback.message.edit_text("Заявка не найдена, не подтверждена или вы уже подтвердили готовность.")
+        await callback.answer()
+        return
     await session.commit()
     scheduled_time = format_appointment_date(appointment.scheduled_time.astimezone(config.TIMEZONE))
     client_message = escape_markdown_v2(
@@ -117,7 +139,7 @@ async def cancel_appointment(message: Message, state: FSMContext, session: Async
         f"Вы подтвердили готовность по заявке #{appointment.id} (время: {scheduled_time})."
     )
     try:
-        await bot.send_message(
+        await outbound.send_message(
             appointment.client.user.telegram_id,
             client_messagодтверждена.",
             parse_mode="MarkdownV2"
@@ -180,15 +202,9 @@ async def show_reports(message: Message, session: AsyncSession):
         start_date = now - timedelta(days=90)
         period_label = "за последние 3 месяца"
     try:
-        appointments = await crud.get_appointments_by_specialist(specialist.id)
-        completed_count = 0
-        canceled_count = 0
-        for app in appointments:
-            if app.scheduled_time and start_date <= app.scheduled_time.astimezone(config.TIMEZONE) <= now:
-                if app.status == AppointmentStatus.COMPLETED:
-                    completed_count += 1
-                elif app.status == AppointmentStatus.CANCELLED:
-                    canceled_count += 1
+        counts = await crud.get_specialist_period_counts(specialist.id, start_date.date(), now.date())
+        completed_count = counts.get(AppointmentStatus.COMPLETED, 0)
+        canceled_count = counts.get(AppointmentStatus.CANCELLED, 0)
         response = escape_markdown_v2
     """Start the process of changing the specialist's availability status."""
     telegram_id = message.from_user.id
@@ -0,0 +1,62 @@
+from datetime import datetime
+from sqlalchemy import select, union_all, literal, exists, bindparam, String, DateTime
+from sqlalchemy.orm import joinedload
+from config import config
+from database.models import Appointment, AppointmentStatus, Specialist, NotificationSent
+
+# Готовые запросы горячих методов CRUD. Значения передаются параметрами при выполнении, поэтому
+# конструкция не собирается заново на каждый вызов, а ключ кэша компиляции вычисляется один раз
+
+SPECIALIST_BY_TELEGRAM_ID = (
+    select(Specialist)
+    .where(Specialist.user_id == bindparam("telegram_id"))
+    .options(joinedload(Specialist.user))
+)
+
+APPOINTMENTS_BY_SPECIALIST = (
+    select(Appointment)
+    .where(Appointment.specialist_id == bindparam("specialist_id"))
+    .options(joinedload(Appointment.client))
+)
+
+UPCOMING_REMINDERS = (
+    select(Appointment.id, Appointment.scheduled_time)
+    .where(
+        Appointment.status == AppointmentStatus.APPROVED,
+        Appointment.scheduled_time >= bindparam("since")
+    )
+)
+
+# Одобренные заявки × config.REMINDER_OFFSETS без записи в NotificationSent; срок каждого типа — параметр
+_reminder_offsets = union_all(*[
+    select(
+        literal(reminder_type, String).label("reminder_type"),
+        bindparam(f"due_before_{reminder_type}", type_=DateTime).label("due_before")
+    )
+    for reminder_type in config.REMINDER_OFFSETS
+]).cte("reminder_offsets")
+
+DUE_REMINDERS = (
+    select(Appointment.id, _reminder_offsets.c.reminder_type)
+    .join(_reminder_offsets, Appointment.scheduled_time <= _reminder_offsets.c.due_before)
+    .where(
+        Appointment.status == AppointmentStatus.APPROVED,
+        Appointment.scheduled_time > bindparam("now", type_=DateTime),
+        ~exists().where(
+            NotificationSent.appointment_id == Appointment.id,
+            NotificationSent.reminder_type == _reminder_offsets.c.reminder_type
+        )
+    )
+)
+
+DUE_REMINDERS_FOR_APPOINTMENTS = DUE_REMINDERS.where(
+    Appointment.id.in_(bindparam("appointment_ids", expanding=True))
+)
+
+
+def due_reminder_params(now: datetime) -> dict:
+    """Параметры DUE_REMINDERS на момент now."""
+    params = {"now": now}
+    for reminder_type, offset in config.REMINDER_OFFSETS.items():
+        params[f"due_before_{reminder_type}"] = now + offset
+    return params
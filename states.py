@@ -36,6 +36,7 @@ class AdminStates(StatesGroup):
     adding_to_blacklist = State()
     adding_to_blacklist_details = State()
     export_data = State()
+    export_range = State()
     select_specialist = State()
     select_time = State()
     reject_reason = State()
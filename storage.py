@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import time
+import zlib
+from datetime import date, datetime
+from typing import Any, Mapping
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from config import config
+from database.database import create_session
+from database.crud import CRUD
+
+logger = logging.getLogger(__name__)
+
+_RAW = b"j"  # JSON как есть
+_ZLIB = b"z"  # JSON, сжатый zlib
+COMPRESS_THRESHOLD = 256
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__d__": value.isoformat()}
+    raise TypeError(f"FSM data value of type {type(value).__name__} is not serializable")
+
+
+def _object_hook(value: dict):
+    if len(value) == 1:
+        if "__dt__" in value:
+            return datetime.fromisoformat(value["__dt__"])
+        if "__d__" in value:
+            return date.fromisoformat(value["__d__"])
+    return value
+
+
+def dump_data(data: Mapping[str, Any]) -> bytes | None:
+    """
+    Сериализует данные FSM: компактный JSON, сжатый zlib, если он длиннее порога.
+    Args:
+        data: Данные FSM.
+    Returns:
+        Байты с префиксом формата или None для пустых данных.
+    """
+    if not data:
+        return None
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+    if len(raw) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(raw)
+        if len(compressed) < len(raw):
+            return _ZLIB + compressed
+    return _RAW + raw
+
+
+def load_data(blob: bytes | None) -> dict[str, Any]:
+    """
+    Восстанавливает данные FSM, сохранённые dump_data.
+    Args:
+        blob: Байты из dump_data или None.
+    Returns:
+        Словарь данных.
+    """
+    if not blob:
+        return {}
+    payload = blob[1:]
+    if blob[:1] == _ZLIB:
+        payload = zlib.decompress(payload)
+    return json.loads(payload, object_hook=_object_hook)
+
+
+class _Entry:
+    __slots__ = ("state", "data", "dirty", "touched")
+
+    def __init__(self, state: str | None, data: bytes | None, dirty: bool = False):
+        self.state = state
+        self.data = data
+        self.dirty = dirty
+        self.touched = time.monotonic()
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    aiogram FSM storage kept in the bot's database (`fsm_states` table).
+
+    Active keys live in memory as serialized bytes, so reads are served without a query and
+    every get_data returns a fresh copy. Writes only mark the key dirty; a background task
+    flushes all dirty keys in one transaction every `flush_interval` seconds and on close().
+    Keys idle for `memory_ttl` are dropped from memory (they stay in the table), and rows
+    untouched for config.FSM_STATE_TTL are deleted, so abandoned flows do not accumulate.
+    Serialized data larger than config.FSM_MAX_DATA_SIZE is rejected with ValueError.
+    """
+
+    def __init__(self, flush_interval: float = 2, memory_ttl: float = 900, gc_interval: float = 3600):
+        self.flush_interval = flush_interval
+        self.memory_ttl = memory_ttl
+        self.gc_interval = gc_interval
+        self._entries: dict[str, _Entry] = {}
+        self._loading: dict[str, asyncio.Future] = {}
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) if part is not None else "" for part in (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id,
+            getattr(key, "business_connection_id", None),
+            key.destiny,
+        ))
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        storage_key = self._key(key)
+        entry = self._entries.get(storage_key)
+        if entry is None:
+            loading = self._loading.get(storage_key)
+            if loading is None:
+                loading = self._loading[storage_key] = asyncio.ensure_future(self._load(storage_key))
+            try:
+                entry = await asyncio.shield(loading)
+            finally:
+                self._loading.pop(storage_key, None)
+        entry.touched = time.monotonic()
+        return entry
+
+    async def _load(self, storage_key: str) -> _Entry:
+        async with create_session() as session:
+            record = await CRUD(session).get_fsm_record(storage_key)
+        entry = self._entries.get(storage_key)
+        if entry is None:
+            entry = _Entry(record.state, record.data) if record else _Entry(None, None)
+            self._entries[storage_key] = entry
+        return entry
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        entry.dirty = True
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        blob = dump_data(data)
+        if blob and len(blob) > config.FSM_MAX_DATA_SIZE:
+            raise ValueError(f"FSM data for {self._key(key)} is {len(blob)} bytes, limit is {config.FSM_MAX_DATA_SIZE}")
+        entry = await self._entry(key)
+        entry.data = blob
+        entry.dirty = True
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return load_data((await self._entry(key)).data)
+
+    async def flush(self):
+        """Write every dirty key to the database in one transaction."""
+        dirty = {storage_key: entry for storage_key, entry in self._entries.items() if entry.dirty}
+        if not dirty:
+            return
+        for entry in dirty.values():
+            entry.dirty = False
+        now = datetime.now(tz=config.TIMEZONE)
+        records = [
+            {"key": storage_key, "state": entry.state, "data": entry.data, "updated_at": now}
+            for storage_key, entry in dirty.items() if entry.state is not None or entry.data is not None
+        ]
+        deleted_keys = [storage_key for storage_key, entry in dirty.items() if entry.state is None and entry.data is None]
+        try:
+            async with create_session() as session:
+                await CRUD(session).save_fsm_records(records, deleted_keys)
+        except Exception as e:
+            logger.error(f"Failed to save FSM states: {e}", exc_info=True)
+            for entry in dirty.values():
+                entry.dirty = True
+
+    def _evict(self):
+        """Drop clean keys that have been idle longer than memory_ttl."""
+        deadline = time.monotonic() - self.memory_ttl
+        idle = [storage_key for storage_key, entry in self._entries.items() if not entry.dirty and entry.touched < deadline]
+        for storage_key in idle:
+            del self._entries[storage_key]
+
+    async def collect_garbage(self):
+        """Delete rows of flows abandoned for longer than config.FSM_STATE_TTL."""
+        async with create_session() as session:
+            await CRUD(session).delete_expired_fsm_records(datetime.now(tz=config.TIMEZONE) - config.FSM_STATE_TTL)
+
+    def start(self):
+        """Start the write-behind and garbage collection loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        last_gc = 0.0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            self._evict()
+            if time.monotonic() - last_gc >= self.gc_interval:
+                last_gc = time.monotonic()
+                try:
+                    await self.collect_garbage()
+                except Exception as e:
+                    logger.error(f"FSM garbage collection failed: {e}", exc_info=True)
+
+
+fsm_storage = DatabaseStorage()
@@ -0,0 +1,87 @@
+from string import Formatter
+from typing import Any, Callable
+
+# Символы, которые Telegram MarkdownV2 требует экранировать вне сущностей
+_MARKDOWN_V2 = str.maketrans({char: f"\\{char}" for char in "\\_*[]()~`>#+-=|{}.!"})
+# Внутри (...) ссылки экранируются только ')' и '\'
+_MARKDOWN_V2_URL = str.maketrans({"\\": "\\\\", ")": "\\)"})
+
+
+def escape_markdown_v2(text: Any) -> str:
+    """
+    Экранирует текст для Telegram MarkdownV2 за один проход str.translate.
+    Args:
+        text: Любое значение; None даёт пустую строку.
+    Returns:
+        Экранированная строка.
+    """
+    if text is None:
+        return ""
+    return str(text).translate(_MARKDOWN_V2)
+
+
+def _url(value: Any) -> str:
+    return str(value).translate(_MARKDOWN_V2_URL)
+
+
+def _link(value: tuple[Any, Any]) -> str:
+    label, url = value
+    return f"[{escape_markdown_v2(label)}]({_url(url)})"
+
+
+# Типы слотов: {name} — текст, {name:url} — адрес внутри ссылки, {name:link} — пара (подпись, адрес),
+# {name:raw} — готовый фрагмент MarkdownV2 (например, результат другого шаблона)
+SLOT_TYPES: dict[str, Callable[[Any], str]] = {
+    "text": escape_markdown_v2,
+    "url": _url,
+    "link": _link,
+    "raw": str,
+}
+
+
+class Template:
+    """
+    Шаблон сообщения Telegram MarkdownV2, компилируемый один раз.
+
+    Исходник в синтаксисе str.format: статический текст экранируется при компиляции, каждый слот
+    `{name:type}` выводится функцией из SLOT_TYPES, так что рендер — один join по готовым частям.
+    Неизвестный тип слота даёт ValueError при компиляции, отсутствующее значение — KeyError.
+    """
+
+    __slots__ = ("source", "slots", "_parts")
+
+    def __init__(self, source: str):
+        self.source = source
+        parts: list[str | tuple[str, Callable[[Any], str]]] = []
+        slots = []
+        for literal, name, slot_type, conversion in Formatter().parse(source):
+            if literal:
+                escaped = escape_markdown_v2(literal)
+                if parts and isinstance(parts[-1], str):
+                    parts[-1] += escaped
+                else:
+                    parts.append(escaped)
+            if name is None:
+                continue
+            if not name or conversion or (slot_type or "text") not in SLOT_TYPES:
+                raise ValueError(f"Invalid slot {{{name}:{slot_type}}} in template {source!r}")
+            parts.append((name, SLOT_TYPES[slot_type or "text"]))
+            slots.append(name)
+        self.slots = tuple(slots)
+        self._parts = tuple(parts)
+
+    def render(self, **values: Any) -> str:
+        """
+        Подставляет значения в слоты.
+        Args:
+            values: Значение для каждого слота шаблона.
+        Returns:
+            Готовый текст MarkdownV2.
+        """
+        return "".join(
+            part if isinstance(part, str) else part[1](values[part[0]])
+            for part in self._parts
+        )
+
+    def __repr__(self) -> str:
+        return f"Template({self.source!r})"
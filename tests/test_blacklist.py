@@ -0,0 +1,130 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from config import config
+from database.database import Base
+from database.models import Blacklist
+from services import blacklist as blacklist_module
+from services.blacklist import BlacklistIndex
+
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(config.TIMEZONE.localize(datetime(2026, 3, 2, 9, 0)))
+
+
+@pytest.fixture
+def index(clock):
+    return BlacklistIndex(clock=clock)
+
+
+def test_ban_expires_at_blocked_until(index, clock):
+    index.block("1", clock.now + timedelta(hours=1))
+    assert index.is_blocked(1)
+    clock.now += timedelta(minutes=59)
+    assert index.is_blocked("1")
+    clock.now += timedelta(minutes=1)
+    assert not index.is_blocked("1")
+    assert index._heap == []
+
+
+def test_extended_ban_outlives_its_old_heap_entry(index, clock):
+    index.block("1", clock.now + timedelta(hours=1))
+    index.block("1", clock.now + timedelta(hours=3))
+    clock.now += timedelta(hours=2)
+    assert index.is_blocked("1")
+    clock.now += timedelta(hours=1)
+    assert not index.is_blocked("1")
+
+
+def test_unblock_removes_ban_before_expiry(index, clock):
+    index.block("1", clock.now + timedelta(hours=1))
+    index.block("2", clock.now + timedelta(hours=1))
+    index.unblock("1")
+    assert not index.is_blocked("1")
+    assert index.is_blocked("2")
+
+
+def test_naive_blocked_until_is_wall_time_in_config_timezone(index):
+    index.block("1", datetime(2026, 3, 4, 12, 0))
+    assert index._blocked["1"] == config.TIMEZONE.localize(datetime(2026, 3, 4, 12, 0))
+
+
+def _patch_load(monkeypatch, entries: list, during_query=None):
+    async def get_active_blacklist(now):
+        if during_query:
+            during_query()
+        return entries
+
+    @asynccontextmanager
+    async def create_session():
+        yield None
+
+    monkeypatch.setattr(blacklist_module, "create_session", create_session)
+    monkeypatch.setattr(blacklist_module, "CRUD", lambda _: SimpleNamespace(get_active_blacklist=get_active_blacklist))
+
+
+def test_load_reconciles_only_differences(index, clock, monkeypatch):
+    kept = clock.now + timedelta(days=1)
+    index.block("1", kept)
+    index.block("2", clock.now + timedelta(days=1))
+    _patch_load(monkeypatch, [("1", kept), ("3", clock.now + timedelta(days=2))])
+    asyncio.run(index.load())
+    assert index._blocked == {"1": kept, "3": clock.now + timedelta(days=2)}
+    assert len(index._heap) == 3  # "1" is not pushed again; "2" is dropped lazily
+
+
+def test_load_keeps_bans_committed_during_the_query(index, clock, monkeypatch):
+    until = clock.now + timedelta(days=1)
+    _patch_load(monkeypatch, [], during_query=lambda: index.block("1", until))
+    asyncio.run(index.load())
+    assert index.is_blocked("1")
+
+
+@pytest.fixture
+def session(monkeypatch, clock):
+    monkeypatch.setattr(blacklist_module, "blacklist_index", BlacklistIndex(clock=clock))
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Blacklist.__table__])
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_committed_ban_reaches_the_index(session, clock):
+    session.add(Blacklist(telegram_id="1", reason="spam", blocked_until=clock.now + timedelta(days=1)))
+    session.flush()
+    assert not blacklist_module.blacklist_index.is_blocked("1")
+    session.commit()
+    assert blacklist_module.blacklist_index.is_blocked("1")
+
+
+def test_unblock_happens_after_the_delete_commits(session, clock):
+    entry = Blacklist(telegram_id="1", reason="spam", blocked_until=clock.now + timedelta(days=1))
+    session.add(entry)
+    session.commit()
+    session.delete(entry)
+    session.flush()
+    assert blacklist_module.blacklist_index.is_blocked("1")
+    session.commit()
+    assert not blacklist_module.blacklist_index.is_blocked("1")
+
+
+def test_rolled_back_ban_is_ignored(session, clock):
+    session.add(Blacklist(telegram_id="1", reason="spam", blocked_until=clock.now + timedelta(days=1)))
+    session.flush()
+    session.rollback()
+    session.commit()
+    assert not blacklist_module.blacklist_index.is_blocked("1")
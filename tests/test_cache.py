@@ -0,0 +1,81 @@
+import pytest
+from utils import cache as cache_module
+from utils.cache import TTLCache
+
+
+class FakeMonotonic:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeMonotonic()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    clock.now += 9.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=1)
+    clock.now += 30
+    assert "a" in cache
+    assert "b" not in cache
+
+
+def test_overflow_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_set_refreshes_an_existing_key(clock):
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    clock.now += 5
+    cache.set("a", 3)
+    cache.set("c", 4)
+    clock.now += 6
+    assert cache.get("a") == 3
+    assert "b" not in cache
+
+
+def test_hits_and_misses_are_counted(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    clock.now += 10
+    cache.get("a")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_pop_and_clear(clock):
+    cache = TTLCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "gone") == "gone"
+    cache.clear()
+    assert len(cache) == 0
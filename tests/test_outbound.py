@@ -0,0 +1,52 @@
+import pytest
+from services import outbound
+from services.outbound import TokenBucket
+
+
+class FakeMonotonic:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeMonotonic()
+    monkeypatch.setattr(outbound.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+
+def test_wait_shrinks_as_tokens_refill(clock):
+    bucket = TokenBucket(rate=2, capacity=1)
+    assert bucket.try_acquire() == 0.0
+    clock.now += 0.2
+    assert bucket.try_acquire() == pytest.approx(0.3)
+    clock.now += 0.3
+    assert bucket.try_acquire() == 0.0
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.try_acquire()
+    bucket.try_acquire()
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, pytest.approx(0.1)]
+
+
+def test_idle_only_when_full(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    assert bucket.is_idle()
+    bucket.try_acquire()
+    assert not bucket.is_idle()
+    clock.now += 0.5
+    assert not bucket.is_idle()
+    clock.now += 0.5
+    assert bucket.is_idle()
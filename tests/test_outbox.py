@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from config import config
+from services import outbox as outbox_module
+from services.outbox import OutboxWorker, CLIENT_APPROVED
+
+
+class FakeCRUD:
+    def __init__(self):
+        self.failed = []
+
+    async def mark_outbox_failed(self, message_id, error, next_attempt_at, dead=False):
+        self.failed.append((message_id, error, next_attempt_at, dead))
+
+
+@pytest.fixture
+def worker():
+    return OutboxWorker(max_attempts=3, base_delay=5, max_delay=60)
+
+
+@pytest.fixture
+def alerts(monkeypatch):
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(outbox_module, "outbound", SimpleNamespace(send_message=send_message))
+    return sent
+
+
+def _message(attempts: int = 0, kind: str = CLIENT_APPROVED):
+    return SimpleNamespace(id=7, appointment_id=3, kind=kind, payload=None, attempts=attempts)
+
+
+def test_backoff_doubles_up_to_max_delay(worker):
+    assert [worker._backoff(attempts).total_seconds() for attempts in range(1, 6)] == [5, 10, 20, 40, 60]
+
+
+def test_transient_error_is_retried_with_backoff(worker, alerts):
+    crud = FakeCRUD()
+    before = datetime.now(tz=config.TIMEZONE)
+    asyncio.run(worker._fail(crud, _message(attempts=1), None, ConnectionError("timeout")))
+    [(message_id, error, next_attempt_at, dead)] = crud.failed
+    assert (message_id, error, dead) == (7, "timeout", False)
+    assert next_attempt_at - before >= timedelta(seconds=10)
+    assert next_attempt_at.tzinfo is not None
+    assert alerts == []
+
+
+def test_last_attempt_moves_row_to_dead(worker, alerts):
+    crud = FakeCRUD()
+    asyncio.run(worker._fail(crud, _message(attempts=2), None, ConnectionError("timeout")))
+    assert crud.failed[0][3] is True
+    assert [chat_id for chat_id, _ in alerts] == [config.ADMIN_ID]
+
+
+@pytest.mark.parametrize("error", [
+    LookupError("appointment 3 not found"),
+    TelegramForbiddenError(method=None, message="bot was blocked by the user"),
+])
+def test_permanent_error_is_dead_on_first_attempt(worker, alerts, error):
+    crud = FakeCRUD()
+    asyncio.run(worker._fail(crud, _message(), None, error))
+    assert crud.failed[0][3] is True
+    assert len(alerts) == 1
+
+
+def test_deliver_rejects_missing_appointment_and_unknown_kind(worker):
+    with pytest.raises(LookupError):
+        asyncio.run(worker._deliver(_message(), None))
+    with pytest.raises(LookupError):
+        asyncio.run(worker._deliver(_message(kind="unknown"), SimpleNamespace(id=3)))
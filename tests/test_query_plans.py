@@ -0,0 +1,19 @@
+import asyncio
+from datetime import datetime
+from config import config
+from database.crud import CRUD
+from database.migrations import ALLOWED_SCANS, _hot_calls, find_full_scans
+
+
+def test_hot_queries_do_not_scan_tables():
+    assert asyncio.run(find_full_scans()) == []
+
+
+def test_allowed_scans_name_hot_queries():
+    hot = {name for name, _ in _hot_calls(datetime.now(tz=config.TIMEZONE))}
+    assert {name for name, _ in ALLOWED_SCANS} <= hot
+
+
+def test_hot_calls_exist_on_crud():
+    for name, _ in _hot_calls(datetime.now(tz=config.TIMEZONE)):
+        assert callable(getattr(CRUD, name, None)), name
@@ -0,0 +1,148 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from config import config
+from services import scheduler as scheduler_module
+from services.scheduler import ReminderScheduler, MAX_SLEEP_SECONDS, RETRY_DELAY
+
+OFFSETS = {"24h": timedelta(hours=24), "1h": timedelta(hours=1)}
+
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(config.TIMEZONE.localize(datetime(2026, 3, 2, 9, 0)))
+
+
+@pytest.fixture
+def scheduler(clock, monkeypatch):
+    monkeypatch.setattr(config, "REMINDER_OFFSETS", OFFSETS)
+    return ReminderScheduler(clock=clock)
+
+
+def test_schedule_adds_one_entry_per_offset(scheduler, clock):
+    start = clock.now + timedelta(days=2)
+    scheduler.schedule(1, start)
+    assert scheduler._due == {(1, "24h"): start - OFFSETS["24h"], (1, "1h"): start - OFFSETS["1h"]}
+    assert scheduler._seconds_until_next(clock.now) == MAX_SLEEP_SECONDS
+
+
+def test_pop_due_returns_entries_as_they_come_due(scheduler, clock):
+    scheduler.schedule(1, clock.now + timedelta(hours=2))
+    assert scheduler._pop_due(clock.now) == {1: ["24h"]}
+    assert scheduler._seconds_until_next(clock.now) == min(3600, MAX_SLEEP_SECONDS)
+    assert scheduler._pop_due(clock.now + timedelta(minutes=59)) == {}
+    assert scheduler._pop_due(clock.now + timedelta(hours=1)) == {1: ["1h"]}
+    assert scheduler._due == {}
+
+
+def test_reschedule_replaces_pending_entries(scheduler, clock):
+    scheduler.schedule(1, clock.now + timedelta(hours=30))
+    scheduler.schedule(1, clock.now + timedelta(hours=33))
+    assert scheduler._pop_due(clock.now + timedelta(hours=7)) == {}
+    assert scheduler._pop_due(clock.now + timedelta(hours=9)) == {1: ["24h"]}
+
+
+def test_cancel_drops_pending_entries(scheduler, clock):
+    scheduler.schedule(1, clock.now + timedelta(hours=30))
+    scheduler.schedule(2, clock.now + timedelta(hours=30))
+    scheduler.cancel(1)
+    assert scheduler._pop_due(clock.now + timedelta(days=2)) == {2: ["24h", "1h"]}
+    assert scheduler._seconds_until_next(clock.now) == MAX_SLEEP_SECONDS
+
+
+def test_naive_times_are_wall_time_in_config_timezone(scheduler):
+    scheduler.schedule(1, datetime(2026, 3, 4, 12, 0))
+    due_at = scheduler._due[(1, "1h")]
+    assert due_at == config.TIMEZONE.localize(datetime(2026, 3, 4, 11, 0))
+    assert due_at.utcoffset() == config.TIMEZONE.localize(datetime(2026, 3, 4)).utcoffset()
+
+
+def test_retry_pushes_entries_back_after_delay(scheduler, clock):
+    scheduler.schedule(1, clock.now + timedelta(minutes=30))
+    assert scheduler._pop_due(clock.now) == {1: ["24h", "1h"]}
+    scheduler._retry(1, ["1h"])
+    assert scheduler._pop_due(clock.now) == {}
+    assert scheduler._pop_due(clock.now + RETRY_DELAY) == {1: ["1h"]}
+
+
+def test_retry_keeps_a_newer_schedule(scheduler, clock):
+    scheduler.schedule(1, clock.now + timedelta(minutes=30))
+    scheduler._pop_due(clock.now)
+    start = clock.now + timedelta(hours=3)
+    scheduler.schedule(1, start)
+    scheduler._retry(1, ["1h"])
+    assert scheduler._due[(1, "1h")] == start - OFFSETS["1h"]
+
+
+class FakeCRUD:
+    def __init__(self, due: list[tuple[int, str]], cards: list):
+        self.due = due
+        self.cards = cards
+        self.marked = []
+
+    async def get_due_reminders(self, now, appointment_ids):
+        return [pair for pair in self.due if pair[0] in appointment_ids]
+
+    async def get_appointment_cards_by_ids(self, appointment_ids):
+        return [card for card in self.cards if card.id in appointment_ids]
+
+    async def mark_reminders_sent(self, reminders):
+        self.marked.extend(reminders)
+
+
+def _patch_dispatch(monkeypatch, crud: FakeCRUD, notify):
+    session = SimpleNamespace(commit=_noop, rollback=_noop)
+
+    @asynccontextmanager
+    async def create_session():
+        yield session
+
+    monkeypatch.setattr(scheduler_module, "create_session", create_session)
+    monkeypatch.setattr(scheduler_module, "CRUD", lambda _: crud)
+    monkeypatch.setattr(scheduler_module, "contact_cache", SimpleNamespace(preload=_noop))
+    monkeypatch.setattr(scheduler_module, "notify_reminder", notify)
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def _card(appointment_id: int):
+    return SimpleNamespace(id=appointment_id, client=SimpleNamespace(user=SimpleNamespace(telegram_id=str(appointment_id))))
+
+
+def test_dispatch_marks_each_sent_reminder(scheduler, clock, monkeypatch):
+    crud = FakeCRUD([(1, "24h"), (1, "1h"), (2, "1h")], [_card(1), _card(2)])
+    sent = []
+
+    async def notify(bot, appointment, reminder_type):
+        sent.append((appointment.id, reminder_type))
+
+    _patch_dispatch(monkeypatch, crud, notify)
+    asyncio.run(scheduler._dispatch({1: ["24h", "1h"], 2: ["1h"]}))
+    assert sent == [(1, "1h"), (2, "1h")]
+    assert crud.marked == [(1, "24h"), (1, "1h"), (2, "1h")]
+    assert scheduler._due == {}
+
+
+def test_dispatch_retries_a_failed_send(scheduler, clock, monkeypatch):
+    crud = FakeCRUD([(1, "1h"), (2, "1h")], [_card(1), _card(2)])
+
+    async def notify(bot, appointment, reminder_type):
+        if appointment.id == 1:
+            raise ConnectionError("network is down")
+
+    _patch_dispatch(monkeypatch, crud, notify)
+    asyncio.run(scheduler._dispatch({1: ["1h"], 2: ["1h"]}))
+    assert crud.marked == [(2, "1h")]
+    assert scheduler._due == {(1, "1h"): clock.now + RETRY_DELAY}
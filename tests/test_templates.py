@@ -0,0 +1,41 @@
+import pytest
+from utils.templates import Template, escape_markdown_v2
+
+
+def test_escape_markdown_v2_escapes_every_special_character():
+    assert escape_markdown_v2("a_b*c[d](e)~`>#+-=|{}.!\\") == "a\\_b\\*c\\[d\\]\\(e\\)\\~\\`\\>\\#\\+\\-\\=\\|\\{\\}\\.\\!\\\\"
+    assert escape_markdown_v2(12.5) == "12\\.5"
+    assert escape_markdown_v2(None) == ""
+
+
+def test_static_text_is_escaped_once_at_compile_time():
+    template = Template("Заявка #{id} (на {date}).")
+    assert template.slots == ("id", "date")
+    assert template.render(id=5, date="01.03.2026") == "Заявка \\#5 \\(на 01\\.03\\.2026\\)\\."
+
+
+def test_braces_in_source_are_literal():
+    assert Template("{{x}}").render() == "\\{x\\}"
+
+
+def test_url_and_link_slots_escape_only_inside_the_link():
+    template = Template("{site:link} {raw_url:url}")
+    rendered = template.render(site=("Сайт (главная)", "https://example.com/a_(b)"), raw_url="https://x.y/\\)")
+    assert rendered == "[Сайт \\(главная\\)](https://example.com/a_(b\\)) https://x.y/\\\\\\)"
+
+
+def test_raw_slot_composes_rendered_templates():
+    inner = Template("*{name}*")
+    outer = Template("Клиент: {card:raw}!")
+    assert outer.render(card=inner.render(name="Иван_И")) == "Клиент: \\*Иван\\_И\\*\\!"
+
+
+@pytest.mark.parametrize("source", ["{name:bold}", "{}", "{name!r}"])
+def test_invalid_slot_is_rejected_at_compile_time(source):
+    with pytest.raises(ValueError):
+        Template(source)
+
+
+def test_missing_value_raises_key_error():
+    with pytest.raises(KeyError):
+        Template("{a} {b}").render(a=1)
@@ -1,63 +1,65 @@
 import csv
+import gzip
 import io
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.crud import CRUD
 from config import config
 
+# Готовые периоды выгрузки: callback_data -> длительность
+EXPORT_PERIODS = {
+    "1week": timedelta(days=7),
+    "2weeks": timedelta(days=14),
+    "1month": timedelta(days=30),
+}
 
-async def export_appointments_to_csv(session: AsyncSession, period: str) -> str:
+EXPORT_HEADER = [
+    "ID",
+    "Client Name",
+    "Client Phone",
+    "Specialist Name",
+    "Proposed Date",
+    "Scheduled Time",
+    "Status",
+    "Reason",
+    "Reject Reason"
+]
+
+
+async def export_appointments_to_csv(session: AsyncSession, period: str = "1month",
+                                     start: datetime | None = None, end: datetime | None = None,
+                                     compress: bool = False, changed_since: datetime | None = None) -> bytes:
     """
-    Export appointments to CSV format for a given period.
+    Export appointments to CSV format for a given period, date range or changes since a moment.
+
+    The period is filtered in SQL and rows are streamed in batches, so only the encoded
+    (optionally gzip-compressed) output is kept in memory.
 
     Args:
         session (AsyncSession): SQLAlchemy async session for database queries.
-        period (str): Period for filtering appointments ('1week', '2weeks', '1month').
+        period (str): Period ending now ('1week', '2weeks', '1month'), used if no range is given.
+        start (datetime | None): Start of an arbitrary range, inclusive.
+        end (datetime | None): End of an arbitrary range, exclusive.
+        compress (bool): Whether to gzip the output.
+        changed_since (datetime | None): Export only appointments changed after this moment
+            (including changes of their client or specialist) instead of a period.
 
     Returns:
-        str: CSV content as a string.
+        bytes: UTF-8 CSV content, gzip-compressed if requested.
     """
     crud = CRUD(session)
-
-    # Determine the start date based on the period
-    end_date = datetime.now(tz=config.TIMEZONE)
-    if period == "1week":
-        start_date = end_date - timedelta(days=7)
-    elif period == "2weeks":
-        start_date = end_date - timedelta(days=14)
-    elif period == "1month":
-        start_date = end_date - timedelta(days=30)
-    else:
-        start_date = end_date - timedelta(days=30)  # Default to 1 month
-
-    # Fetch all appointments
-    appointments = await crud.get_all_appointments()
-
-    # Filter appointments by date
-    filtered_appointments = [
-        app for app in appointments
-        if start_date <= app.proposed_date.astimezone(config.TIMEZONE) <= end_date
-    ]
-
-    # Prepare CSV output
-    output = io.StringIO()
+    if changed_since is not None:
+        start = end = None
+    elif start is None or end is None:
+        end = datetime.now(tz=config.TIMEZONE)
+        start = end - EXPORT_PERIODS.get(period, EXPORT_PERIODS["1month"])
+    buffer = io.BytesIO()
+    stream = gzip.GzipFile(fileobj=buffer, mode="wb") if compress else buffer
+    output = io.TextIOWrapper(stream, encoding="utf-8", newline="")
     writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(EXPORT_HEADER)
 
-    # Write header
-    writer.writerow([
-        "ID",
-        "Client Name",
-        "Client Phone",
-        "Specialist Name",
-        "Proposed Date",
-        "Scheduled Time",
-        "Status",
-        "Reason",
-        "Reject Reason"
-    ])
-
-    # Write appointment data
-    for app in filtered_appointments:
+    async for app in crud.stream_appointments(start, end, changed_since):
         proposed_date = app.proposed_date.astimezone(config.TIMEZONE).strftime("%d.%m.%Y")
         scheduled_time = (
             app.scheduled_time.astimezone(config.TIMEZONE).strftime("%H:%M")
@@ -78,4 +80,8 @@ async def export_appointments_to_csv(session: AsyncSession, period: str) -> str:
             reject_reason
         ])
 
-    return output.getvalue()
\ No newline at end of file
+    output.flush()
+    output.detach()
+    if compress:
+        stream.close()
+    return buffer.getvalue()